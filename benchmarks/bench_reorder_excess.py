@@ -0,0 +1,82 @@
+"""
+Benchmarks the reorder (step 3) and excess stock (step 5) calculations of the
+replenishment engine against the original row-wise implementation.
+
+Usage:
+    python benchmarks/bench_reorder_excess.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from engine.core import EXCESS_DOS_THRESHOLD, calculate_excess_stock, calculate_reorder_qty  # noqa: E402
+from legacy_engine import legacy_excess_stock, legacy_reorder_qty  # noqa: E402
+
+
+def make_merged_data(num_rows, seed=42):
+    """
+    Builds a synthetic merged SKU x branch frame with the columns steps 3 and 5 need.
+    """
+    rng = np.random.default_rng(seed)
+    sales_30d = rng.integers(0, 150, size=num_rows)
+    min_stock = np.maximum(5, (sales_30d / 30 * 1.5 * rng.integers(2, 14, size=num_rows)).astype('int64'))
+    max_stock = np.maximum(min_stock + 10, (min_stock * 3.0).astype('int64'))
+    branch_stock = rng.integers(0, max_stock * 2 + 1)
+    merged_data = pd.DataFrame({
+        'Branch_Stock': branch_stock,
+        'Min_Stock': min_stock,
+        'Max_Stock': max_stock,
+        'Sales_30D': sales_30d,
+    })
+    merged_data['Avg_Daily_Sales'] = merged_data['Sales_30D'] / 30
+    return merged_data
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Number of SKU x branch rows.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-legacy', action='store_true', help="Only time the vectorized path.")
+    args = parser.parse_args()
+
+    merged_data = make_merged_data(args.rows, args.seed)
+    print(f"Benchmarking steps 3 and 5 on {len(merged_data):,} rows")
+
+    vec_reorder_time, reorder_qty = time_call(calculate_reorder_qty, merged_data)
+    vec_excess_time, (target, excess) = time_call(
+        calculate_excess_stock, merged_data['Avg_Daily_Sales'], merged_data['Branch_Stock']
+    )
+    vectorized_total = vec_reorder_time + vec_excess_time
+    print(f"Vectorized: reorder {vec_reorder_time:.3f}s, excess {vec_excess_time:.3f}s, total {vectorized_total:.3f}s")
+
+    if args.skip_legacy:
+        return
+
+    legacy_reorder_time, legacy_reorder = time_call(legacy_reorder_qty, merged_data)
+    legacy_excess_time, (legacy_target, legacy_excess) = time_call(
+        legacy_excess_stock, merged_data, EXCESS_DOS_THRESHOLD
+    )
+    legacy_total = legacy_reorder_time + legacy_excess_time
+    print(f"Row-wise:   reorder {legacy_reorder_time:.3f}s, excess {legacy_excess_time:.3f}s, total {legacy_total:.3f}s")
+
+    pd.testing.assert_series_equal(reorder_qty, legacy_reorder, check_dtype=False)
+    pd.testing.assert_series_equal(target, legacy_target, check_dtype=False, check_exact=True)
+    pd.testing.assert_series_equal(excess, legacy_excess, check_dtype=False, check_exact=True)
+    print("Outputs match the row-wise implementation.")
+    print(f"Speedup: {legacy_total / vectorized_total:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
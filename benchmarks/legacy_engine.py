@@ -0,0 +1,131 @@
+"""
+Row-wise reference implementations of the replenishment engine steps.
+
+These mirror the original DataFrame.apply / iterrows code paths of
+run_replenishment_engine. They are kept only so the benchmarks can measure
+the vectorized engine against them and check that the outputs still match.
+"""
+import pandas as pd
+
+
+def legacy_reorder_qty(merged_data):
+    """
+    Step 3 of the original engine: one Python call per row.
+    """
+    return merged_data.apply(
+        lambda row: max(0, row['Max_Stock'] - row['Branch_Stock']) if row['Branch_Stock'] < row['Min_Stock'] else 0,
+        axis=1
+    )
+
+
+def legacy_excess_stock(merged_data, dos_threshold):
+    """
+    Step 5 of the original engine: two Python calls per row.
+    Expects Avg_Daily_Sales to be present on merged_data.
+    """
+    target_excess_stock = merged_data.apply(
+        lambda row: row['Avg_Daily_Sales'] * dos_threshold if row['Avg_Daily_Sales'] > 0 else 0,
+        axis=1
+    )
+    excess_qty = pd.concat(
+        [merged_data['Branch_Stock'], target_excess_stock.rename('Target_Excess_Stock')], axis=1
+    ).apply(
+        lambda row: max(0, row['Branch_Stock'] - row['Target_Excess_Stock']),
+        axis=1
+    )
+    return target_excess_stock, excess_qty
+
+
+def legacy_allocate_warehouse_stock(reorder_df, warehouse_stock):
+    """
+    Step 4 of the original engine: an iterrows loop that decrements a dict of
+    warehouse stock one reorder at a time.
+    """
+    transfer_orders_list = []
+    lpo_needs_list = []
+    lpo_trigger_transfers_list = []
+    available_warehouse_stock = warehouse_stock.set_index('SKU')['Warehouse_Stock'].to_dict()
+
+    for _, row in reorder_df.iterrows():
+        sku = row['SKU']
+        reorder_qty = row['ReorderQty']
+        initial_warehouse_stock_for_sku = available_warehouse_stock.get(sku, 0)
+        fulfillable_qty = min(reorder_qty, initial_warehouse_stock_for_sku)
+
+        if fulfillable_qty > 0:
+            transfer_orders_list.append({
+                'SKU': sku,
+                'From_Warehouse': 'WH01',
+                'To_Branch': row['Branch'],
+                'Min_Stock': row['Min_Stock'],
+                'Max_Stock': row['Max_Stock'],
+                'Branch_Stock': row['Branch_Stock'],
+                'Transfer_Qty': fulfillable_qty,
+                'Warehouse_Stock': initial_warehouse_stock_for_sku
+            })
+            available_warehouse_stock[sku] -= fulfillable_qty
+
+        lpo_shortfall = reorder_qty - fulfillable_qty
+        if lpo_shortfall > 0:
+            lpo_needs_list.append({
+                'SKU': sku, 'Required_Qty': lpo_shortfall, 'Vendor': row['Vendor']
+            })
+            reason = "Partial Allocation" if fulfillable_qty > 0 else "Warehouse Out of Stock"
+            lpo_trigger_transfers_list.append({
+                'SKU': sku,
+                'Branch': row['Branch'],
+                'ReorderQty': reorder_qty,
+                'Transfer_Qty_from_WH': fulfillable_qty,
+                'Warehouse_Stock_Before_Transfer': initial_warehouse_stock_for_sku,
+                'Warehouse_Stock_After_Transfer': available_warehouse_stock.get(sku, 0),
+                'LPO_Shortfall': lpo_shortfall,
+                'Reason': reason
+            })
+
+    return (
+        pd.DataFrame(transfer_orders_list),
+        pd.DataFrame(lpo_needs_list),
+        pd.DataFrame(lpo_trigger_transfers_list),
+    )
+
+
+def legacy_create_transfers_and_lpos(merged_data, warehouse_stock):
+    """
+    Step 4 of the original engine end to end: the iterrows allocation plus
+    building the transfer, LPO needs and LPO trigger tables from its lists.
+    Reorders are sorted stably by SKU, as the engine does now.
+    """
+    reorder_df = merged_data[merged_data['ReorderQty'] > 0].sort_values(by='SKU', kind='stable')
+    transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df = legacy_allocate_warehouse_stock(
+        reorder_df, warehouse_stock
+    )
+    if not lpo_needs_df.empty:
+        lpo_needs_df = lpo_needs_df.groupby(['SKU', 'Vendor'])['Required_Qty'].sum().reset_index()
+    if not lpo_trigger_transfers_df.empty:
+        lpo_trigger_transfers_df = lpo_trigger_transfers_df[[
+            'SKU', 'Branch', 'ReorderQty', 'Transfer_Qty_from_WH',
+            'Warehouse_Stock_After_Transfer',
+            'LPO_Shortfall', 'Reason'
+        ]]
+    return transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df
+
+
+def legacy_identify_excess_stock(merged_data, dos_threshold):
+    """
+    Step 5 of the original engine end to end, adding its columns to
+    merged_data in place and returning the excess stock table.
+    """
+    merged_data['Avg_Daily_Sales'] = merged_data['Sales_30D'] / 30
+    merged_data.rename(columns={'ReorderQty': 'Total_Branch_Requirement'}, inplace=True)
+    merged_data['Target_Excess_Stock'], merged_data['ExcessQty'] = legacy_excess_stock(merged_data, dos_threshold)
+    merged_data['70D Target(daily*70)'] = merged_data['Target_Excess_Stock']
+    merged_data['Excess(branch stock - 70D target)'] = merged_data['ExcessQty']
+
+    excess_stock_df = merged_data[merged_data['ExcessQty'] > 0][[
+        'Branch', 'SKU', 'Product_Name', 'Branch_Stock', 'Min_Stock', 'Max_Stock',
+        'Total_Branch_Requirement', 'Sales_30D', 'Avg_Daily_Sales',
+        'Target_Excess_Stock', 'ExcessQty', '70D Target(daily*70)', 'Excess(branch stock - 70D target)'
+    ]]
+    for col in ['Avg_Daily_Sales', 'Target_Excess_Stock', 'ExcessQty', '70D Target(daily*70)', 'Excess(branch stock - 70D target)']:
+        excess_stock_df[col] = excess_stock_df[col].round(2)
+    return excess_stock_df
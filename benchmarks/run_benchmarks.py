@@ -0,0 +1,389 @@
+"""
+Benchmarks the whole replenishment engine across data scales, stage by stage,
+and checks that every engine mode produces the same outputs.
+
+For every scale a dataset is generated with generate_dummy_replenishment_data.py,
+then each mode runs on it in a process of its own, so that its peak RSS can be
+measured:
+
+    legacy      the original row-wise engine (DataFrame.apply / iterrows)
+    vectorized  the engine run serially
+    parallel    the engine sharded by SKU across --workers processes
+
+Each run is timed per stage (load, merge, reorder, allocate, excess, write;
+parallel runs time reorder to excess as one compute stage). The results are
+written as JSON; pass an earlier results file as --baseline to flag the
+stages that got slower.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 1e3,1e4,1e5,1e6 --output results.json
+    python benchmarks/run_benchmarks.py --scales 1e7 --modes vectorized,parallel --format parquet
+    python benchmarks/run_benchmarks.py --baseline results.json --output results_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(BENCHMARKS_DIR, '..')
+sys.path.insert(0, os.path.join(REPO_ROOT, 'src'))
+sys.path.insert(0, REPO_ROOT)
+
+from engine.core import (  # noqa: E402
+    EXCESS_DOS_THRESHOLD, calculate_reorder_qty, create_transfers_and_lpos, identify_excess_stock, merge_inputs
+)
+from engine.file_io import FILE_FORMATS, INPUT_TABLES, load_input_tables, read_table, table_path, write_outputs  # noqa: E402
+from engine.parallel import compute_replenishment_parallel  # noqa: E402
+from generate_dummy_replenishment_data import generate_datasets, write_dataset  # noqa: E402
+from legacy_engine import (  # noqa: E402
+    legacy_create_transfers_and_lpos, legacy_identify_excess_stock, legacy_reorder_qty
+)
+
+MODES = ("legacy", "vectorized", "parallel")
+STAGES = ("load", "merge", "reorder", "allocate", "excess", "compute", "write")
+# Output tables compared between modes, in the order the stages return them
+RESULT_TABLES = ("Transfer_Orders", "LPO_Needs", "LPO_Trigger_Transfers", "Excess_Stock")
+TIMINGS_FILE = "timings.json"
+
+
+def _peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _StageTimer:
+    """
+    Records the wall time of each stage of one run.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def run(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.seconds[stage] = time.perf_counter() - start
+        return result
+
+
+def _run_engine_stages(mode, data_dir, output_dir, file_format, workers):
+    """
+    Runs the engine's stages one after the other in the given mode.
+
+    Returns:
+        tuple: Stage timings in seconds and the result tables keyed like RESULT_TABLES.
+    """
+    timer = _StageTimer()
+
+    if mode == "legacy":
+        # The original engine read the files without a schema and merged on object keys
+        branch_inventory, warehouse_stock, sku_master = timer.run("load", lambda: [
+            read_table(table_path(data_dir, table, file_format), file_format) for table in INPUT_TABLES
+        ])
+        merged_data = timer.run("merge", lambda: pd.merge(
+            pd.merge(branch_inventory, sku_master, on='SKU'), warehouse_stock, on='SKU'
+        ))
+        merged_data['ReorderQty'] = timer.run("reorder", legacy_reorder_qty, merged_data)
+        transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df = timer.run(
+            "allocate", legacy_create_transfers_and_lpos, merged_data, warehouse_stock
+        )
+        excess_stock_df = timer.run("excess", legacy_identify_excess_stock, merged_data, EXCESS_DOS_THRESHOLD)
+    else:
+        tables = timer.run("load", load_input_tables, data_dir, file_format)
+        merged_data, available_warehouse_stock = timer.run("merge", merge_inputs, *tables)
+        if mode == "parallel":
+            _, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df = timer.run(
+                "compute", compute_replenishment_parallel, merged_data, available_warehouse_stock, workers
+            )
+        else:
+            merged_data['ReorderQty'] = timer.run("reorder", calculate_reorder_qty, merged_data)
+            transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df = timer.run(
+                "allocate", create_transfers_and_lpos, merged_data, available_warehouse_stock
+            )
+            excess_stock_df = timer.run("excess", identify_excess_stock, merged_data)
+
+    timer.run(
+        "write", write_outputs, output_dir, transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df,
+        excess_stock_df, file_format
+    )
+
+    stages = timer.seconds
+    if "compute" not in stages:
+        stages["compute"] = stages["reorder"] + stages["allocate"] + stages["excess"]
+    results = dict(zip(RESULT_TABLES, (transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df, excess_stock_df)))
+    return stages, results
+
+
+def run_single(mode, data_dir, run_dir, file_format, workers):
+    """
+    Child process entry point: runs one mode on one dataset and saves its
+    timings and result tables to run_dir.
+    """
+    stages, results = _run_engine_stages(mode, data_dir, os.path.join(run_dir, "outputs"), file_format, workers)
+
+    # Saved outside the timed stages, for the equality check in the parent
+    for table, df in results.items():
+        df.reset_index(drop=True).to_parquet(os.path.join(run_dir, f"{table}.parquet"), index=False)
+
+    with open(os.path.join(run_dir, TIMINGS_FILE), "w") as f:
+        json.dump({
+            "stages": stages,
+            # compute covers reorder, allocate and excess, so those are not added again
+            "total_seconds": sum(stages[stage] for stage in ("load", "merge", "compute", "write")),
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+            "workers_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "output_rows": {table: len(df) for table, df in results.items()},
+        }, f)
+
+
+def _comparable(df):
+    """
+    Normalises a result table so the same values compare equal across modes,
+    whatever dtypes each mode used for them.
+    """
+    df = df.copy()
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+            df[column] = df[column].astype(str)
+    return df
+
+
+def outputs_match(run_dir, reference_dir):
+    """
+    Checks that the result tables saved in two run directories are equal.
+
+    Returns:
+        list: Descriptions of the tables that differ; empty if all match.
+    """
+    differences = []
+    for table in RESULT_TABLES:
+        result = pd.read_parquet(os.path.join(run_dir, f"{table}.parquet"))
+        reference = pd.read_parquet(os.path.join(reference_dir, f"{table}.parquet"))
+        if result.empty and reference.empty:
+            continue
+        try:
+            pd.testing.assert_frame_equal(_comparable(result), _comparable(reference), check_dtype=False)
+        except AssertionError as e:
+            differences.append(f"{table}: {str(e).splitlines()[0]}")
+    return differences
+
+
+def generate_scale(rows, branches, seed, data_dir, file_format):
+    """
+    Writes a dataset of about `rows` branch inventory rows to data_dir.
+
+    Returns:
+        dict: The shape of the dataset actually generated.
+    """
+    num_branches = max(1, min(branches, rows))
+    num_skus = max(1, rows // num_branches)
+    datasets = generate_datasets(num_skus=num_skus, num_branches=num_branches, seed=seed)
+    os.makedirs(data_dir, exist_ok=True)
+    for table in INPUT_TABLES:
+        write_dataset(datasets[table], table_path(data_dir, table, file_format), file_format)
+    return {"rows": num_skus * num_branches, "skus": num_skus, "branches": num_branches}
+
+
+def run_mode_in_subprocess(mode, data_dir, run_dir, file_format, workers):
+    """
+    Runs one mode in a fresh interpreter, so peak RSS covers that run alone.
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    subprocess.run([
+        sys.executable, os.path.abspath(__file__), "--run-single", mode,
+        "--data-dir", data_dir, "--run-dir", run_dir, "--format", file_format, "--workers", str(workers)
+    ], check=True, stdout=subprocess.DEVNULL)
+    with open(os.path.join(run_dir, TIMINGS_FILE)) as f:
+        return json.load(f)
+
+
+def find_regressions(results, baseline, tolerance, min_seconds):
+    """
+    Compares stage timings and peak RSS against a baseline results file.
+    A stage counts as regressed when it is more than `tolerance` slower and
+    also at least `min_seconds` slower, which keeps tiny stages from flagging on noise.
+
+    Returns:
+        list: One description per regression.
+    """
+    baseline_runs = {(run["rows"], run["mode"]): run for run in baseline["runs"] if "stages" in run}
+    regressions = []
+    for run in results["runs"]:
+        previous = baseline_runs.get((run["rows"], run["mode"]))
+        if previous is None or "stages" not in run:
+            continue
+        timings = dict(run["stages"], total=run["total_seconds"])
+        previous_timings = dict(previous["stages"], total=previous["total_seconds"])
+        for stage, seconds in timings.items():
+            before = previous_timings.get(stage)
+            if before is not None and seconds > before * (1 + tolerance) and seconds - before >= min_seconds:
+                regressions.append(
+                    f"{run['mode']} @ {run['rows']:,} rows: {stage} {before:.3f}s -> {seconds:.3f}s"
+                )
+        if run["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{run['mode']} @ {run['rows']:,} rows: peak RSS "
+                f"{previous['peak_rss_mb']:.0f} MB -> {run['peak_rss_mb']:.0f} MB"
+            )
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(runs):
+    header = f"{'rows':>12} {'mode':<10}" + "".join(f"{stage:>10}" for stage in STAGES) + f"{'total':>10}{'RSS MB':>9}  match"
+    print(header)
+    for run in runs:
+        if "stages" not in run:
+            print(f"{run['rows']:>12,} {run['mode']:<10}  skipped: {run['skipped']}")
+            continue
+        stage_columns = "".join(
+            f"{run['stages'][stage]:>10.3f}" if stage in run["stages"] else f"{'-':>10}" for stage in STAGES
+        )
+        match = {True: "yes", False: "NO", None: "ref"}[run["matches_reference"]]
+        print(f"{run['rows']:>12,} {run['mode']:<10}{stage_columns}{run['total_seconds']:>10.3f}"
+              f"{run['peak_rss_mb']:>9.0f}  {match}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default="1e3,1e4,1e5,1e6",
+                        help="Comma-separated branch inventory row counts, e.g. 1e3,1e5,1e7.")
+    parser.add_argument('--branches', type=int, default=100, help="Branches per SKU in the generated data.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--modes', default=",".join(MODES), help=f"Comma-separated modes out of {', '.join(MODES)}.")
+    parser.add_argument('--workers', type=int, default=max(2, os.cpu_count() or 1),
+                        help="Worker processes for the parallel mode.")
+    parser.add_argument('--format', choices=FILE_FORMATS, default="csv", help="Input and output file format.")
+    parser.add_argument('--legacy-max-rows', type=int, default=100_000,
+                        help="Skip the legacy mode above this many rows; it is far too slow there.")
+    parser.add_argument('--output', default=None, help="Write the results to this JSON file.")
+    parser.add_argument('--baseline', default=None, help="Earlier results JSON to check for regressions.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Relative slowdown (or RSS growth) that counts as a regression.")
+    parser.add_argument('--min-seconds', type=float, default=0.1,
+                        help="Smallest absolute slowdown that counts as a regression.")
+    parser.add_argument('--work-dir', default=None,
+                        help="Where to put generated data and outputs (default: a temporary directory).")
+    parser.add_argument('--keep-data', action='store_true', help="Keep the work directory afterwards.")
+    # Used internally to run one mode in a child process
+    parser.add_argument('--run-single', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--data-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--run-dir', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.run_single:
+        run_single(args.run_single, args.data_dir, args.run_dir, args.format, args.workers)
+        return
+
+    scales = [int(float(scale)) for scale in args.scales.split(",")]
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        sys.exit(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="replenishment_bench_")
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "branches": args.branches, "seed": args.seed, "format": args.format, "workers": args.workers,
+        },
+        "runs": [],
+    }
+
+    try:
+        for scale in scales:
+            scale_dir = os.path.join(work_dir, f"rows_{scale}")
+            data_dir = os.path.join(scale_dir, "data")
+            start = time.perf_counter()
+            shape = generate_scale(scale, args.branches, args.seed, data_dir, args.format)
+            print(f"Generated {shape['rows']:,} rows ({shape['skus']:,} SKUs x {shape['branches']} branches) "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+            reference_dir = None
+            for mode in modes:
+                run = {"rows": shape["rows"], "skus": shape["skus"], "branches": shape["branches"], "mode": mode}
+                if mode == "legacy" and shape["rows"] > args.legacy_max_rows:
+                    run["skipped"] = f"more than --legacy-max-rows={args.legacy_max_rows:,}"
+                    results["runs"].append(run)
+                    continue
+
+                run_dir = os.path.join(scale_dir, mode)
+                run.update(run_mode_in_subprocess(mode, data_dir, run_dir, args.format, args.workers))
+                # The first mode that ran is the reference the others must match
+                if reference_dir is None:
+                    reference_dir = run_dir
+                    run["matches_reference"] = None
+                else:
+                    differences = outputs_match(run_dir, reference_dir)
+                    run["matches_reference"] = not differences
+                    if differences:
+                        run["differences"] = differences
+                results["runs"].append(run)
+    finally:
+        if not args.keep_data and args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    print_summary(results["runs"])
+
+    failed = False
+    mismatches = [run for run in results["runs"] if run.get("matches_reference") is False]
+    for run in mismatches:
+        print(f"\nOutputs of {run['mode']} @ {run['rows']:,} rows differ from the reference:")
+        for difference in run["differences"]:
+            print(f"  {difference}")
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance, args.min_seconds)
+        results["baseline"] = {"path": args.baseline, "git_commit": baseline.get("git_commit"),
+                               "regressions": regressions}
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            failed = True
+        else:
+            print(f"\nNo regressions against {args.baseline}.")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,102 +1,240 @@
-import pandas as pd
+import argparse
+import os
+import time
 import numpy as np
-from random import choice, randint
+import pandas as pd
 
 # === Parameters ===
 NUM_SKUS = 500
-BRANCHES = ['BR001', 'BR002', 'BR003', 'BR004', 'BR005']
+NUM_BRANCHES = 5
+NUM_WAREHOUSES = 1
 CATEGORIES = ['Medicine', 'Personal Care', 'Nutrition', 'Baby Care', 'OTC', 'Medical Devices']
 VENDORS = ['VendorA', 'VendorB', 'VendorC', 'VendorD']
 DAYS_OF_SALES_HISTORY = 30
+MAX_DAILY_SALES = 5       # Daily sales are drawn uniformly from 0..MAX_DAILY_SALES units
 SAFETY_STOCK_FACTOR = 1.5 # Min_Stock = Avg_Daily_Sales * SAFETY_STOCK_FACTOR
 MAX_STOCK_FACTOR = 3.0    # Max_Stock = Min_Stock * MAX_STOCK_FACTOR
 
 # A configurable threshold for excess stock in days of supply
 EXCESS_DOS_THRESHOLD = 60 # Defaulting to 60 days for generation, can be changed in engine
 
-# === 1. SKU Master Data ===
-sku_ids = [f"SKU{str(i).zfill(4)}" for i in range(1, NUM_SKUS + 1)]
-sku_master = pd.DataFrame({
-    'SKU': sku_ids,
-    'Product_Name': [f"Product {i}" for i in range(1, NUM_SKUS + 1)],
-    'Category': [choice(CATEGORIES) for _ in range(NUM_SKUS)],
-    'Vendor': [choice(VENDORS) for _ in range(NUM_SKUS)],
-    'Lead_Time_Days': np.random.randint(2, 14, size=NUM_SKUS)
-})
-sku_master.to_csv("SKU_Master.csv", index=False)
-
-# === 2. Branch Inventory Data (500 SKUs × 5 branches = 2500 rows) ===
-branch_inventory_rows = []
-for sku in sku_ids:
-    for branch in BRANCHES:
-        # Simulate 30 days of sales for each SKU at each branch
-        daily_sales = [randint(0, 5) for _ in range(DAYS_OF_SALES_HISTORY)] # Random sales between 0 and 5 units/day
-        sales_30d = sum(daily_sales)
-        avg_daily_sales = sales_30d / DAYS_OF_SALES_HISTORY
-
-        # Calculate Min_Stock and Max_Stock based on average daily sales
-        # Ensure a minimum stock of at least 5 units to avoid zero min/max for slow movers
-        min_stock = max(5, int(avg_daily_sales * SAFETY_STOCK_FACTOR * sku_master[sku_master['SKU'] == sku]['Lead_Time_Days'].iloc[0]))
-        max_stock = max(min_stock + 10, int(min_stock * MAX_STOCK_FACTOR))
-
-        # Generate current Branch_Stock
-        # Introduce scenarios for excess stock based on DOS
-        if avg_daily_sales > 0 and np.random.rand() < 0.1: # 10% chance of special case
-            # Case 1: High Min_Stock, but also high Branch_Stock (triggering both reorder and excess)
-            min_stock = int(avg_daily_sales * EXCESS_DOS_THRESHOLD * 1.5) # Very high min stock
-            max_stock = int(min_stock * 1.2)
-            branch_stock = int(min_stock * 0.9) # Below min, but still high
-        elif avg_daily_sales > 0 and np.random.rand() < 0.15: # 15% chance of excess stock for items with sales
-            # Ensure stock is significantly above the EXCESS_DOS_THRESHOLD
-            target_stock_for_excess = int(avg_daily_sales * EXCESS_DOS_THRESHOLD * 1.2) # 20% above threshold
-            branch_stock = randint(max(max_stock + 10, target_stock_for_excess), target_stock_for_excess + 50)
-        else:
-            # Normal stock generation, ensuring some are below min to trigger reorders
-            branch_stock = randint(max(0, min_stock - 10), max_stock + 5)
-
-        branch_inventory_rows.append({
-            'SKU': sku,
-            'Branch': branch,
-            'Branch_Stock': branch_stock,
-            'Min_Stock': min_stock,
-            'Max_Stock': max_stock,
-            'Sales_30D': sales_30d # Add 30-day sales to the output
-        })
-branch_inventory = pd.DataFrame(branch_inventory_rows)
-branch_inventory.to_csv("Branch_Inventory.csv", index=False)
-
-# === 3. Warehouse Stock (1 row per SKU) ===
-warehouse_stock_levels = []
-for _ in range(NUM_SKUS):
-    r = np.random.rand()
-    if r < 0.2: # 20% chance of very low stock
-        warehouse_stock_levels.append(np.random.randint(0, 10))
-    elif r < 0.5: # 30% chance of low stock
-        warehouse_stock_levels.append(np.random.randint(10, 50))
-    else: # 50% chance of moderate stock
-        warehouse_stock_levels.append(np.random.randint(50, 200))
-
-warehouse_stock = pd.DataFrame({
-    'SKU': sku_ids,
-    'Warehouse_Stock': warehouse_stock_levels
-})
-warehouse_stock.to_csv("Warehouse_Stock.csv", index=False)
-
-# === 4. Transfer Orders Placeholder ===
-transfer_orders = pd.DataFrame(columns=[
-    'SKU', 'From_Warehouse', 'To_Branch', 'Transfer_Qty'
-])
-transfer_orders.to_csv("Transfer_Orders.csv", index=False)
-
-# === 5. LPO Needs Placeholder ===
-lpo_needs = pd.DataFrame(columns=[
-    'SKU', 'Required_Qty', 'Vendor'
-])
-lpo_needs.to_csv("LPO_Needs.csv", index=False)
-
-print("✅ CSV files generated successfully in current directory:")
-print(" SKU_Master.csv")
-print(" Branch_Inventory.csv")
-print(" Warehouse_Stock.csv")
-print(" Transfer_Orders.csv")
-print(" LPO_Needs.csv")
\ No newline at end of file
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+
+def _padded_ids(prefix, count, min_width):
+    """
+    Returns IDs like SKU0001, zero-padded so they sort in numeric order.
+    """
+    width = max(min_width, len(str(count)))
+    return [f"{prefix}{str(i).zfill(width)}" for i in range(1, count + 1)]
+
+
+def _sales_30d_distribution():
+    """
+    Probability of each possible 30-day sales total, i.e. of the sum of
+    DAYS_OF_SALES_HISTORY independent daily sales drawn uniformly from
+    0..MAX_DAILY_SALES. Sampling the total from this is equivalent to
+    summing 30 daily draws, without materialising them.
+    """
+    daily = np.full(MAX_DAILY_SALES + 1, 1.0 / (MAX_DAILY_SALES + 1))
+    total = np.ones(1)
+    for _ in range(DAYS_OF_SALES_HISTORY):
+        total = np.convolve(total, daily)
+    return total / total.sum()
+
+
+def generate_sku_master(rng, sku_ids):
+    """
+    SKU Master: one row per SKU with a random category, vendor and lead time.
+    """
+    num_skus = len(sku_ids)
+    return pd.DataFrame({
+        'SKU': sku_ids,
+        'Product_Name': [f"Product {i}" for i in range(1, num_skus + 1)],
+        'Category': pd.Categorical.from_codes(rng.integers(0, len(CATEGORIES), size=num_skus), CATEGORIES),
+        'Vendor': pd.Categorical.from_codes(rng.integers(0, len(VENDORS), size=num_skus), VENDORS),
+        'Lead_Time_Days': rng.integers(2, 14, size=num_skus)
+    })
+
+
+def generate_branch_inventory(rng, sku_ids, branch_ids, lead_time_days):
+    """
+    Branch Inventory: one row per SKU x branch, sorted by SKU. Stock levels are
+    mostly normal, with some rows set up to trigger both a reorder and excess
+    stock, and some set up as plain excess stock.
+    """
+    num_skus, num_branches = len(sku_ids), len(branch_ids)
+    num_rows = num_skus * num_branches
+    sku_codes = np.repeat(np.arange(num_skus), num_branches)
+
+    sales_30d = rng.choice(
+        DAYS_OF_SALES_HISTORY * MAX_DAILY_SALES + 1, size=num_rows, p=_sales_30d_distribution()
+    )
+    avg_daily_sales = sales_30d / DAYS_OF_SALES_HISTORY
+
+    # Ensure a minimum stock of at least 5 units to avoid zero min/max for slow movers
+    min_stock = np.maximum(
+        5, (avg_daily_sales * SAFETY_STOCK_FACTOR * lead_time_days[sku_codes]).astype(np.int64)
+    )
+    max_stock = np.maximum(min_stock + 10, (min_stock * MAX_STOCK_FACTOR).astype(np.int64))
+
+    # Normal stock generation, ensuring some are below min to trigger reorders
+    branch_stock = rng.integers(np.maximum(0, min_stock - 10), max_stock + 5, endpoint=True)
+
+    # Case 1 (10% of items with sales): high Min_Stock, with Branch_Stock just below it
+    # (triggering both reorder and excess)
+    has_sales = avg_daily_sales > 0
+    reorder_and_excess = has_sales & (rng.random(num_rows) < 0.1)
+    high_min_stock = (avg_daily_sales * EXCESS_DOS_THRESHOLD * 1.5).astype(np.int64)
+    min_stock = np.where(reorder_and_excess, high_min_stock, min_stock)
+    max_stock = np.where(reorder_and_excess, (high_min_stock * 1.2).astype(np.int64), max_stock)
+    branch_stock = np.where(reorder_and_excess, (high_min_stock * 0.9).astype(np.int64), branch_stock)
+
+    # Case 2 (15% of the remaining items with sales): stock well above the EXCESS_DOS_THRESHOLD
+    excess = has_sales & ~reorder_and_excess & (rng.random(num_rows) < 0.15)
+    target_stock_for_excess = (avg_daily_sales * EXCESS_DOS_THRESHOLD * 1.2).astype(np.int64) # 20% above threshold
+    excess_low = np.maximum(max_stock + 10, target_stock_for_excess)
+    excess_high = np.maximum(excess_low, target_stock_for_excess + 50)
+    branch_stock = np.where(excess, rng.integers(excess_low, excess_high, endpoint=True), branch_stock)
+
+    return pd.DataFrame({
+        'SKU': pd.Categorical.from_codes(sku_codes, sku_ids),
+        'Branch': pd.Categorical.from_codes(np.tile(np.arange(num_branches), num_skus), branch_ids),
+        'Branch_Stock': branch_stock,
+        'Min_Stock': min_stock,
+        'Max_Stock': max_stock,
+        'Sales_30D': sales_30d
+    })
+
+
+def generate_warehouse_stock(rng, sku_ids, warehouse_ids):
+    """
+    Warehouse Stock: the total stock of each SKU across all warehouses (one row
+    per SKU, which is what the engine reads), and how that total is split
+    between the warehouses.
+    """
+    num_skus = len(sku_ids)
+    r = rng.random(num_skus)
+    # 20% chance of very low stock, 30% of low stock, 50% of moderate stock
+    low = np.select([r < 0.2, r < 0.5], [0, 10], default=50)
+    high = np.select([r < 0.2, r < 0.5], [10, 50], default=200)
+    warehouse_stock_levels = rng.integers(low, high)
+
+    warehouse_stock = pd.DataFrame({
+        'SKU': sku_ids,
+        'Warehouse_Stock': warehouse_stock_levels
+    })
+
+    num_warehouses = len(warehouse_ids)
+    split = rng.multinomial(warehouse_stock_levels, np.full(num_warehouses, 1.0 / num_warehouses))
+    warehouse_stock_by_location = pd.DataFrame({
+        'SKU': pd.Categorical.from_codes(np.repeat(np.arange(num_skus), num_warehouses), sku_ids),
+        'Warehouse': pd.Categorical.from_codes(np.tile(np.arange(num_warehouses), num_skus), warehouse_ids),
+        'Warehouse_Stock': split.ravel()
+    })
+    return warehouse_stock, warehouse_stock_by_location
+
+
+def generate_datasets(num_skus=NUM_SKUS, num_branches=NUM_BRANCHES, num_warehouses=NUM_WAREHOUSES, seed=None):
+    """
+    Generates a synthetic set of engine inputs. The same seed always gives the
+    same data.
+
+    Args:
+        num_skus (int): Number of SKUs.
+        num_branches (int): Number of branches; Branch_Inventory has num_skus * num_branches rows.
+        num_warehouses (int): Number of warehouses the warehouse stock is spread over.
+        seed (int, optional): Seed for the random generator.
+
+    Returns:
+        dict: DataFrames keyed by table name: SKU_Master, Branch_Inventory,
+              Warehouse_Stock and Warehouse_Stock_By_Location.
+    """
+    rng = np.random.default_rng(seed)
+    sku_ids = _padded_ids("SKU", num_skus, 4)
+    branch_ids = _padded_ids("BR", num_branches, 3)
+    warehouse_ids = _padded_ids("WH", num_warehouses, 2)
+
+    # === 1. SKU Master Data ===
+    sku_master = generate_sku_master(rng, sku_ids)
+    # === 2. Branch Inventory Data (num_skus × num_branches rows) ===
+    branch_inventory = generate_branch_inventory(
+        rng, sku_ids, branch_ids, sku_master['Lead_Time_Days'].to_numpy()
+    )
+    # === 3. Warehouse Stock (1 row per SKU, plus the split per warehouse) ===
+    warehouse_stock, warehouse_stock_by_location = generate_warehouse_stock(rng, sku_ids, warehouse_ids)
+
+    return {
+        "SKU_Master": sku_master,
+        "Branch_Inventory": branch_inventory,
+        "Warehouse_Stock": warehouse_stock,
+        "Warehouse_Stock_By_Location": warehouse_stock_by_location,
+    }
+
+
+def write_dataset(df, path, file_format):
+    """
+    Writes one generated table. Large CSVs are written with pyarrow when it is installed.
+    """
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+    elif file_format == "feather":
+        df.to_feather(path)
+    else:
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+        except ImportError:
+            df.to_csv(path, index=False)
+            return
+        # Generated values never contain commas or quotes, so nothing needs quoting;
+        # the header is written separately since pyarrow always quotes it
+        with open(path, "wb") as f:
+            f.write((",".join(df.columns) + "\n").encode())
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f,
+                             pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic replenishment input data.")
+    parser.add_argument("--skus", type=int, default=NUM_SKUS, help="Number of SKUs.")
+    parser.add_argument("--branches", type=int, default=NUM_BRANCHES, help="Number of branches.")
+    parser.add_argument("--warehouses", type=int, default=NUM_WAREHOUSES,
+                        help="Number of warehouses. With more than one, the split of each SKU's "
+                             "stock is also written to Warehouse_Stock_By_Location.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed, for reproducible data.")
+    parser.add_argument("--output-dir", default=".", help="Directory to write the files to.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Format of the generated files.")
+    args = parser.parse_args()
+    for name in ("skus", "branches", "warehouses"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name} must be at least 1.")
+    return args
+
+
+def main():
+    args = parse_args()
+    start_time = time.perf_counter()
+    datasets = generate_datasets(args.skus, args.branches, args.warehouses, args.seed)
+    if args.warehouses == 1:
+        del datasets["Warehouse_Stock_By_Location"]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    file_names = []
+    for table, df in datasets.items():
+        file_name = table + OUTPUT_FORMATS[args.format]
+        write_dataset(df, os.path.join(args.output_dir, file_name), args.format)
+        file_names.append(file_name)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Files generated successfully in '{args.output_dir}' ({elapsed:.1f}s):")
+    for file_name in file_names:
+        print(f" {file_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,213 @@
 import os
-from engine.core import run_replenishment_engine
+import argparse
+from engine.core import EXCESS_DOS_THRESHOLD, run_replenishment_engine
+from engine.streaming import DEFAULT_CHUNK_ROWS, run_replenishment_engine_streaming
+from engine.file_io import (
+    FILE_FORMATS, INPUT_TABLES, export_for_humans, load_input_tables, read_table, table_path, write_atomically
+)
+from engine.sweep import run_parameter_sweep
+from engine.sales_ledger import SalesLedger, append_sales_file
+from engine.inventory_store import InventoryStore
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the replenishment engine.")
+    parser.add_argument("--data-path", default="data", help="Directory holding the input files.")
+    parser.add_argument("--output-path", default="outputs", help="Directory to write the outputs to.")
+    parser.add_argument("--input-format", choices=FILE_FORMATS, default="csv", help="Format of the input files.")
+    parser.add_argument("--output-format", choices=FILE_FORMATS, default="csv",
+                        help="Format of the outputs. 'csv' writes Transfer_Orders.xlsx plus CSVs.")
+    parser.add_argument("--export", action="store_true",
+                        help="After a parquet/feather run, also write the CSV/XLSX files for review.")
+    parser.add_argument("--export-only", action="store_true",
+                        help="Skip the engine and only convert existing parquet/feather outputs to CSV/XLSX.")
+    parser.add_argument("--incremental-state", default=None,
+                        help="Directory for incremental runs; only SKUs changed since the last run are recomputed.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes to shard the run across by SKU (default: serial).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process Branch_Inventory in chunks to bound memory. The file must be sorted by SKU.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Branch inventory rows per chunk in --stream mode.")
+    parser.add_argument("--per-branch-sheets", action="store_true",
+                        help="Add a sheet per branch to Transfer_Orders.xlsx.")
+    parser.add_argument("--run-workspace", action="store_true",
+                        help="Write the outputs to a new directory under --output-path named by the run ID, "
+                             "and remove expired run directories there.")
+    parser.add_argument("--sales-ledger", default=None,
+                        help="Directory of a daily sales ledger; Min/Max are recomputed from its rolling 30-day sales.")
+    parser.add_argument("--append-sales", default=None,
+                        help="Before the run, append one day of sales (CSV with SKU, Branch, Units and optionally "
+                             "Date) to --sales-ledger, creating the ledger if needed.")
+    parser.add_argument("--forecast", action="store_true",
+                        help="With --sales-ledger, base Min/Max and excess stock on forecast daily sales "
+                             "(exponential smoothing, trend or weekday-seasonal, chosen per SKU x branch).")
+    parser.add_argument("--inventory-store", default=None,
+                        help="Read the inputs from this SQLite inventory store instead of --data-path.")
+    parser.add_argument("--import-to-store", action="store_true",
+                        help="Before the run, upsert the input files in --data-path into --inventory-store.")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="With --inventory-store, process only the SKUs changed since its last run.")
+    parser.add_argument("--order-diff", default=None,
+                        help="Directory keeping the last run's orders; also write Transfer_Orders_Changes and "
+                             "LPO_Needs_Changes with the orders added, removed or changed since that run.")
+    parser.add_argument("--lean", action="store_true",
+                        help="Keep peak memory down on large chains; the merged data is not kept after the calculations.")
+    parser.add_argument("--sweep-dos", type=float, nargs="+", default=None,
+                        help="Instead of a normal run, compare scenarios: excess DOS thresholds to try.")
+    parser.add_argument("--sweep-min-factor", type=float, nargs="+", default=None,
+                        help="Scenario multipliers of Min_Stock (default: 1).")
+    parser.add_argument("--sweep-max-factor", type=float, nargs="+", default=None,
+                        help="Scenario multipliers of Max_Stock (default: 1).")
+    parser.add_argument("--report-jsonl", default=None,
+                        help="Append the per-stage run report to this file as JSON lines.")
+    parser.add_argument("--report-prom", default=None,
+                        help="Write the per-stage run report to this file in the Prometheus textfile format.")
+    args = parser.parse_args()
+    if args.stream:
+        # The streaming engine supports none of these, so they would be silently ignored
+        unsupported = [flag for flag, value in (
+            ("--run-workspace", args.run_workspace),
+            ("--incremental-state", args.incremental_state),
+            ("--workers", args.workers),
+            ("--lean", args.lean),
+            ("--sales-ledger", args.sales_ledger),
+            ("--inventory-store", args.inventory_store),
+            ("--order-diff", args.order_diff),
+            ("--per-branch-sheets", args.per_branch_sheets),
+            ("--export", args.export),
+            ("--report-jsonl", args.report_jsonl),
+            ("--report-prom", args.report_prom),
+            ("--sweep-dos", args.sweep_dos),
+            ("--sweep-min-factor", args.sweep_min_factor),
+            ("--sweep-max-factor", args.sweep_max_factor),
+        ) if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be combined with --stream.")
+    if args.append_sales and not args.sales_ledger:
+        parser.error("--append-sales requires --sales-ledger.")
+    if args.forecast and not args.sales_ledger:
+        parser.error("--forecast requires --sales-ledger.")
+    if args.export_only and args.output_format == "csv":
+        parser.error("--export-only converts parquet or feather outputs; pass their --output-format.")
+    if (args.import_to_store or args.changed_only) and not args.inventory_store:
+        parser.error("--import-to-store and --changed-only require --inventory-store.")
+    if args.changed_only and (args.sweep_dos or args.sweep_min_factor or args.sweep_max_factor):
+        # Scenario totals over only the changed SKUs would not compare with those of any run
+        parser.error("--changed-only cannot be combined with the sweep options.")
+    return args
 
 def main():
-    DATA_PATH = "data"
-    OUTPUT_PATH = "outputs"
+    args = parse_args()
+    DATA_PATH = args.data_path
+    OUTPUT_PATH = args.output_path
+
+    if args.export_only:
+        try:
+            exported = export_for_humans(OUTPUT_PATH, source_format=args.output_format,
+                                         per_branch_sheets=args.per_branch_sheets)
+        except OSError as e:
+            print(f"Error exporting the outputs in '{OUTPUT_PATH}': {e}")
+            return
+        print(f"Exported: {', '.join(exported)}")
+        return
 
-    required_files = ["Branch_Inventory.csv", "Warehouse_Stock.csv", "SKU_Master.csv"]
     all_files_exist = True
-    for file_name in required_files:
-        if not os.path.exists(os.path.join(DATA_PATH, file_name)):
-            print(f"Error: Missing required data file: {os.path.join(DATA_PATH, file_name)}")
-            all_files_exist = False
+    if args.inventory_store and not args.import_to_store:
+        if not os.path.exists(args.inventory_store):
+            print(f"Error: Missing inventory store: {args.inventory_store}. Create it with --import-to-store.")
+            return
+    else:
+        for table in INPUT_TABLES:
+            file_path = table_path(DATA_PATH, table, args.input_format)
+            if not os.path.exists(file_path):
+                print(f"Error: Missing required data file: {file_path}")
+                all_files_exist = False
+
+    if all_files_exist and args.import_to_store:
+        with InventoryStore(args.inventory_store) as store:
+            snapshot_id, rows_changed = store.upsert(*load_input_tables(DATA_PATH, args.input_format),
+                                                     source=DATA_PATH)
+        print(f"Inventory store '{args.inventory_store}': snapshot {snapshot_id} changed {rows_changed} rows.")
+
+    if all_files_exist and args.append_sales:
+        keys = None
+        if not SalesLedger.exists(args.sales_ledger):
+            branch_inventory_path = table_path(DATA_PATH, "Branch_Inventory", args.input_format)
+            keys = read_table(branch_inventory_path, args.input_format)[['SKU', 'Branch']]
+        try:
+            ledger = append_sales_file(args.sales_ledger, args.append_sales, keys)
+        except (OSError, ValueError) as e:
+            print(f"Error appending sales from '{args.append_sales}': {e}")
+            return
+        print(f"Sales ledger '{args.sales_ledger}' now holds {ledger.num_days} days of sales.")
 
     if not all_files_exist:
-        print("\nPlease run 'python generate_dummy_replenishment_data.py' to create the necessary data files.")
+        print("\nPlease run 'python generate_dummy_replenishment_data.py --output-dir data' to create the necessary data files.")
         print("Make sure to move the generated CSVs into the 'data/' directory if they are not created there directly.")
+    elif args.sweep_dos or args.sweep_min_factor or args.sweep_max_factor:
+        print("All required data files found. Evaluating scenarios...")
+        summary, lpo_units_by_vendor = run_parameter_sweep(
+            data_path=DATA_PATH,
+            input_format=args.input_format,
+            dos_thresholds=args.sweep_dos or [EXCESS_DOS_THRESHOLD],
+            min_stock_factors=args.sweep_min_factor or [1.0],
+            max_stock_factors=args.sweep_max_factor or [1.0],
+            sales_ledger_path=args.sales_ledger,
+            forecast=args.forecast,
+            inventory_store_path=args.inventory_store
+        )
+        scenarios = summary.join(lpo_units_by_vendor.add_prefix("LPO_Units_"))
+        print(f"\n{scenarios.to_string(index=False)}")
+        os.makedirs(OUTPUT_PATH, exist_ok=True)
+        scenarios_path = os.path.join(OUTPUT_PATH, "Scenario_Summary.csv")
+        write_atomically(scenarios_path, lambda path: scenarios.to_csv(path, index=False))
+        print(f"\nScenario summary saved to '{scenarios_path}'.")
+    elif args.stream:
+        print("All required data files found. Running replenishment engine in streaming mode...")
+        rows_written = run_replenishment_engine_streaming(
+            data_path=DATA_PATH,
+            output_path=OUTPUT_PATH,
+            input_format=args.input_format,
+            output_format=args.output_format,
+            chunk_rows=args.chunk_rows
+        )
+        print("\nReplenishment process completed successfully.")
+        print(f"Transfer Orders generated: {rows_written['Transfer_Orders']}")
+        print(f"LPO Needs identified: {rows_written['LPO_Needs']}")
+        print(f"Excess Stock identified: {rows_written['Excess_Stock']}")
     else:
         print("All required data files found. Running replenishment engine...")
-        merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df = run_replenishment_engine(
+        _, transfer_orders_df, lpo_needs_df, excess_stock_df, report = run_replenishment_engine(
             data_path=DATA_PATH,
-            output_path=OUTPUT_PATH
+            output_path=OUTPUT_PATH,
+            input_format=args.input_format,
+            output_format=args.output_format,
+            incremental_state_path=args.incremental_state,
+            workers=args.workers,
+            return_report=True,
+            report_jsonl_path=args.report_jsonl,
+            report_prom_path=args.report_prom,
+            per_branch_sheets=args.per_branch_sheets,
+            run_workspace=args.run_workspace,
+            sales_ledger_path=args.sales_ledger,
+            forecast=args.forecast,
+            inventory_store_path=args.inventory_store,
+            changed_only=args.changed_only,
+            order_diff_path=args.order_diff,
+            lean=args.lean
         )
-        if merged_data is not None:
+        if transfer_orders_df is not None:
             print("\nReplenishment process completed successfully.")
             print(f"Transfer Orders generated: {len(transfer_orders_df)}")
             print(f"LPO Needs identified: {len(lpo_needs_df)}")
             print(f"Excess Stock identified: {len(excess_stock_df)}")
+            print(f"\n{report.summary()}")
+            if args.export and args.output_format != "csv":
+                exported = export_for_humans(report.output_path, source_format=args.output_format,
+                                             per_branch_sheets=args.per_branch_sheets)
+                print(f"Exported for review: {', '.join(exported)}")
         else:
             print("\nReplenishment process failed. Check error messages above.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,198 @@
+import pandas as pd
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from .file_io import write_atomically
+
+# Bump when the engine's results change for the same inputs, so old entries are never served
+CACHE_VERSION = 2
+
+DEFAULT_MAX_ENTRIES = 8
+DEFAULT_MAX_DISK_ENTRIES = 32
+DISK_SUFFIX = ".pkl"
+
+
+def frame_digest(df):
+    """
+    Returns a content hash of a DataFrame: its column names and the values of
+    every row, in order. The index is ignored.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(column) for column in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def bytes_digest(data):
+    """
+    Returns a content hash of raw bytes, e.g. an uploaded file.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def result_cache_key(frames, params):
+    """
+    Builds the cache key of an engine run from its input tables and the engine
+    parameters that affect its results.
+
+    Args:
+        frames (list): The input DataFrames, in a fixed order.
+        params (dict): JSON-serialisable parameters, e.g. {'excess_dos_threshold': 70}.
+
+    Returns:
+        str: A hex key.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{CACHE_VERSION}".encode())
+    for df in frames:
+        digest.update(frame_digest(df).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A thread-safe LRU cache of engine results with an optional on-disk tier.
+
+    The memory tier holds up to max_entries values and evicts the least
+    recently used one. With disk_path set, every value is also pickled there
+    (up to max_disk_entries files, least recently used removed first), so
+    results survive a restart and outlive memory eviction. Only point
+    disk_path at a directory this application owns, as entries are unpickled.
+    Several processes may share disk_path: entries are written atomically, and
+    one removed by another process is treated as a miss.
+
+    Pickling a cache (e.g. to pass it to a worker process) keeps only the disk
+    tier, which is how entries are shared between processes; each process's
+    memory tier only serves its own lookups.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_path=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_path is not None:
+            os.makedirs(disk_path, exist_ok=True)
+
+    def __getstate__(self):
+        # Sent to worker processes without the memory tier; the disk tier is shared
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (self.disk_path is not None and os.path.exists(self._disk_file(key)))
+
+    def _disk_file(self, key):
+        return os.path.join(self.disk_path, key + DISK_SUFFIX)
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached under key, from memory or else from disk, or default.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self.disk_path is not None:
+                disk_file = self._disk_file(key)
+                try:
+                    with open(disk_file, "rb") as f:
+                        value = pickle.load(f)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    # A corrupt or incompatible entry is dropped rather than failing the run
+                    print(f"Discarding unreadable cache entry {disk_file}: {e}")
+                    _remove_if_exists(disk_file)
+                else:
+                    try:
+                        os.utime(disk_file)
+                    except FileNotFoundError:
+                        pass  # Trimmed by another process since it was read
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Caches value under key, evicting the least recently used entries beyond the limits.
+        """
+        with self._lock:
+            self._remember(key, value)
+            if self.disk_path is not None:
+                write_atomically(self._disk_file(key), lambda path: self._dump(path, value))
+                self._trim_disk()
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the value cached under key, calling compute() and caching its result on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.disk_path is not None:
+                for name in os.listdir(self.disk_path):
+                    if name.endswith(DISK_SUFFIX):
+                        _remove_if_exists(os.path.join(self.disk_path, name))
+
+    @staticmethod
+    def _dump(path, value):
+        with open(path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _trim_disk(self):
+        # Other processes may share the directory and remove entries at any point
+        # during this, so a file that has gone is skipped rather than an error
+        modified_at = {}
+        for name in os.listdir(self.disk_path):
+            if name.endswith(DISK_SUFFIX):
+                path = os.path.join(self.disk_path, name)
+                try:
+                    modified_at[path] = os.path.getmtime(path)
+                except FileNotFoundError:
+                    pass
+        if len(modified_at) <= self.max_disk_entries:
+            return
+        files = sorted(modified_at, key=modified_at.get)
+        for path in files[:len(files) - self.max_disk_entries]:
+            _remove_if_exists(path)
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
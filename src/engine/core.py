@@ -1,7 +1,18 @@
 
 import pandas as pd
+import numpy as np
 import os
 import shutil
+from .schema import apply_schema, align_key_categories, frames_memory_mb
+from .file_io import build_change_artifacts, build_output_artifacts, load_input_tables, save_artifacts, write_outputs
+from .instrumentation import RunReport
+from .cache import result_cache_key
+from .workspaces import cleanup_run_workspaces, create_run_workspace
+from .sales_ledger import SalesLedger, apply_sales_history
+from .inventory_store import InventoryStore
+from .order_diff import compute_order_changes, save_snapshots
+from . import incremental
+from . import parallel
 
 def clear_output_directory(output_path):
     """
@@ -24,129 +35,258 @@ def clear_output_directory(output_path):
 # Define a configurable threshold for excess stock in days of supply
 EXCESS_DOS_THRESHOLD = 70 # As per new requirement
 
-def run_replenishment_engine(
-    branch_inventory_df=None,
-    warehouse_stock_df=None,
-    sku_master_df=None,
-    data_path="data",
-    output_path="outputs"
-):
+
+def calculate_reorder_qty(merged_data):
     """
-    Runs the core replenishment logic based on a hub-and-spoke model.
-    This includes calculating reorders, allocating stock, creating LPOs,
-    and identifying excess stock based on Days of Stock (DOS).
+    Calculates the quantity each branch needs to get back up to its Max_Stock.
+    Rows that are not below Min_Stock need nothing.
 
     Args:
-        branch_inventory_df (pd.DataFrame, optional): DataFrame for branch inventory.
-        warehouse_stock_df (pd.DataFrame, optional): DataFrame for warehouse stock.
-        sku_master_df (pd.DataFrame, optional): DataFrame for SKU master data.
-        data_path (str): The path to the directory containing the input CSV data files (used if DataFrames are not provided).
-        output_path (str): The path to the directory where output CSV files will be saved.
+        merged_data (pd.DataFrame): Data with Branch_Stock, Min_Stock and Max_Stock columns.
 
     Returns:
-        tuple: A tuple containing four DataFrames:
-               - merged_data: The merged and processed data with all calculations.
-               - transfer_orders_df: The list of SKUs to be transferred from the warehouse.
-               - lpo_needs_df: The list of SKUs that require a Local Purchase Order.
-               - excess_stock_df: The list of SKUs that are overstocked at branches.
+        pd.Series: The reorder quantity for every row, aligned to merged_data's index.
     """
-    # --- 1. Load Data ---
-    if branch_inventory_df is not None and warehouse_stock_df is not None and sku_master_df is not None:
-        branch_inventory = branch_inventory_df
-        warehouse_stock = warehouse_stock_df
-        sku_master = sku_master_df
-    else:
-        try:
-            branch_inventory = pd.read_csv(os.path.join(data_path, "Branch_Inventory.csv"))
-            warehouse_stock = pd.read_csv(os.path.join(data_path, "Warehouse_Stock.csv"))
-            sku_master = pd.read_csv(os.path.join(data_path, "SKU_Master.csv"))
-        except FileNotFoundError as e:
-            print(f"Error loading data: {e}. Make sure the CSV files are in the '{data_path}' directory.")
-            return None, None, None, None
-
-    # --- 2. Merge DataFrames for a complete view ---
+    branch_stock = merged_data['Branch_Stock'].to_numpy()
+    shortfall = merged_data['Max_Stock'].to_numpy() - branch_stock
+    reorder_qty = np.where(
+        (branch_stock < merged_data['Min_Stock'].to_numpy()) & (shortfall > 0),
+        shortfall,
+        0
+    )
+    return pd.Series(reorder_qty, index=merged_data.index)
+
+
+def calculate_excess_stock(avg_daily_sales, branch_stock, dos_threshold=EXCESS_DOS_THRESHOLD):
+    """
+    Calculates the Days of Stock target and the stock held above it.
+    Items with no sales have a target of 0, so all of their stock is excess.
+
+    Args:
+        avg_daily_sales (pd.Series): Average daily sales per row.
+        branch_stock (pd.Series): Current branch stock per row.
+        dos_threshold (int): Days of supply a branch is allowed to hold.
+
+    Returns:
+        tuple: Two Series aligned to avg_daily_sales' index:
+               - target_excess_stock: avg_daily_sales * dos_threshold (0 when there are no sales).
+               - excess_qty: branch stock above the target, never negative.
+    """
+    ads = avg_daily_sales.to_numpy(dtype='float64')
+    target = np.where(ads > 0, ads * dos_threshold, 0.0)
+    excess = branch_stock.to_numpy() - target
+    excess = np.where(excess > 0, excess, 0.0)
+    return (
+        pd.Series(target, index=avg_daily_sales.index),
+        pd.Series(excess, index=avg_daily_sales.index)
+    )
+
+# Reason of an LPO trigger transfer, by whether the warehouse sent part of the reorder
+LPO_REASONS = np.array(["Warehouse Out of Stock", "Partial Allocation"], dtype=object)
+
+# The columns allocate_warehouse_stock reads; only these are copied for the reorder rows
+ALLOCATION_COLUMNS = ['SKU', 'Branch', 'Vendor', 'Branch_Stock', 'Min_Stock', 'Max_Stock', 'ReorderQty']
+
+
+def allocate_warehouse_stock(reorder_df, available_warehouse_stock):
+    """
+    Allocates warehouse stock to branch reorders, first-come within each SKU.
+    Each row receives what is left after the earlier rows for the same SKU were
+    served, so this is a per-SKU running total of demand clipped at the
+    warehouse stock. Anything the warehouse cannot cover becomes an LPO shortfall.
+
+    Args:
+        reorder_df (pd.DataFrame): Rows with ReorderQty > 0, in allocation order.
+        available_warehouse_stock (pd.Series): Warehouse stock indexed by SKU.
+                                               SKUs missing from it have no stock.
+
+    Returns:
+        tuple: A tuple containing:
+               - transfer_orders_df: One row per reorder the warehouse could (partly) serve.
+               - lpo_shortfalls_df: Unaggregated SKU, Required_Qty and Vendor for every shortfall.
+               - lpo_trigger_transfers_df: Allocation details for every reorder that triggered an LPO.
+               - remaining_warehouse_stock: available_warehouse_stock after all transfers.
+    """
+    reorder_qty = reorder_df['ReorderQty'].to_numpy(dtype='int64')
+    warehouse_stock_values = available_warehouse_stock.to_numpy(dtype='int64')
+    sku_position = available_warehouse_stock.index.get_indexer(reorder_df['SKU'])
+    stock_at_start = np.where(sku_position >= 0, warehouse_stock_values[sku_position], 0)
+
+    # Demand already served by earlier rows of the same SKU. The warehouse can
+    # never give out more than it holds, and gives nothing if its stock is negative.
+    demand_before_row = (
+        pd.Series(reorder_qty, index=reorder_df.index)
+        .groupby(reorder_df['SKU'], sort=False, observed=True).cumsum().to_numpy()
+        - reorder_qty
+    )
+    stock_before = stock_at_start - np.minimum(demand_before_row, np.maximum(stock_at_start, 0))
+
+    fulfillable_qty = np.minimum(reorder_qty, stock_before)
+    transferred_qty = np.where(fulfillable_qty > 0, fulfillable_qty, 0)
+    stock_after = stock_before - transferred_qty
+    lpo_shortfall = reorder_qty - fulfillable_qty
+
+    transfer_mask = fulfillable_qty > 0
+    transfer_orders_df = pd.DataFrame({
+        'SKU': reorder_df['SKU'].array[transfer_mask],
+        'From_Warehouse': 'WH01',
+        'To_Branch': reorder_df['Branch'].array[transfer_mask],
+        'Min_Stock': reorder_df['Min_Stock'].array[transfer_mask],
+        'Max_Stock': reorder_df['Max_Stock'].array[transfer_mask],
+        'Branch_Stock': reorder_df['Branch_Stock'].array[transfer_mask],
+        'Transfer_Qty': fulfillable_qty[transfer_mask],
+        'Warehouse_Stock': stock_before[transfer_mask]  # Stock before this specific transfer
+    })
+
+    lpo_mask = lpo_shortfall > 0
+    lpo_shortfalls_df = pd.DataFrame({
+        'SKU': reorder_df['SKU'].array[lpo_mask],
+        'Required_Qty': lpo_shortfall[lpo_mask],
+        'Vendor': reorder_df['Vendor'].array[lpo_mask]
+    })
+    lpo_trigger_transfers_df = pd.DataFrame({
+        'SKU': reorder_df['SKU'].array[lpo_mask],
+        'Branch': reorder_df['Branch'].array[lpo_mask],
+        'ReorderQty': reorder_qty[lpo_mask],
+        'Transfer_Qty_from_WH': fulfillable_qty[lpo_mask],
+        'Warehouse_Stock_Before_Transfer': stock_before[lpo_mask],
+        'Warehouse_Stock_After_Transfer': stock_after[lpo_mask],
+        'LPO_Shortfall': lpo_shortfall[lpo_mask],
+        # Indexing an object array shares the two strings, rather than making one per row
+        'Reason': LPO_REASONS[(transferred_qty[lpo_mask] > 0).astype(np.intp)]
+    })
+
+    in_warehouse = sku_position >= 0
+    transferred_per_sku = np.bincount(
+        sku_position[in_warehouse], weights=transferred_qty[in_warehouse], minlength=len(warehouse_stock_values)
+    ).astype('int64')
+    remaining_warehouse_stock = pd.Series(
+        warehouse_stock_values - transferred_per_sku, index=available_warehouse_stock.index, name='Warehouse_Stock'
+    )
+
+    return transfer_orders_df, lpo_shortfalls_df, lpo_trigger_transfers_df, remaining_warehouse_stock
+
+
+def merge_inputs(branch_inventory, warehouse_stock, sku_master, lean=False):
+    """
+    Joins the three input tables into one row per SKU x branch and builds the
+    warehouse stock lookup used by the allocation.
+
+    Args:
+        branch_inventory (pd.DataFrame): Branch inventory with the input schema applied.
+        warehouse_stock (pd.DataFrame): Warehouse stock with the input schema applied.
+        sku_master (pd.DataFrame): SKU master with the input schema applied.
+        lean (bool): Look the SKU master and warehouse columns up by SKU code and
+                     build merged_data in one pass, instead of two chained merges
+                     that each copy every row. A lookup cannot repeat branch rows,
+                     so if SKU_Master or Warehouse_Stock repeats a SKU, the merges
+                     are used anyway and the result is the same as without lean.
+
+    Returns:
+        tuple: merged_data and available_warehouse_stock (a Series indexed by SKU).
+    """
+    # Share one set of SKU categories so the merges below join on integer codes
+    branch_inventory, warehouse_stock, sku_master = align_key_categories(
+        [branch_inventory, warehouse_stock, sku_master], column='SKU'
+    )
+
+    # Duplicate SKUs in the warehouse file resolve to the last row, as a dict lookup would
+    available_warehouse_stock = warehouse_stock.drop_duplicates(subset='SKU', keep='last').set_index('SKU')['Warehouse_Stock']
+    if lean:
+        if not (sku_master['SKU'].duplicated().any() or warehouse_stock['SKU'].duplicated().any()):
+            return _lookup_merge(branch_inventory, warehouse_stock, sku_master), available_warehouse_stock
+        print("SKU_Master or Warehouse_Stock repeats SKUs, whose branch rows the merge repeats; "
+              "merging without the lean lookup.")
+
     merged_data = pd.merge(branch_inventory, sku_master, on='SKU')
     merged_data = pd.merge(merged_data, warehouse_stock, on='SKU')
+    return merged_data, available_warehouse_stock
 
-    # --- 3. Identify Branch Requirement ---
-    merged_data['ReorderQty'] = merged_data.apply(
-        lambda row: max(0, row['Max_Stock'] - row['Branch_Stock']) if row['Branch_Stock'] < row['Min_Stock'] else 0,
-        axis=1
+
+def _lookup_merge(branch_inventory, warehouse_stock, sku_master):
+    """
+    Inner-joins the SKU master and warehouse stock onto the branch inventory by
+    taking their rows at each branch row's SKU code. Tables must share SKU
+    categories and hold one row per SKU.
+    """
+    sku_codes = branch_inventory['SKU'].cat.codes.to_numpy()
+    num_categories = len(branch_inventory['SKU'].cat.categories)
+    row_of_sku = []
+    for table in (sku_master, warehouse_stock):
+        # Position of each SKU's row in the table, or -1 where it has none
+        positions = np.full(num_categories + 1, -1, dtype=np.int32)
+        positions[table['SKU'].cat.codes.to_numpy()] = np.arange(len(table), dtype=np.int32)
+        row_of_sku.append(positions[sku_codes])
+    matched = (row_of_sku[0] >= 0) & (row_of_sku[1] >= 0)
+
+    # Columns are added one at a time: building the frame from a dict of arrays
+    # would copy them all again to consolidate them
+    merged_data = branch_inventory[matched] if not matched.all() else branch_inventory.copy()
+    merged_data.index = pd.RangeIndex(len(merged_data))
+    for table, rows in zip((sku_master, warehouse_stock), row_of_sku):
+        rows = rows[matched]
+        for column in table.columns.drop('SKU'):
+            merged_data[column] = table[column].array.take(rows)
+    return merged_data
+
+
+def create_transfers_and_lpos(merged_data, available_warehouse_stock):
+    """
+    Allocates warehouse stock to the rows of merged_data that need a reorder
+    and totals the unfulfilled quantities into LPO needs per SKU and vendor.
+
+    Args:
+        merged_data (pd.DataFrame): Merged data with a ReorderQty column.
+        available_warehouse_stock (pd.Series): Warehouse stock indexed by SKU.
+
+    Returns:
+        tuple: transfer_orders_df, lpo_needs_df and lpo_trigger_transfers_df.
+    """
+    # A stable sort keeps each SKU's branches in input order, so a SKU's
+    # allocation never depends on which other SKUs are in the frame
+    reorder_df = merged_data.loc[merged_data['ReorderQty'] > 0, ALLOCATION_COLUMNS].sort_values(by='SKU', kind='stable')
+
+    transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df, _ = allocate_warehouse_stock(
+        reorder_df, available_warehouse_stock
     )
+    lpo_needs_df = lpo_needs_df.groupby(['SKU', 'Vendor'], observed=True)['Required_Qty'].sum().reset_index()
 
-    # --- 4. Allocate Stock & Create LPO ---
-    transfer_orders_list = []
-    lpo_needs_list = []
-    lpo_trigger_transfers_list = []
-    available_warehouse_stock = warehouse_stock.set_index('SKU')['Warehouse_Stock'].to_dict()
-    reorder_df = merged_data[merged_data['ReorderQty'] > 0].sort_values(by='SKU')
-
-    for _, row in reorder_df.iterrows():
-        sku = row['SKU']
-        reorder_qty = row['ReorderQty']
-        
-        # Capture initial warehouse stock for this SKU before any deductions for this specific reorder
-        initial_warehouse_stock_for_sku = available_warehouse_stock.get(sku, 0)
-
-        fulfillable_qty = min(reorder_qty, initial_warehouse_stock_for_sku)
-
-        if fulfillable_qty > 0:
-            transfer_orders_list.append({
-                'SKU': sku,
-                'From_Warehouse': 'WH01',
-                'To_Branch': row['Branch'],
-                'Min_Stock': row['Min_Stock'],
-                'Max_Stock': row['Max_Stock'],
-                'Branch_Stock': row['Branch_Stock'],
-                'Transfer_Qty': fulfillable_qty,
-                'Warehouse_Stock': initial_warehouse_stock_for_sku  # Stock before this specific transfer
-            })
-            available_warehouse_stock[sku] -= fulfillable_qty
-
-        lpo_shortfall = reorder_qty - fulfillable_qty
-        if lpo_shortfall > 0:
-            lpo_needs_list.append({
-                'SKU': sku, 'Required_Qty': lpo_shortfall, 'Vendor': row['Vendor']
-            })
-
-            # Capture LPO trigger details for the new sheet
-            reason = "Partial Allocation" if fulfillable_qty > 0 else "Warehouse Out of Stock"
-            lpo_trigger_transfers_list.append({
-                'SKU': sku,
-                'Branch': row['Branch'],
-                'ReorderQty': reorder_qty,
-                'Transfer_Qty_from_WH': fulfillable_qty,
-                'Warehouse_Stock_Before_Transfer': initial_warehouse_stock_for_sku, # Use the captured initial stock
-                'Warehouse_Stock_After_Transfer': available_warehouse_stock.get(sku, 0), # This is the stock after deduction
-                'LPO_Shortfall': lpo_shortfall,
-                'Reason': reason
-            })
-
-    transfer_orders_df = pd.DataFrame(transfer_orders_list)
-    if not transfer_orders_df.empty:
-        transfer_orders_df = transfer_orders_df[[
-            'SKU', 'From_Warehouse', 'To_Branch', 'Min_Stock', 'Max_Stock',
-            'Branch_Stock', 'Transfer_Qty', 'Warehouse_Stock'
-        ]]
-    lpo_needs_df = pd.DataFrame(lpo_needs_list)
-    if not lpo_needs_df.empty:
-        lpo_needs_df = lpo_needs_df.groupby(['SKU', 'Vendor'])['Required_Qty'].sum().reset_index()
+    lpo_trigger_transfers_df = lpo_trigger_transfers_df[[
+        'SKU', 'Branch', 'ReorderQty', 'Transfer_Qty_from_WH',
+        'Warehouse_Stock_After_Transfer',
+        'LPO_Shortfall', 'Reason'
+    ]]
+    return transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df
 
-    # --- 5. Identify Excess Stock based on Days of Stock (DOS) ---
-    # Calculate Average Daily Sales (ADS) from Sales_30D
-    merged_data['Avg_Daily_Sales'] = merged_data['Sales_30D'] / 30
+
+def identify_excess_stock(merged_data, lean=False):
+    """
+    Adds the Days of Stock columns to merged_data (in place) and returns the
+    rows holding stock above the excess target.
+
+    Args:
+        merged_data (pd.DataFrame): Merged data with a ReorderQty column.
+        lean (bool): Leave merged_data as it is and compute the columns only for
+                     the excess rows, without the duplicate display columns
+                     ('70D Target(daily*70)' and 'Excess(branch stock - 70D target)'),
+                     which file_io adds when the human-facing files are written.
+
+    Returns:
+        pd.DataFrame: The excess stock rows, with the calculated fields rounded to 2 decimals.
+    """
+    if lean:
+        return _lean_excess_stock(merged_data)
+
+    # Calculate Average Daily Sales (ADS) from Sales_30D, unless the sales ledger set it
+    if 'Avg_Daily_Sales' not in merged_data.columns:
+        merged_data['Avg_Daily_Sales'] = merged_data['Sales_30D'] / 30
 
     # Rename ReorderQty to Total_Branch_Requirement for clarity
     merged_data.rename(columns={'ReorderQty': 'Total_Branch_Requirement'}, inplace=True)
 
     # Calculate Target Excess Stock and Excess Quantity
-    merged_data['Target_Excess_Stock'] = merged_data.apply(
-        lambda row: row['Avg_Daily_Sales'] * EXCESS_DOS_THRESHOLD if row['Avg_Daily_Sales'] > 0 else 0,
-        axis=1
-    )
-    merged_data['ExcessQty'] = merged_data.apply(
-        lambda row: max(0, row['Branch_Stock'] - row['Target_Excess_Stock']),
-        axis=1
+    merged_data['Target_Excess_Stock'], merged_data['ExcessQty'] = calculate_excess_stock(
+        merged_data['Avg_Daily_Sales'], merged_data['Branch_Stock']
     )
 
     # Create the specific columns requested for the output file
@@ -163,31 +303,475 @@ def run_replenishment_engine(
     for col in ['Avg_Daily_Sales', 'Target_Excess_Stock', 'ExcessQty', '70D Target(daily*70)', 'Excess(branch stock - 70D target)']:
         if col in excess_stock_df.columns:
             excess_stock_df[col] = excess_stock_df[col].round(2)
+    return excess_stock_df
+
+
+def _lean_excess_stock(merged_data):
+    if 'Avg_Daily_Sales' in merged_data.columns:
+        avg_daily_sales = merged_data['Avg_Daily_Sales']
+    else:
+        avg_daily_sales = merged_data['Sales_30D'] / 30
+    target_excess_stock, excess_qty = calculate_excess_stock(avg_daily_sales, merged_data['Branch_Stock'])
+    is_excess = excess_qty.to_numpy() > 0
+
+    excess_stock_df = merged_data.loc[is_excess, [
+        'Branch', 'SKU', 'Product_Name', 'Branch_Stock', 'Min_Stock', 'Max_Stock', 'ReorderQty', 'Sales_30D'
+    ]].rename(columns={'ReorderQty': 'Total_Branch_Requirement'})
+    excess_stock_df['Avg_Daily_Sales'] = avg_daily_sales[is_excess].round(2)
+    excess_stock_df['Target_Excess_Stock'] = target_excess_stock[is_excess].round(2)
+    excess_stock_df['ExcessQty'] = excess_qty[is_excess].round(2)
+    return excess_stock_df
+
+
+def compute_replenishment(merged_data, available_warehouse_stock, report=None, lean=False):
+    """
+    Runs the calculation steps of the engine (reorder quantities, warehouse
+    allocation, LPO needs and excess stock) on already merged data.
+    Every step is independent across SKUs, so this can be called on any subset
+    of SKUs as long as available_warehouse_stock covers them.
+
+    Args:
+        merged_data (pd.DataFrame): Branch inventory merged with SKU master and warehouse stock.
+                                    Derived columns are added to it in place.
+        available_warehouse_stock (pd.Series): Warehouse stock indexed by SKU.
+        report (RunReport, optional): Report to record steps 3 to 5 in as stages.
+        lean (bool): Return None for merged_data and leave the duplicate display
+                     columns out of excess_stock_df (see identify_excess_stock).
+
+    Returns:
+        tuple: merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df and
+               lpo_trigger_transfers_df.
+    """
+    report = report if report is not None else RunReport()
+
+    # --- 3. Identify Branch Requirement ---
+    with report.stage("reorder", rows_in=len(merged_data)) as stage:
+        merged_data['ReorderQty'] = calculate_reorder_qty(merged_data)
+        stage.rows_out = int((merged_data['ReorderQty'] > 0).sum())
+
+    # --- 4. Allocate Stock & Create LPO ---
+    with report.stage("allocate", rows_in=stage.rows_out) as stage:
+        transfer_orders_df, lpo_needs_df, lpo_trigger_transfers_df = create_transfers_and_lpos(
+            merged_data, available_warehouse_stock
+        )
+        stage.rows_out = len(transfer_orders_df)
+
+    # --- 5. Identify Excess Stock based on Days of Stock (DOS) ---
+    with report.stage("excess", rows_in=len(merged_data)) as stage:
+        excess_stock_df = identify_excess_stock(merged_data, lean)
+        stage.rows_out = len(excess_stock_df)
+
+    if lean:
+        merged_data = None
+    return merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df
+
+
+def _compute(merged_data, available_warehouse_stock, workers=None, report=None, lean=False):
+    """
+    Runs compute_replenishment serially, or on SKU shards across worker processes.
+    A parallel run is recorded in the report as a single 'calculate' stage.
+    """
+    if workers is not None and workers > 1:
+        report = report if report is not None else RunReport()
+        with report.stage("calculate", rows_in=len(merged_data)) as stage:
+            results = parallel.compute_replenishment_parallel(merged_data, available_warehouse_stock, workers, lean)
+            # Rows of all four output tables together
+            stage.rows_out = sum(len(df) for df in results[1:])
+        return results
+    return compute_replenishment(merged_data, available_warehouse_stock, report, lean)
+
+
+def _compute_incremental(merged_data, available_warehouse_stock, branch_inventory, warehouse_stock, sku_master,
+                         state_path, workers=None, report=None, lean=False):
+    """
+    Runs compute_replenishment only for the SKUs whose inputs changed since the
+    run saved in state_path, and splices the results into that run's results.
+    Falls back to a full recompute when there is no usable saved state.
+    """
+    report = report if report is not None else RunReport()
+    # Lean runs save excess stock without the display columns, so they cannot splice with other runs
+    params = {"excess_dos_threshold": EXCESS_DOS_THRESHOLD, "lean": lean}
+    result_names = ["transfer_orders", "lpo_needs", "excess_stock", "lpo_trigger_transfers"]
+
+    with report.stage("detect_changes", rows_in=len(merged_data)) as stage:
+        current_hashes = incremental.sku_content_hashes(branch_inventory, warehouse_stock, sku_master)
+        previous_hashes, previous_results = incremental.load_state(state_path, params)
+        full_recompute = previous_hashes is None or merged_data.duplicated(subset=['SKU', 'Branch']).any()
+        if full_recompute:
+            changed_data = merged_data
+            num_recomputed = len(current_hashes)
+        else:
+            recomputed_skus = incremental.changed_skus(previous_hashes, current_hashes)
+            changed_data = merged_data[merged_data['SKU'].isin(recomputed_skus)].copy()
+            num_recomputed = len(recomputed_skus)
+        stage.rows_out = len(changed_data)
+
+    results = _compute(changed_data, available_warehouse_stock, workers, report, lean)
+
+    with report.stage("splice_results") as stage:
+        if not full_recompute:
+            spliced = incremental.splice_results(
+                previous_results, dict(zip(result_names, results[1:])), recomputed_skus, merged_data
+            )
+            results = (results[0], *(spliced[name] for name in result_names))
+        incremental.save_state(state_path, params, current_hashes, dict(zip(result_names, results[1:])))
+        stage.rows_out = sum(len(df) for df in results[1:])
+
+    print(f"Incremental run: recomputed {num_recomputed} of {len(current_hashes)} SKUs.")
+    return results
+
+
+def _planned_stages(mode, workers=None, use_cache=False):
+    """
+    Returns the number of report stages a run in the given mode goes through,
+    used as the total for progress callbacks.
+    """
+    compute_stages = 1 if workers is not None and workers > 1 else 3
+    num_stages = 3 + compute_stages  # load, merge, compute and write
+    if mode == "incremental":
+        num_stages += 2  # detect_changes and splice_results
+    elif use_cache:
+        num_stages += 1  # cache_lookup
+    return num_stages
+
+
+def _engine_results(results, report=None, artifacts=None):
+    """
+    Appends the optional report and artifacts to the engine's result tuple.
+    """
+    if report is not None:
+        # The callback belongs to the caller's run; dropping it keeps the report picklable
+        report.progress_callback = None
+        results += (report,)
+    if artifacts is not None:
+        results += (artifacts,)
+    return results
+
+
+def _engine_cache_key(branch_inventory, warehouse_stock, sku_master, output_format, per_branch_sheets,
+                      return_artifacts, lean):
+    return result_cache_key(
+        [branch_inventory, warehouse_stock, sku_master],
+        {
+            "excess_dos_threshold": EXCESS_DOS_THRESHOLD,
+            "output_format": output_format,
+            "per_branch_sheets": per_branch_sheets,
+            "return_artifacts": return_artifacts,
+            "lean": lean,
+        }
+    )
+
+
+def _cached_rows(cached):
+    """
+    Rows of the four output tables of a cached run, or 0 for a miss.
+    """
+    return 0 if cached is None else sum(len(df) for df in cached[:4])
+
+
+def lookup_cached_run(cache, branch_inventory_df, warehouse_stock_df, sku_master_df, output_format="csv",
+                      per_branch_sheets=False, return_artifacts=False, lean=False):
+    """
+    Looks a run on the given input tables up in the result cache without
+    running the engine. Callers that run the engine in another process (e.g.
+    through a JobManager) check here first: worker processes only share the
+    cache's disk tier, so this is what lets repeat runs be served from the
+    memory tier of the calling process.
+
+    Args:
+        cache (ResultCache): The cache passed to run_replenishment_engine.
+        The other arguments are those of run_replenishment_engine.
+
+    Returns:
+        tuple: What run_replenishment_engine(..., output_path=None, return_report=True,
+               cache=cache) returns on a cache hit (merged_data is None), with the
+               artifacts appended if return_artifacts. None if the run is not cached.
+    """
+    report = RunReport(mode="cached")
+    with report.stage("load") as stage:
+        branch_inventory = apply_schema(branch_inventory_df, "Branch_Inventory")
+        warehouse_stock = apply_schema(warehouse_stock_df, "Warehouse_Stock")
+        sku_master = apply_schema(sku_master_df, "SKU_Master")
+        stage.rows_out = len(branch_inventory)
+    with report.stage("cache_lookup", rows_in=len(branch_inventory)) as stage:
+        cached = cache.get(_engine_cache_key(branch_inventory, warehouse_stock, sku_master, output_format,
+                                             per_branch_sheets, return_artifacts, lean))
+        stage.rows_out = _cached_rows(cached)
+    if cached is None:
+        return None
+    transfer_orders_df, lpo_needs_df, excess_stock_df, _, artifacts = cached
+    return _engine_results((None, transfer_orders_df, lpo_needs_df, excess_stock_df), report,
+                           artifacts if return_artifacts else None)
+
+
+def run_replenishment_engine(
+    branch_inventory_df=None,
+    warehouse_stock_df=None,
+    sku_master_df=None,
+    data_path="data",
+    output_path="outputs",
+    input_format="csv",
+    output_format="csv",
+    incremental_state_path=None,
+    workers=None,
+    return_report=False,
+    report_jsonl_path=None,
+    report_prom_path=None,
+    per_branch_sheets=False,
+    return_artifacts=False,
+    cache=None,
+    progress_callback=None,
+    run_workspace=False,
+    sales_ledger_path=None,
+    forecast=False,
+    inventory_store_path=None,
+    changed_only=False,
+    order_diff_path=None,
+    lean=False
+):
+    """
+    Runs the core replenishment logic based on a hub-and-spoke model.
+    This includes calculating reorders, allocating stock, creating LPOs,
+    and identifying excess stock based on Days of Stock (DOS).
+
+    Args:
+        branch_inventory_df (pd.DataFrame, optional): DataFrame for branch inventory.
+        warehouse_stock_df (pd.DataFrame, optional): DataFrame for warehouse stock.
+        sku_master_df (pd.DataFrame, optional): DataFrame for SKU master data.
+        data_path (str): The path to the directory containing the input data files (used if DataFrames are not provided).
+        output_path (str): The path to the directory where output files will be saved. None skips
+                             writing files, e.g. when only the in-memory artifacts are needed.
+        input_format (str): Format of the input files in data_path: 'csv', 'parquet' or 'feather'.
+        output_format (str): 'csv' writes Transfer_Orders.xlsx, LPO_Needs.csv and Excess_Stock.csv.
+                             'parquet' or 'feather' write one file per output table instead;
+                             see file_io.export_for_humans to produce the CSV/XLSX files later.
+        incremental_state_path (str, optional): Directory for incremental runs. The run saves per-SKU
+                             content hashes and its results there, and the next run recomputes only the
+                             SKUs whose branch, warehouse or master rows changed. merged_data then holds
+                             just the recomputed SKUs.
+        workers (int, optional): Number of worker processes. With more than one, the calculations run
+                             on SKU shards in parallel; the results are identical to a serial run.
+        return_report (bool): Also return the run's RunReport (wall time, rows in and out, and
+                             memory delta of every stage).
+        report_jsonl_path (str, optional): Append the run report to this file as JSON lines.
+        report_prom_path (str, optional): Write the run report to this file in the Prometheus
+                             textfile format.
+        per_branch_sheets (bool): Add a sheet per branch to Transfer_Orders.xlsx ('csv' output only).
+        return_artifacts (bool): Also return the output files as a dict of file name to io.BytesIO,
+                             built once in memory (and written to output_path from those buffers).
+        cache (ResultCache, optional): Cache of results keyed on the content of the three input
+                             tables and the engine parameters. A run on unchanged inputs then returns
+                             the cached output tables (still writing them to output_path) without
+                             recomputing, and None for merged_data, which is not cached. Cached
+                             results are shared between runs and must not be modified. Ignored in
+                             incremental mode. See lookup_cached_run to check the cache before
+                             running the engine in another process.
+        progress_callback (callable, optional): Called as progress_callback(stage, index, total, rows)
+                             whenever a stage of the run completes, with the stage name, the number
+                             of stages completed, the expected number of stages and the stage's
+                             output rows. total shrinks when a cache hit skips the calculations.
+        run_workspace (bool): Write the outputs to a new directory under output_path named by the
+                             run ID (see report.output_path), instead of into output_path itself,
+                             so concurrent runs never overwrite each other's files. Expired run
+                             directories under output_path are then removed; see workspaces.py.
+        sales_ledger_path (str, optional): Directory of a SalesLedger of daily sales. Sales_30D,
+                             Min_Stock and Max_Stock of the branch rows it tracks are then recomputed
+                             from their rolling 30-day sales and the SKU lead times before the run,
+                             and the excess stock check uses the same average daily sales.
+        forecast (bool): With sales_ledger_path, base Min_Stock, Max_Stock and the excess stock
+                             check on daily sales forecast per SKU x branch from the ledger (see
+                             forecasting.py) instead of the flat 30-day average.
+        inventory_store_path (str, optional): Read the inputs from this InventoryStore (a SQLite
+                             file) instead of data_path. Only the branch rows that need a reorder or
+                             hold excess stock are read (all rows with sales_ledger_path, which
+                             changes Min/Max), so merged_data holds just those rows; the transfers,
+                             LPO needs and excess stock are the same as from all rows.
+        changed_only (bool): With inventory_store_path, read only the SKUs changed in the store
+                             since the last run that used it, e.g. for intraday runs. The outputs
+                             then cover just those SKUs.
+        order_diff_path (str, optional): Directory keeping a snapshot of the last run's transfer
+                             orders and LPO needs, keyed on (SKU, To_Branch) and (SKU, Vendor). The
+                             run also writes Transfer_Orders_Changes and LPO_Needs_Changes, listing
+                             the orders added, removed or changed since that run (see order_diff.py),
+                             and then replaces the snapshot. Ignored with changed_only, whose outputs
+                             cover only some SKUs.
+        lean (bool): Keep peak memory down on large chains: merged_data is built with one
+                             lookup per input column instead of chained merges, only the excess
+                             rows get the Days of Stock columns, and merged_data is dropped as
+                             soon as the outputs are computed and returned as None. Excess_Stock
+                             gets its duplicate display columns only in the human-facing files.
+
+    Returns:
+        tuple: A tuple containing four DataFrames:
+               - merged_data: The merged and processed data with all calculations (None
+                 in lean runs and on cache hits).
+               - transfer_orders_df: The list of SKUs to be transferred from the warehouse.
+               - lpo_needs_df: The list of SKUs that require a Local Purchase Order.
+               - excess_stock_df: The list of SKUs that are overstocked at branches.
+               With return_report=True, the RunReport is appended to the tuple, and with
+               return_artifacts=True the dict of artifacts is appended after it.
+    """
+    if incremental_state_path is not None:
+        mode = "incremental"
+    elif workers is not None and workers > 1:
+        mode = "parallel"
+    else:
+        mode = "serial"
+    report = RunReport(mode=mode, progress_callback=progress_callback)
+    report.planned_stages = _planned_stages(mode, workers, use_cache=cache is not None)
+    if sales_ledger_path is not None:
+        report.planned_stages += 1
+    if changed_only and order_diff_path is not None:
+        print("Order changes are not tracked in changed_only runs, which cover only some SKUs.")
+        order_diff_path = None
+    if order_diff_path is not None:
+        report.planned_stages += 1
+
+    # --- 1. Load Data ---
+    store_snapshot = None
+    with report.stage("load") as stage:
+        if branch_inventory_df is not None and warehouse_stock_df is not None and sku_master_df is not None:
+            memory_before = frames_memory_mb(branch_inventory_df, warehouse_stock_df, sku_master_df)
+            branch_inventory = apply_schema(branch_inventory_df, "Branch_Inventory")
+            warehouse_stock = apply_schema(warehouse_stock_df, "Warehouse_Stock")
+            sku_master = apply_schema(sku_master_df, "SKU_Master")
+            memory_after = frames_memory_mb(branch_inventory, warehouse_stock, sku_master)
+            print(f"Input data memory: {memory_before:.1f} MB before typing, {memory_after:.1f} MB after.")
+        elif inventory_store_path is not None:
+            with InventoryStore(inventory_store_path) as store:
+                store_snapshot = store.latest_snapshot()
+                skus = store.changed_skus(store.last_run_snapshot()) if changed_only else None
+                branch_inventory, warehouse_stock, sku_master = store.load_input_tables(
+                    actionable_dos_threshold=EXCESS_DOS_THRESHOLD if sales_ledger_path is None else None, skus=skus
+                )
+            print(f"Read {len(branch_inventory)} branch rows from the inventory store"
+                  + (f" ({len(skus)} changed SKUs)." if changed_only else "."))
+        else:
+            try:
+                branch_inventory, warehouse_stock, sku_master, memory_before = load_input_tables(
+                    data_path, input_format, return_raw_memory=True
+                )
+            except FileNotFoundError as e:
+                print(f"Error loading data: {e}. Make sure the {input_format} files are in the '{data_path}' directory.")
+                branch_inventory = None
+            else:
+                memory_after = frames_memory_mb(branch_inventory, warehouse_stock, sku_master)
+                print(f"Input data memory: {memory_before:.1f} MB before typing, {memory_after:.1f} MB after.")
+        stage.rows_out = None if branch_inventory is None else len(branch_inventory)
+    if branch_inventory is None:
+        return _engine_results((None, None, None, None), report if return_report else None,
+                               {} if return_artifacts else None)
+
+    # --- Min/Max from the daily sales history ---
+    if sales_ledger_path is not None:
+        with report.stage("sales_history", rows_in=len(branch_inventory)) as stage:
+            branch_inventory = apply_sales_history(
+                branch_inventory, sku_master, SalesLedger.open(sales_ledger_path), forecast=forecast
+            )
+            stage.rows_out = len(branch_inventory)
+
+    # --- Result cache lookup ---
+    cache_key = cached = None
+    if cache is not None and incremental_state_path is None:
+        with report.stage("cache_lookup", rows_in=len(branch_inventory)) as stage:
+            cache_key = _engine_cache_key(branch_inventory, warehouse_stock, sku_master, output_format,
+                                          per_branch_sheets, return_artifacts, lean)
+            cached = cache.get(cache_key)
+            stage.rows_out = _cached_rows(cached)
+            if cached is not None:
+                # This lookup, the order diff and the write stage
+                report.planned_stages = len(report.stages) + 2 + (order_diff_path is not None)
+
+    if cached is not None:
+        print("Inputs unchanged since a cached run; reusing its results.")
+        report.mode = "cached"
+        # merged_data is not cached: it is by far the largest table and callers only need the outputs
+        merged_data = None
+        transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df, artifacts = cached
+    else:
+        # --- 2. Merge DataFrames for a complete view ---
+        with report.stage("merge", rows_in=len(branch_inventory)) as stage:
+            merged_data, available_warehouse_stock = merge_inputs(branch_inventory, warehouse_stock, sku_master, lean)
+            stage.rows_out = len(merged_data)
+        if lean and incremental_state_path is None:
+            # The calculations only need merged_data, so let the inputs go before they run
+            branch_inventory = warehouse_stock = sku_master = None
+
+        if incremental_state_path is None:
+            merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df = _compute(
+                merged_data, available_warehouse_stock, workers, report, lean
+            )
+        else:
+            merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df = _compute_incremental(
+                merged_data, available_warehouse_stock, branch_inventory, warehouse_stock, sku_master,
+                incremental_state_path, workers, report, lean
+            )
+        artifacts = None
+        if lean:
+            # Nothing below needs the inputs, so let them go before the outputs are written
+            branch_inventory = warehouse_stock = sku_master = available_warehouse_stock = None
+
+    # --- Changes since the previous run ---
+    order_changes = order_snapshots = None
+    if order_diff_path is not None:
+        with report.stage("order_diff", rows_in=len(transfer_orders_df) + len(lpo_needs_df)) as stage:
+            order_changes, order_snapshots = compute_order_changes(order_diff_path, transfer_orders_df, lpo_needs_df)
+            stage.rows_out = sum(len(changes) for changes in order_changes.values())
 
     # --- 6. Save All Outputs ---
-    os.makedirs(output_path, exist_ok=True)
-    lpo_trigger_transfers_df = pd.DataFrame(lpo_trigger_transfers_list)
-    if not lpo_trigger_transfers_df.empty:
-        lpo_trigger_transfers_df = lpo_trigger_transfers_df[[
-            'SKU', 'Branch', 'ReorderQty', 'Transfer_Qty_from_WH',
-            'Warehouse_Stock_After_Transfer',
-            'LPO_Shortfall', 'Reason'
-        ]]
-
-    # Save Transfer Orders to an Excel file with multiple sheets
-    transfer_orders_excel_path = os.path.join(output_path, "Transfer_Orders.xlsx")
-    with pd.ExcelWriter(transfer_orders_excel_path, engine='openpyxl') as writer:
-        transfer_orders_df.to_excel(writer, sheet_name='All_Transfer_Orders', index=False)
-        if not lpo_trigger_transfers_df.empty:
-            lpo_trigger_transfers_df.to_excel(writer, sheet_name='LPO_Trigger_Transfers', index=False)
-    lpo_needs_df.to_csv(os.path.join(output_path, "LPO_Needs.csv"), index=False)
-    excess_stock_df.to_csv(os.path.join(output_path, "Excess_Stock.csv"), index=False)
-
-    print(f"Replenishment engine run complete. Outputs saved to '{output_path}'.")
+    workspace_root = None
+    if run_workspace and output_path is not None:
+        workspace_root = output_path
+        output_path = create_run_workspace(workspace_root, report.run_id)
+    report.output_path = output_path
+    output_tables = (transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df)
+    with report.stage("write", rows_in=sum(len(df) for df in output_tables)) as stage:
+        run_artifacts = None
+        if return_artifacts:
+            if artifacts is None:
+                artifacts = build_output_artifacts(
+                    *output_tables, output_format=output_format, per_branch_sheets=per_branch_sheets, report=report
+                )
+            run_artifacts = artifacts
+            if order_changes is not None:
+                # The changes depend on the previous run, so they are kept out of the cached artifacts
+                run_artifacts = {**artifacts, **build_change_artifacts(order_changes, output_format, report)}
+            if output_path is not None:
+                save_artifacts(output_path, run_artifacts)
+        elif output_path is not None:
+            write_outputs(output_path, *output_tables, output_format=output_format,
+                          per_branch_sheets=per_branch_sheets, report=report, order_changes=order_changes)
+        stage.rows_out = stage.rows_in
+
+    if cache_key is not None and cached is None:
+        cache.put(cache_key, (transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df, artifacts))
+
+    if order_snapshots is not None:
+        save_snapshots(order_diff_path, order_snapshots, report.run_id)
+
+    if store_snapshot is not None:
+        with InventoryStore(inventory_store_path) as store:
+            store.mark_run(store_snapshot)
+
+    if workspace_root is not None:
+        removed = cleanup_run_workspaces(workspace_root, keep=[output_path])
+        if removed:
+            print(f"Removed {len(removed)} expired run workspace(s) from '{workspace_root}'.")
+
+    if output_path is not None:
+        print(f"Replenishment engine run complete. Outputs saved to '{output_path}'.")
+    else:
+        print("Replenishment engine run complete.")
     print(f"- Total LPOs created: {len(lpo_needs_df)}")
     print(f"- Total excess stock instances identified: {len(excess_stock_df)}")
 
-    return merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df
+    if report_jsonl_path is not None:
+        report.write_json_lines(report_jsonl_path)
+    if report_prom_path is not None:
+        report.write_prometheus_textfile(report_prom_path)
+
+    return _engine_results((merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df),
+                           report if return_report else None, run_artifacts)
 
 if __name__ == '__main__':
     run_replenishment_engine()
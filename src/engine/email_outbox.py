@@ -0,0 +1,358 @@
+import copy
+import email.generator
+import email.utils
+import heapq
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from .email_sender import build_results_messages
+from .file_io import write_atomically
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BACKOFF_SECONDS = 5
+DEFAULT_MAX_BACKOFF_SECONDS = 600
+# An open SMTP connection is closed after this long without anything to send
+DEFAULT_IDLE_SECONDS = 60
+SMTP_TIMEOUT_SECONDS = 30
+# Statuses of finished messages kept for status() before the oldest are dropped
+FINISHED_STATUSES_KEPT = 1000
+
+MESSAGE_PENDING = "pending"
+MESSAGE_SENT = "sent"
+MESSAGE_FAILED = "failed"
+
+
+class _OutboxMessage:
+    """
+    A queued message and its delivery state. Ordered by when it is next due.
+    """
+
+    def __init__(self, message_id, recipients, attempts=0, next_attempt_at=0.0, last_error=None):
+        self.message_id = message_id
+        self.recipients = recipients
+        self.attempts = attempts
+        self.next_attempt_at = next_attempt_at
+        self.last_error = last_error
+
+    def __lt__(self, other):
+        return (self.next_attempt_at, self.message_id) < (other.next_attempt_at, other.message_id)
+
+    def to_dict(self):
+        return {
+            "message_id": self.message_id,
+            "recipients": self.recipients,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at,
+            "last_error": self.last_error,
+        }
+
+
+def _is_permanent(error):
+    """
+    True for SMTP errors that a retry cannot fix: a 5xx reply, or every recipient refused.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False  # Often a temporary lockout; the retry limit still applies
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class EmailOutbox:
+    """
+    Sends emails from a background thread, so callers (e.g. a Streamlit click
+    handler) only queue them.
+
+    One authenticated SMTP connection is reused for all queued messages and
+    closed after idle_seconds without any. A message that fails with a
+    temporary error is retried with exponential backoff (backoff_seconds,
+    doubling up to max_backoff_seconds) until max_attempts; permanent errors
+    (5xx replies, all recipients refused) fail it at once.
+
+    Queued messages are persisted in outbox_path/pending until sent, and sent
+    on the next start if the process exits first. Messages that fail for good
+    are moved to outbox_path/failed.
+
+    For tests, point it at a local SMTP stand-in with use_starttls=False and no
+    username, or pass smtp_factory to replace smtplib.SMTP.
+    """
+
+    def __init__(self, outbox_path, smtp_host, smtp_port=587, username=None, password=None, sender_email=None,
+                 use_starttls=True, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+                 max_backoff_seconds=DEFAULT_MAX_BACKOFF_SECONDS, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 smtp_factory=smtplib.SMTP):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.sender_email = sender_email or username
+        self.use_starttls = use_starttls
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.idle_seconds = idle_seconds
+        self.smtp_factory = smtp_factory
+        self.connections_opened = 0
+
+        self._pending_path = os.path.join(outbox_path, "pending")
+        self._failed_path = os.path.join(outbox_path, "failed")
+        os.makedirs(self._pending_path, exist_ok=True)
+        os.makedirs(self._failed_path, exist_ok=True)
+
+        self._queue = []
+        self._statuses = {}
+        self._sending = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._smtp = None
+        self._last_used_at = 0.0
+
+        self._load_pending()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    # --- Persistence ---
+
+    def _message_file(self, directory, message_id, suffix):
+        return os.path.join(directory, message_id + suffix)
+
+    def _save_state(self, message):
+        write_atomically(
+            self._message_file(self._pending_path, message.message_id, ".json"),
+            lambda path: _write_json(path, message.to_dict())
+        )
+
+    def _load_pending(self):
+        """
+        Queues the messages persisted by an earlier run that were never sent.
+        """
+        for name in sorted(os.listdir(self._pending_path)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self._pending_path, name)) as f:
+                    state = json.load(f)
+                message = _OutboxMessage(**state)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Skipping unreadable outbox entry {name}: {e}")
+                continue
+            heapq.heappush(self._queue, message)
+            self._statuses[message.message_id] = MESSAGE_PENDING
+        if self._queue:
+            print(f"Email outbox: resuming {len(self._queue)} unsent message(s).")
+
+    def _finish(self, message, status):
+        """
+        Removes a sent message from disk, or moves a failed one to the failed directory.
+        """
+        pending_message = self._message_file(self._pending_path, message.message_id, ".eml")
+        if status == MESSAGE_FAILED:
+            # Keep the message with its final error
+            os.replace(pending_message, self._message_file(self._failed_path, message.message_id, ".eml"))
+            _write_json(self._message_file(self._failed_path, message.message_id, ".json"), message.to_dict())
+        else:
+            os.remove(pending_message)
+        os.remove(self._message_file(self._pending_path, message.message_id, ".json"))
+
+    # --- Queueing ---
+
+    def enqueue_message(self, msg, recipients=None):
+        """
+        Queues an email.message.Message. recipients defaults to its To, Cc and Bcc headers.
+
+        Returns:
+            str: The message ID, for status().
+        """
+        if recipients is None:
+            recipients = [address for _, address in
+                          email.utils.getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []) +
+                                                   msg.get_all('Bcc', []))]
+        if msg['Bcc'] is not None:
+            msg = copy.copy(msg)
+            del msg['Bcc']
+        message = _OutboxMessage(uuid.uuid4().hex, list(recipients), next_attempt_at=time.time())
+        # The message file comes first, so every persisted state has its message
+        write_atomically(self._message_file(self._pending_path, message.message_id, ".eml"),
+                         lambda path: _write_message(path, msg))
+        self._save_state(message)
+        with self._condition:
+            heapq.heappush(self._queue, message)
+            self._statuses[message.message_id] = MESSAGE_PENDING
+            self._condition.notify()
+        return message.message_id
+
+    def enqueue(self, recipient_email, subject, body, attachment_paths=(), attachments=None, compress=False):
+        """
+        Queues the replenishment results email to one recipient; see
+        email_sender.build_results_messages for the arguments. Queue one per
+        recipient (e.g. per branch manager or vendor); they all go out over
+        the same connection.
+
+        Each message is persisted to the outbox before the next part of a split
+        bundle is built, so only one part is held in memory at a time.
+
+        Returns:
+            list: The message IDs, for status(). There is one per message, so
+                  several when a compressed bundle is split.
+        """
+        message_ids = []
+        for msg in build_results_messages(
+            self.sender_email, recipient_email, subject, body, attachment_paths, attachments, compress
+        ):
+            message_ids.append(self.enqueue_message(msg, [recipient_email]))
+            msg = None  # Let go of this part before the next one is built
+        return message_ids
+
+    def status(self, message_id):
+        """
+        Returns 'pending', 'sent' or 'failed', or None for an unknown message.
+        """
+        with self._condition:
+            return self._statuses.get(message_id)
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._queue) + self._sending
+
+    def flush(self, timeout=None):
+        """
+        Waits until no messages are due or being sent. Returns False on timeout.
+        Messages waiting for a retry count as pending, so this can wait through backoffs.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self, timeout=None):
+        """
+        Stops the sending thread and closes the SMTP connection. Unsent messages
+        stay persisted and are sent on the next start.
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    # --- Sending ---
+
+    def _connect(self):
+        smtp = self.smtp_factory(self.smtp_host, self.smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if self.use_starttls:
+                smtp.starttls()  # Secure the connection
+            if self.username:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self.connections_opened += 1
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    def _send(self, message):
+        with open(self._message_file(self._pending_path, message.message_id, ".eml"), "rb") as f:
+            raw_message = f.read()
+        for reconnected in (False, True):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.sendmail(self.sender_email, message.recipients, raw_message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the reused connection; reconnect once for this message
+                self._smtp = None
+                if reconnected:
+                    raise
+
+    def _backoff(self, attempts):
+        return min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closing:
+                    now = time.time()
+                    if self._queue and self._queue[0].next_attempt_at <= now:
+                        break
+                    wait = self._queue[0].next_attempt_at - now if self._queue else None
+                    if self._smtp is not None:
+                        idle_left = self._last_used_at + self.idle_seconds - now
+                        if idle_left <= 0:
+                            self._disconnect()
+                        else:
+                            wait = idle_left if wait is None else min(wait, idle_left)
+                    self._condition.wait(wait)
+                if self._closing:
+                    break
+                message = heapq.heappop(self._queue)
+                self._sending += 1
+
+            status = None
+            message.attempts += 1
+            try:
+                self._send(message)
+                status = MESSAGE_SENT
+            except Exception as e:
+                message.last_error = f"{type(e).__name__}: {e}"
+                self._disconnect_after_error(e)
+                if _is_permanent(e) or message.attempts >= self.max_attempts:
+                    status = MESSAGE_FAILED
+                    print(f"Email outbox: giving up on message {message.message_id} to "
+                          f"{', '.join(message.recipients)} after {message.attempts} attempt(s): {message.last_error}")
+                else:
+                    message.next_attempt_at = time.time() + self._backoff(message.attempts)
+                    self._save_state(message)
+            self._last_used_at = time.time()
+
+            if status is not None:
+                self._finish(message, status)
+            with self._condition:
+                self._sending -= 1
+                if status is None:
+                    heapq.heappush(self._queue, message)
+                else:
+                    self._statuses[message.message_id] = status
+                    self._forget_old_statuses()
+                self._condition.notify_all()
+
+        self._disconnect()
+
+    def _disconnect_after_error(self, error):
+        # The server rejected the message but the session is intact (smtplib has
+        # reset it), so only other errors need a fresh connection
+        if isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+            return
+        if self._smtp is not None:
+            self._smtp.close()
+            self._smtp = None
+
+    def _forget_old_statuses(self):
+        finished = [message_id for message_id, status in self._statuses.items() if status != MESSAGE_PENDING]
+        for message_id in finished[:max(0, len(finished) - FINISHED_STATUSES_KEPT)]:
+            del self._statuses[message_id]
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _write_message(path, msg):
+    # Generated straight into the file, rather than into one bytes object first
+    with open(path, "wb") as f:
+        email.generator.BytesGenerator(f, policy=msg.policy).flatten(msg)
@@ -2,26 +2,132 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
+import base64
+import itertools
 import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path='/Users/rd/Downloads/800 pharmacy docs/.env', override=True) # Load environment variables from .env file
 
-def send_results_email(recipient_email, subject, body, attachment_paths):
+BUNDLE_NAME = "Replenishment_Results.zip"
+# Raw attachment bytes per message; base64 adds a third, which keeps a message under the common 25 MB limit
+MAX_ATTACHMENT_BYTES = 15 * 1024 * 1024
+# Formats that are compressed already, so they are stored in the zip as they are
+STORED_EXTENSIONS = (".xlsx", ".parquet", ".zip")
+# Zips larger than this are spooled to a temporary file rather than kept in memory
+BUNDLE_SPOOL_BYTES = 8 * 1024 * 1024
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# One part of a zipped attachment bundle (see bundle_attachments)
+BundlePart = namedtuple("BundlePart", ["file_name", "payload", "part", "num_parts"])
+
+
+def _attach(msg, file_name, payload):
+    part = MIMEBase('application', 'octet-stream')
+    # Encoded here as encoders.encode_base64 would: handing it the raw bytes
+    # through set_payload first keeps them as a str of up to 4 bytes per byte
+    part.set_payload(base64.encodebytes(payload).decode('ascii'))
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-Disposition', f"attachment; filename= {file_name}")
+    msg.attach(part)
+
+
+def bundle_attachments(attachment_paths=(), attachments=None, max_part_bytes=MAX_ATTACHMENT_BYTES,
+                       bundle_name=BUNDLE_NAME):
     """
-    Sends an email with the replenishment results as attachments.
-    SMTP server details and credentials are read from environment variables.
+    Zips the attachments into one bundle, streaming each file into the zip in
+    chunks, and yields it in parts of at most max_part_bytes, reading each
+    part from the bundle only when it is requested. A bundle that fits is one
+    part named bundle_name. A larger one is split into numbered volumes
+    (bundle_name.001, .002, ...), which recipients join with 7-Zip or
+    `cat bundle_name.0* > bundle_name`.
+
+    Args:
+        attachment_paths (list): Files on disk to include. Missing files are skipped.
+        attachments (dict, optional): In-memory files to include, as file name to
+                                      bytes or a binary buffer such as io.BytesIO.
+        max_part_bytes (int): Largest part to yield.
+        bundle_name (str): File name of the zip.
+
+    Yields:
+        BundlePart: The file name and bytes of each part, its number (from 1)
+                    and the number of parts.
     """
-    sender_email = os.getenv("EMAIL_USERNAME")
-    sender_password = os.getenv("EMAIL_PASSWORD")
-    smtp_host = os.getenv("EMAIL_HOST")
-    smtp_port = int(os.getenv("EMAIL_PORT", 587)) # Default to 587 for TLS
+    with tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_BYTES) as bundle:
+        with zipfile.ZipFile(bundle, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for file_path in attachment_paths:
+                if not os.path.exists(file_path):
+                    print(f"Attachment file not found: {file_path}")
+                    continue
+                with open(file_path, "rb") as source:
+                    _add_to_bundle(zf, os.path.basename(file_path), source)
+            for file_name, content in (attachments or {}).items():
+                if hasattr(content, 'getbuffer'):
+                    content = content.getbuffer()
+                _add_to_bundle(zf, file_name, memoryview(content))
+
+        bundle_size = bundle.tell()
+        bundle.seek(0)
+        if bundle_size <= max_part_bytes:
+            yield BundlePart(bundle_name, bundle.read(), 1, 1)
+            return
+        num_parts = -(-bundle_size // max_part_bytes)
+        for part in range(1, num_parts + 1):
+            yield BundlePart(_volume_name(bundle_name, part, num_parts), bundle.read(max_part_bytes), part, num_parts)
 
-    if not all([sender_email, sender_password, smtp_host]):
-        print("Email credentials (EMAIL_USERNAME, EMAIL_PASSWORD, EMAIL_HOST) not set as environment variables.")
-        return False, "Email credentials not configured."
 
+def _volume_name(bundle_name, part, num_parts):
+    return f"{bundle_name}.{str(part).zfill(max(3, len(str(num_parts))))}"
+
+
+def _add_to_bundle(zf, file_name, source):
+    """
+    Writes one file into the zip, from a binary file object or a memoryview, in chunks.
+    """
+    compress_type = zipfile.ZIP_STORED if file_name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+    info = zipfile.ZipInfo(file_name)
+    info.compress_type = compress_type
+    with zf.open(info, "w", force_zip64=True) as entry:
+        if isinstance(source, memoryview):
+            for start in range(0, len(source), COPY_CHUNK_BYTES):
+                entry.write(source[start:start + COPY_CHUNK_BYTES])
+        else:
+            shutil.copyfileobj(source, entry, COPY_CHUNK_BYTES)
+
+
+def smtp_settings():
+    """
+    Returns the SMTP host, port, username and password from the environment
+    (EMAIL_HOST, EMAIL_PORT, EMAIL_USERNAME and EMAIL_PASSWORD).
+    """
+    return (
+        os.getenv("EMAIL_HOST"),
+        int(os.getenv("EMAIL_PORT", 587)), # Default to 587 for TLS
+        os.getenv("EMAIL_USERNAME"),
+        os.getenv("EMAIL_PASSWORD"),
+    )
+
+
+def build_results_message(sender_email, recipient_email, subject, body, attachment_paths=(), attachments=None):
+    """
+    Builds the email carrying the replenishment results.
+
+    Args:
+        attachment_paths (list): Files on disk to attach. Missing files are skipped.
+        attachments (dict, optional): In-memory files to attach, as file name to
+                                      bytes or a binary buffer such as io.BytesIO
+                                      (e.g. the artifacts returned by the engine).
+
+    Returns:
+        MIMEMultipart: The message.
+
+    Raises:
+        OSError: If an attachment file exists but cannot be read.
+    """
     msg = MIMEMultipart()
     msg['From'] = sender_email
     msg['To'] = recipient_email
@@ -31,26 +137,97 @@ def send_results_email(recipient_email, subject, body, attachment_paths):
 
     for file_path in attachment_paths:
         if os.path.exists(file_path):
-            try:
-                part = MIMEBase('application', 'octet-stream')
-                with open(file_path, 'rb') as file:
-                    part.set_payload(file.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f"attachment; filename= {os.path.basename(file_path)}")
-                msg.attach(part)
-            except Exception as e:
-                print(f"Could not attach file {file_path}: {e}")
-                return False, f"Could not attach file {file_path}: {e}"
+            with open(file_path, 'rb') as file:
+                _attach(msg, os.path.basename(file_path), file.read())
         else:
             print(f"Attachment file not found: {file_path}")
             # Decide if this should be a fatal error or just a warning
             # For now, we'll continue but log it.
 
+    for file_name, content in (attachments or {}).items():
+        _attach(msg, file_name, content.getvalue() if hasattr(content, 'getvalue') else bytes(content))
+    return msg
+
+
+def build_results_messages(sender_email, recipient_email, subject, body, attachment_paths=(), attachments=None,
+                           compress=False, max_part_bytes=MAX_ATTACHMENT_BYTES):
+    """
+    Builds the email(s) carrying the replenishment results. Without compress
+    this is the single message of build_results_message. With compress, the
+    attachments are sent as one zip (see bundle_attachments), one message per
+    part, and the subject and body of a split bundle say which part each is.
+
+    Messages are built one at a time as they are requested, so only one part
+    of a split bundle is held in memory at once. Every attachment is read
+    when the first message is built.
+
+    Yields:
+        MIMEMultipart: The messages, in order.
+    """
+    if not compress:
+        yield build_results_message(sender_email, recipient_email, subject, body, attachment_paths, attachments)
+        return
+    for bundle_part in bundle_attachments(attachment_paths, attachments, max_part_bytes):
+        if bundle_part.num_parts == 1:
+            yield build_results_message(sender_email, recipient_email, subject, body,
+                                        attachments={bundle_part.file_name: bundle_part.payload})
+            return
+        part_body = (
+            f"{body}\n\nThe results are split over {bundle_part.num_parts} emails; this is part {bundle_part.part}. "
+            f"Save all the parts in one folder and open {_volume_name(BUNDLE_NAME, 1, bundle_part.num_parts)} "
+            f"with 7-Zip, or join them with `cat {BUNDLE_NAME}.0* > {BUNDLE_NAME}`."
+        )
+        yield build_results_message(
+            sender_email, recipient_email, f"{subject} (part {bundle_part.part} of {bundle_part.num_parts})",
+            part_body, attachments={bundle_part.file_name: bundle_part.payload}
+        )
+        bundle_part = None  # Let go of this part's bytes before the next one is read
+
+
+def send_results_email(recipient_email, subject, body, attachment_paths=(), attachments=None, compress=False):
+    """
+    Sends an email with the replenishment results as attachments.
+    SMTP server details and credentials are read from environment variables.
+    This blocks until the message is sent; see email_outbox.EmailOutbox to
+    send in the background, with retries.
+
+    Args:
+        attachment_paths (list): Files on disk to attach.
+        attachments (dict, optional): In-memory files to attach, as file name to
+                                      bytes or a binary buffer such as io.BytesIO
+                                      (e.g. the artifacts returned by the engine).
+        compress (bool): Send the attachments as one zip, split over several
+                         messages if it exceeds MAX_ATTACHMENT_BYTES.
+    """
+    smtp_host, smtp_port, sender_email, sender_password = smtp_settings()
+
+    if not all([sender_email, sender_password, smtp_host]):
+        print("Email credentials (EMAIL_USERNAME, EMAIL_PASSWORD, EMAIL_HOST) not set as environment variables.")
+        return False, "Email credentials not configured."
+
+    messages = build_results_messages(
+        sender_email, recipient_email, subject, body, attachment_paths, attachments, compress
+    )
+    try:
+        # Building the first message reads every attachment, so unreadable files fail before connecting
+        first_message = next(messages)
+    except OSError as e:
+        print(f"Could not attach file {e.filename}: {e}")
+        return False, f"Could not attach file {e.filename}: {e}"
+
     try:
+        num_sent = 0
         with smtplib.SMTP(smtp_host, smtp_port) as server:
             server.starttls()  # Secure the connection
             server.login(sender_email, sender_password)
-            server.send_message(msg)
+            # The remaining parts are built one at a time as they are sent
+            for msg in itertools.chain([first_message], messages):
+                server.send_message(msg)
+                num_sent += 1
+                # Let go of this part before the next one is built
+                first_message = msg = None
+        if num_sent > 1:
+            return True, f"Email sent successfully, in {num_sent} parts!"
         return True, "Email sent successfully!"
     except Exception as e:
         print(f"Error sending email: {e}")
@@ -0,0 +1,450 @@
+import pandas as pd
+import io
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .schema import apply_schema, frames_memory_mb, read_input_csv, untyped_memory_mb
+
+# XlsxWriter streams rows straight to disk and is several times faster than
+# openpyxl; openpyxl's write-only mode is the fallback when it isn't installed.
+try:
+    import xlsxwriter  # noqa: F401
+    XLSX_ENGINE = "xlsxwriter"
+except ImportError:
+    XLSX_ENGINE = "openpyxl"
+
+INPUT_TABLES = ("Branch_Inventory", "Warehouse_Stock", "SKU_Master")
+
+# Supported file formats and their extensions. 'csv' is the human-facing format
+# (CSV files plus the Transfer_Orders.xlsx workbook); Parquet and Feather are
+# much faster to read and write for scheduled runs.
+FILE_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# Output tables written by the engine in the columnar formats. In 'csv' format the
+# two transfer tables are written as sheets of Transfer_Orders.xlsx instead.
+OUTPUT_TABLES = ("Transfer_Orders", "LPO_Trigger_Transfers", "LPO_Needs", "Excess_Stock")
+# Order tables whose changes since the previous run can be written, as e.g.
+# Transfer_Orders_Changes.csv (see order_diff.py)
+ORDER_CHANGE_TABLES = ("Transfer_Orders", "LPO_Needs")
+
+# Display copies of Excess_Stock columns in the human-facing file. Lean engine
+# runs leave them out of the table, and they are added when the file is written.
+EXCESS_DISPLAY_COLUMNS = {
+    '70D Target(daily*70)': 'Target_Excess_Stock',
+    'Excess(branch stock - 70D target)': 'ExcessQty',
+}
+
+# Rows per sheet allowed by Excel, header included. Longer tables continue on
+# further sheets named e.g. All_Transfer_Orders_2.
+XLSX_MAX_ROWS = 1_048_576
+# Rows converted to Python values at a time while writing a sheet
+XLSX_CHUNK_ROWS = 50_000
+XLSX_MAX_SHEET_TITLE = 31
+
+
+def _check_format(file_format):
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file format '{file_format}'. Choose one of: {', '.join(FILE_FORMATS)}.")
+
+
+def table_path(directory, table, file_format):
+    """
+    Returns the path of an input or output table in the given format.
+    """
+    _check_format(file_format)
+    return os.path.join(directory, table + FILE_FORMATS[file_format])
+
+
+def read_table(path, file_format):
+    """
+    Reads a table written in any of the supported formats.
+    """
+    _check_format(file_format)
+    if file_format == "parquet":
+        return pd.read_parquet(path)
+    if file_format == "feather":
+        return pd.read_feather(path)
+    return pd.read_csv(path)
+
+
+def write_table(df, path, file_format):
+    """
+    Writes a table in any of the supported formats, without the index, to a
+    path or a binary buffer.
+    """
+    _check_format(file_format)
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+    elif file_format == "feather":
+        # Feather only stores a default index, which we don't need anyway
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def write_atomically(path, write):
+    """
+    Calls write(temp_path) on a temporary file next to path and then renames it
+    to path, so readers only ever see the old file or the complete new one.
+    """
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_input_tables(data_path, input_format="csv", return_raw_memory=False):
+    """
+    Loads Branch_Inventory, Warehouse_Stock and SKU_Master from data_path with
+    their declared schema.
+
+    Args:
+        data_path (str): Directory holding the three input tables.
+        input_format (str): 'csv', 'parquet' or 'feather'.
+        return_raw_memory (bool): Also return the size in MB of the tables before
+                                  typing. CSVs are parsed straight into the schema,
+                                  so theirs is the size a plain read would take.
+
+    Returns:
+        tuple: branch_inventory, warehouse_stock and sku_master DataFrames, followed
+               by the size before typing with return_raw_memory=True.
+    """
+    tables = []
+    raw_memory_mb = 0.0
+    for table in INPUT_TABLES:
+        path = table_path(data_path, table, input_format)
+        if input_format == "csv":
+            tables.append(read_input_csv(path, table))
+            if return_raw_memory:
+                raw_memory_mb += untyped_memory_mb(tables[-1])
+        else:
+            raw = read_table(path, input_format)
+            if return_raw_memory:
+                raw_memory_mb += frames_memory_mb(raw)
+            tables.append(apply_schema(raw, table))
+    return (*tables, raw_memory_mb) if return_raw_memory else tuple(tables)
+
+
+def _sheet_title(name, used_titles):
+    """
+    Makes a valid, unique Excel sheet title out of name: at most 31 characters
+    and none of the characters Excel forbids.
+    """
+    title = re.sub(r"[\[\]:*?/\\]", "_", str(name))[:XLSX_MAX_SHEET_TITLE] or "Sheet"
+    base, number = title, 2
+    while title.lower() in used_titles:
+        suffix = f"_{number}"
+        title = base[:XLSX_MAX_SHEET_TITLE - len(suffix)] + suffix
+        number += 1
+    used_titles.add(title.lower())
+    return title
+
+
+def _iter_sheet_rows(df):
+    """
+    Yields the rows of df as tuples of plain Python values, converting
+    XLSX_CHUNK_ROWS rows at a time so memory stays bounded. Missing values
+    become None, which is written as an empty cell.
+    """
+    for start in range(0, len(df), XLSX_CHUNK_ROWS):
+        chunk = df.iloc[start:start + XLSX_CHUNK_ROWS]
+        columns = []
+        for column in chunk.columns:
+            values = chunk[column]
+            if values.hasnans:
+                values = values.astype(object).where(values.notna(), None)
+            columns.append(values.tolist())
+        yield from zip(*columns)
+
+
+def _split_for_sheets(title, df):
+    """
+    Splits df into parts that each fit on one sheet, titling the continuation sheets title_2, title_3, ...
+    """
+    rows_per_sheet = XLSX_MAX_ROWS - 1
+    if len(df) <= rows_per_sheet:
+        return [(title, df)]
+    return [
+        (title if start == 0 else f"{title}_{start // rows_per_sheet + 1}", df.iloc[start:start + rows_per_sheet])
+        for start in range(0, len(df), rows_per_sheet)
+    ]
+
+
+def _write_workbook_xlsxwriter(path, sheets):
+    import xlsxwriter
+    # constant_memory flushes every row to disk as soon as the next one starts
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    try:
+        for title, df in sheets:
+            worksheet = workbook.add_worksheet(title)
+            worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+            for row_number, row in enumerate(_iter_sheet_rows(df), start=1):
+                worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+
+def _write_workbook_openpyxl(path, sheets):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    workbook = Workbook(write_only=True)
+    thin = Side(style="thin")
+    for title, df in sheets:
+        worksheet = workbook.create_sheet(title)
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(worksheet, value=str(column))
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal="center")
+            header.append(cell)
+        worksheet.append(header)
+        for row in _iter_sheet_rows(df):
+            worksheet.append(row)
+    workbook.save(path)
+
+
+def write_workbook(path, sheets):
+    """
+    Writes an XLSX workbook row by row in constant memory, with XlsxWriter if
+    it is installed and openpyxl's write-only mode otherwise.
+
+    Args:
+        path (str): The workbook to write.
+        sheets (list): (sheet title, DataFrame) pairs, in sheet order. Tables too
+                       long for one sheet continue on extra sheets.
+    """
+    used_titles = set()
+    sheet_parts = [
+        (_sheet_title(part_title, used_titles), part)
+        for title, df in sheets for part_title, part in _split_for_sheets(title, df)
+    ]
+    if XLSX_ENGINE == "xlsxwriter":
+        _write_workbook_xlsxwriter(path, sheet_parts)
+    else:
+        _write_workbook_openpyxl(path, sheet_parts)
+
+
+def write_transfer_orders_xlsx(path, transfer_orders_df, lpo_trigger_transfers_df, per_branch_sheets=False):
+    """
+    Writes the Transfer Orders workbook with its All_Transfer_Orders sheet and,
+    when there are any, its LPO_Trigger_Transfers sheet.
+
+    Args:
+        path (str): The workbook to write.
+        transfer_orders_df (pd.DataFrame): The transfer orders.
+        lpo_trigger_transfers_df (pd.DataFrame): The reorders that triggered an LPO.
+        per_branch_sheets (bool): Also add one sheet per branch with that branch's transfer orders.
+    """
+    sheets = [('All_Transfer_Orders', transfer_orders_df)]
+    if not lpo_trigger_transfers_df.empty:
+        sheets.append(('LPO_Trigger_Transfers', lpo_trigger_transfers_df))
+    if per_branch_sheets and not transfer_orders_df.empty:
+        for branch, branch_orders in transfer_orders_df.groupby('To_Branch', observed=True, sort=True):
+            sheets.append((branch, branch_orders))
+    write_workbook(path, sheets)
+
+
+def _output_artifacts(transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df,
+                      output_format="csv", per_branch_sheets=False):
+    """
+    Lists the output files of a run for the given format.
+
+    Returns:
+        list: (file name, write function, rows) triples. The write function
+              takes the path or binary buffer to write the file to.
+    """
+    _check_format(output_format)
+    if output_format == "csv":
+        return [
+            ("Transfer_Orders.xlsx",
+             lambda target: write_transfer_orders_xlsx(
+                 target, transfer_orders_df, lpo_trigger_transfers_df, per_branch_sheets
+             ),
+             len(transfer_orders_df) + len(lpo_trigger_transfers_df)),
+            ("LPO_Needs.csv", lambda target: write_table(lpo_needs_df, target, "csv"), len(lpo_needs_df)),
+            ("Excess_Stock.csv", lambda target: write_table(with_excess_display_columns(excess_stock_df), target, "csv"),
+             len(excess_stock_df)),
+        ]
+    frames = dict(zip(OUTPUT_TABLES, (transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df)))
+    return _table_artifacts(frames, output_format)
+
+
+def with_excess_display_columns(excess_stock_df):
+    """
+    Returns excess_stock_df with the EXCESS_DISPLAY_COLUMNS, copying them from
+    their source columns if they are missing (as after a lean run).
+    """
+    missing = {column: source for column, source in EXCESS_DISPLAY_COLUMNS.items()
+               if column not in excess_stock_df.columns}
+    if not missing:
+        return excess_stock_df
+    return excess_stock_df.assign(**{column: excess_stock_df[source] for column, source in missing.items()})
+
+
+def _table_artifacts(frames, output_format):
+    """
+    Lists one file per table, in the given format, as (file name, write function, rows) triples.
+    """
+    return [
+        (table + FILE_FORMATS[output_format], lambda target, df=df: write_table(df, target, output_format), len(df))
+        for table, df in frames.items()
+    ]
+
+
+def _change_artifacts(order_changes, output_format):
+    """
+    Lists the files of the run-over-run order changes (see order_diff.py),
+    e.g. Transfer_Orders_Changes.csv. They are plain tables in every format.
+    """
+    return _table_artifacts(
+        {f"{table}_Changes": changes for table, changes in (order_changes or {}).items()}, output_format
+    )
+
+
+def _run_timed(write, target, rows):
+    start = time.perf_counter()
+    write(target)
+    return rows, time.perf_counter() - start
+
+
+def _write_concurrently(jobs, report=None):
+    """
+    Runs (name, write, target, rows) jobs on a thread pool and records each
+    job's time on the report.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        futures = [executor.submit(_run_timed, write, target, rows) for _, write, target, rows in jobs]
+        timings = [future.result() for future in futures]
+    if report is not None:
+        for (name, _, _, _), (rows, seconds) in zip(jobs, timings):
+            report.add_artifact(name, seconds, rows)
+
+
+def write_outputs(output_path, transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df,
+                  output_format="csv", per_branch_sheets=False, report=None, order_changes=None):
+    """
+    Saves the engine's outputs to output_path.
+
+    In 'csv' format this writes Transfer_Orders.xlsx, LPO_Needs.csv and
+    Excess_Stock.csv. In 'parquet' or 'feather' format every output table gets
+    its own file, e.g. Transfer_Orders.parquet; use export_for_humans to turn
+    those into the CSV/XLSX files later. per_branch_sheets adds a sheet per
+    branch to Transfer_Orders.xlsx.
+
+    The files are written concurrently, each to a temporary file that is
+    renamed into place once complete.
+
+    Args:
+        report (RunReport, optional): Report to add each file's write time to.
+        order_changes (dict, optional): Changes since the previous run per order
+                                        table (see order_diff.py), written as e.g.
+                                        Transfer_Orders_Changes.csv.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    artifacts = _output_artifacts(
+        transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df, output_format, per_branch_sheets
+    ) + _change_artifacts(order_changes, output_format)
+    paths = [os.path.join(output_path, name) for name, _, _ in artifacts]
+    _write_concurrently([
+        (name, lambda path, write=write: write_atomically(path, write), path, rows)
+        for (name, write, rows), path in zip(artifacts, paths)
+    ], report)
+    return paths
+
+
+def build_output_artifacts(transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df,
+                           output_format="csv", per_branch_sheets=False, report=None):
+    """
+    Builds the output files of write_outputs in memory instead of on disk,
+    concurrently, so they can be downloaded or attached without touching the
+    filesystem.
+
+    Returns:
+        dict: File name (e.g. 'Transfer_Orders.xlsx') to an io.BytesIO holding its contents.
+    """
+    artifacts = _output_artifacts(
+        transfer_orders_df, lpo_trigger_transfers_df, lpo_needs_df, excess_stock_df, output_format, per_branch_sheets
+    )
+    return _build_buffers(artifacts, report)
+
+
+def build_change_artifacts(order_changes, output_format="csv", report=None):
+    """
+    Builds the files of the run-over-run order changes (see write_outputs) in
+    memory, like build_output_artifacts.
+    """
+    return _build_buffers(_change_artifacts(order_changes, output_format), report)
+
+
+def _build_buffers(artifacts, report=None):
+    buffers = {name: io.BytesIO() for name, _, _ in artifacts}
+    _write_concurrently([(name, write, buffers[name], rows) for name, write, rows in artifacts], report)
+    for buffer in buffers.values():
+        buffer.seek(0)
+    return buffers
+
+
+def save_artifacts(output_path, artifacts):
+    """
+    Writes in-memory artifacts from build_output_artifacts to output_path, atomically.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    paths = []
+    for name, buffer in artifacts.items():
+        path = os.path.join(output_path, name)
+
+        def write(temp_path, buffer=buffer):
+            with open(temp_path, "wb") as f:
+                f.write(buffer.getbuffer())
+
+        write_atomically(path, write)
+        paths.append(path)
+    return paths
+
+
+def export_for_humans(output_path, source_format="parquet", export_path=None, per_branch_sheets=False):
+    """
+    Converts Parquet or Feather outputs of an earlier run into the human-facing
+    Transfer_Orders.xlsx, LPO_Needs.csv and Excess_Stock.csv, plus the order
+    changes files if the run wrote them.
+
+    Args:
+        output_path (str): Directory holding the columnar outputs.
+        source_format (str): 'parquet' or 'feather'.
+        export_path (str, optional): Where to write the exports. Defaults to output_path.
+        per_branch_sheets (bool): Add a sheet per branch to Transfer_Orders.xlsx.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    if source_format == "csv":
+        raise ValueError("Outputs written in 'csv' format are already in their human-facing form.")
+    frames = [read_table(table_path(output_path, table, source_format), source_format) for table in OUTPUT_TABLES]
+    order_changes = {}
+    for table in ORDER_CHANGE_TABLES:
+        changes_path = table_path(output_path, f"{table}_Changes", source_format)
+        if os.path.exists(changes_path):
+            order_changes[table] = read_table(changes_path, source_format)
+    return write_outputs(export_path or output_path, *frames, output_format="csv", per_branch_sheets=per_branch_sheets,
+                         order_changes=order_changes)
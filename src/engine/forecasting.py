@@ -0,0 +1,131 @@
+import numpy as np
+
+# Days of history the models look at: 13 whole weeks
+FORECAST_HISTORY_DAYS = 91
+# The last days of the history are held out to choose each series' model
+HOLDOUT_DAYS = 14
+# Below this much history every series keeps the plain moving average
+MIN_HISTORY_DAYS = HOLDOUT_DAYS + 28
+MAX_HORIZON_DAYS = 28
+# Series forecast per batch, which bounds the float copies of the history
+FORECAST_BATCH_SERIES = 250_000
+
+MOVING_AVERAGE_DAYS = 30
+SES_ALPHAS = (0.1, 0.3, 0.6)
+TREND_DAYS = 28
+SEASON_DAYS = 7
+SEASONAL_WEEKS = 4
+
+# The moving average comes first, so a series with no better model (e.g. all
+# zeros) keeps the engine's Sales_30D / 30
+FORECAST_MODELS = (
+    ["moving_average"] + [f"ses_{alpha}" for alpha in SES_ALPHAS] + ["trend", "seasonal_naive"]
+)
+
+
+def _model_weights(model, history_days, step):
+    """
+    Returns the weights over a history of history_days days (oldest first) whose
+    dot product with a series is the model's forecast `step` days after its last day.
+    Every model is linear in the history, which is what lets all the series be
+    forecast with one matrix product.
+    """
+    weights = np.zeros(history_days)
+    if model == "moving_average":
+        days = min(MOVING_AVERAGE_DAYS, history_days)
+        weights[-days:] = 1 / days
+    elif model.startswith("ses_"):
+        # Simple exponential smoothing started from the first day: the level is an
+        # exponentially weighted average, and the forecast is flat at it
+        alpha = float(model[len("ses_"):])
+        weights[1:] = alpha * (1 - alpha) ** np.arange(history_days - 2, -1, -1)
+        weights[0] = (1 - alpha) ** (history_days - 1)
+    elif model == "trend":
+        # Least-squares line through the last TREND_DAYS days, extended `step` days
+        days = min(TREND_DAYS, history_days)
+        offsets = np.arange(days) - (days - 1) / 2
+        weights[-days:] = 1 / days + offsets * (offsets[-1] + step) / (offsets ** 2).sum()
+    elif model == "seasonal_naive":
+        # Mean of the same weekday over the last SEASONAL_WEEKS weeks
+        last_same_weekday = history_days - 1 + step - SEASON_DAYS * -(-step // SEASON_DAYS)
+        days = [day for day in range(last_same_weekday, -1, -SEASON_DAYS)][:SEASONAL_WEEKS]
+        weights[days] = 1 / len(days)
+    else:
+        raise ValueError(f"Unknown forecast model '{model}'.")
+    return weights
+
+
+def forecast_weights(history_days, horizon_days, models=FORECAST_MODELS):
+    """
+    Returns a (models x horizon_days x history_days) array of the weights giving
+    each model's daily forecasts for the next horizon_days days.
+    """
+    return np.stack([
+        np.stack([_model_weights(model, history_days, step) for step in range(1, horizon_days + 1)])
+        for model in models
+    ])
+
+
+def choose_models(history, models=FORECAST_MODELS, holdout_days=HOLDOUT_DAYS):
+    """
+    Picks the model with the smallest mean absolute error per series, fitting
+    every model on all but the last holdout_days days and scoring its daily
+    forecasts against them.
+
+    Args:
+        history (np.ndarray): (days x series) daily sales, oldest day first.
+
+    Returns:
+        np.ndarray: The index into models of each series' model.
+    """
+    fit_days = len(history) - holdout_days
+    weights = forecast_weights(fit_days, holdout_days, models).astype(np.float32)
+    weights = weights.reshape(len(models) * holdout_days, fit_days)
+    chosen = np.empty(history.shape[1], dtype=np.int64)
+    for start in range(0, history.shape[1], FORECAST_BATCH_SERIES):
+        batch = history[:, start:start + FORECAST_BATCH_SERIES].astype(np.float32)
+        forecasts = (weights @ batch[:fit_days]).reshape(len(models), holdout_days, -1)
+        np.maximum(forecasts, 0, out=forecasts)
+        errors = np.abs(forecasts - batch[fit_days:]).mean(axis=1)
+        # argmin keeps the first (simplest) model on ties
+        chosen[start:start + FORECAST_BATCH_SERIES] = errors.argmin(axis=0)
+    return chosen
+
+
+def forecast_daily_sales(history, horizon_days, models=FORECAST_MODELS):
+    """
+    Forecasts the average daily sales of every series over its own horizon,
+    using the model choose_models picks for it. All series are forecast
+    together: one matrix product per batch of series and distinct horizon,
+    with no loop over series.
+
+    Args:
+        history (np.ndarray): (days x series) daily sales, oldest day first.
+        horizon_days (np.ndarray): Days ahead to average the forecast over, per
+                                   series (e.g. the SKU lead time). Clipped to
+                                   1..MAX_HORIZON_DAYS.
+
+    Returns:
+        tuple: The forecast average daily sales per series (float64, never negative)
+               and the index into models of the model used for each.
+    """
+    num_days, num_series = history.shape
+    if num_days < MIN_HISTORY_DAYS:
+        days = min(MOVING_AVERAGE_DAYS, num_days)
+        ads = history[num_days - days:].sum(axis=0, dtype=np.int64) / days if days else np.zeros(num_series)
+        return ads, np.zeros(num_series, dtype=np.int64)
+
+    chosen = choose_models(history, models)
+    horizon_days = np.clip(np.asarray(horizon_days, dtype=np.int64), 1, MAX_HORIZON_DAYS)
+    # Averaging the daily weights over a horizon gives the weights of the average
+    all_weights = forecast_weights(num_days, MAX_HORIZON_DAYS, models)
+    cumulative_weights = np.cumsum(all_weights, axis=1)
+    ads = np.empty(num_series)
+    for horizon in np.unique(horizon_days):
+        series = np.flatnonzero(horizon_days == horizon)
+        weights = (cumulative_weights[:, horizon - 1] / horizon).astype(np.float32)
+        for start in range(0, len(series), FORECAST_BATCH_SERIES):
+            batch = series[start:start + FORECAST_BATCH_SERIES]
+            forecasts = weights @ history[:, batch].astype(np.float32)
+            ads[batch] = forecasts[chosen[batch], np.arange(len(batch))]
+    return np.maximum(ads, 0.0), chosen
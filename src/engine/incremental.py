@@ -0,0 +1,156 @@
+import pandas as pd
+import json
+import os
+
+# Bump when the engine's calculations change in a way that invalidates saved results
+STATE_VERSION = 1
+
+STATE_FILE = "state.json"
+HASHES_FILE = "sku_hashes.parquet"
+RESULT_FILES = {
+    "transfer_orders": "transfer_orders.parquet",
+    "lpo_needs": "lpo_needs.parquet",
+    "excess_stock": "excess_stock.parquet",
+    "lpo_trigger_transfers": "lpo_trigger_transfers.parquet",
+}
+HASH_COLUMNS = {
+    "Branch_Inventory": "Branch_Hash",
+    "Warehouse_Stock": "Warehouse_Hash",
+    "SKU_Master": "Master_Hash",
+}
+
+
+def _table_hash_per_sku(df, hash_column):
+    """
+    Hashes every row of df and folds the row hashes into one value per SKU.
+    Each row is hashed together with its position within its SKU, since the
+    order of a SKU's branches decides who is served first.
+    """
+    position = df.groupby('SKU', sort=False, observed=True).cumcount()
+    row_hashes = pd.util.hash_pandas_object(df.assign(_Position=position.to_numpy()), index=False)
+    return row_hashes.groupby(df['SKU'], sort=False, observed=True).sum().rename(hash_column)
+
+
+def sku_content_hashes(branch_inventory, warehouse_stock, sku_master):
+    """
+    Computes a content hash of each input table's rows for every SKU.
+
+    Returns:
+        pd.DataFrame: One row per SKU with Branch_Hash, Warehouse_Hash and Master_Hash.
+                      A SKU missing from a table has a hash of 0 for it.
+    """
+    tables = {"Branch_Inventory": branch_inventory, "Warehouse_Stock": warehouse_stock, "SKU_Master": sku_master}
+    per_table = {}
+    for table, df in tables.items():
+        table_hashes = _table_hash_per_sku(df, HASH_COLUMNS[table])
+        table_hashes.index = table_hashes.index.astype(str)
+        per_table[HASH_COLUMNS[table]] = table_hashes
+
+    all_skus = pd.Index([], dtype=object, name='SKU')
+    for table_hashes in per_table.values():
+        all_skus = all_skus.union(table_hashes.index)
+    # Reindex with a fill value so the hashes stay uint64 rather than going through float
+    return pd.DataFrame({
+        column: table_hashes.reindex(all_skus, fill_value=0) for column, table_hashes in per_table.items()
+    }, index=all_skus)
+
+
+def load_state(state_path, params):
+    """
+    Loads the hashes and results of the previous incremental run.
+
+    Args:
+        state_path (str): Directory the previous run saved its state to.
+        params (dict): Engine parameters of this run. If they differ from the
+                       previous run's, its results cannot be reused.
+
+    Returns:
+        tuple: (hashes, results) where results maps the RESULT_FILES keys to
+               DataFrames, or (None, None) if there is no usable state.
+    """
+    state_file = os.path.join(state_path, STATE_FILE)
+    if not os.path.exists(state_file):
+        return None, None
+    with open(state_file) as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION or state.get("params") != params:
+        print("Incremental state was saved with different engine parameters; running a full recompute.")
+        return None, None
+    hashes = pd.read_parquet(os.path.join(state_path, HASHES_FILE))
+    results = {
+        name: pd.read_parquet(os.path.join(state_path, file_name)) for name, file_name in RESULT_FILES.items()
+    }
+    return hashes, results
+
+
+def save_state(state_path, params, hashes, results):
+    """
+    Saves this run's per-SKU hashes and results for the next incremental run.
+    The state file is written last, so an interrupted save is never picked up.
+    """
+    os.makedirs(state_path, exist_ok=True)
+    state_file = os.path.join(state_path, STATE_FILE)
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    hashes.to_parquet(os.path.join(state_path, HASHES_FILE))
+    for name, file_name in RESULT_FILES.items():
+        results[name].reset_index(drop=True).to_parquet(os.path.join(state_path, file_name), index=False)
+    with open(state_file, "w") as f:
+        json.dump({"version": STATE_VERSION, "params": params}, f)
+
+
+def changed_skus(previous_hashes, current_hashes):
+    """
+    Returns the SKUs that were added, removed, or whose rows changed in any
+    input table since the previous run.
+    """
+    previous, current = previous_hashes.align(current_hashes, join='outer')
+    changed = (previous != current).any(axis=1)
+    return pd.Index(changed.index[changed.to_numpy()])
+
+
+def _match_dtypes(previous, fresh):
+    """
+    Casts the columns of a saved result to the dtypes of this run's result, so
+    categorical columns share categories and concatenate cleanly.
+    """
+    previous = previous.copy()
+    for column, dtype in fresh.dtypes.items():
+        if column in previous.columns and previous[column].dtype != dtype:
+            previous[column] = previous[column].astype(dtype)
+    return previous
+
+
+def splice_results(previous_results, fresh_results, recomputed_skus, merged_data):
+    """
+    Replaces the rows of the recomputed SKUs in the previous results with the
+    fresh ones, ordering every table exactly as a full run would.
+
+    Args:
+        previous_results (dict): The previous run's results, keyed like RESULT_FILES.
+        fresh_results (dict): Results computed for recomputed_skus only.
+        recomputed_skus (pd.Index): SKUs whose previous rows are stale.
+        merged_data (pd.DataFrame): This run's full merged data, used to put
+                                    excess stock rows back in input order.
+
+    Returns:
+        dict: The spliced results, keyed like RESULT_FILES.
+    """
+    spliced = {}
+    for name, fresh in fresh_results.items():
+        previous = previous_results[name]
+        previous = previous[~previous['SKU'].astype(str).isin(recomputed_skus)]
+        previous = _match_dtypes(previous, fresh)
+        spliced[name] = pd.concat([previous, fresh.reset_index(drop=True)], ignore_index=True)
+
+    # Allocation output is sorted by SKU, keeping each SKU's own row order
+    for name in ("transfer_orders", "lpo_trigger_transfers"):
+        spliced[name] = spliced[name].sort_values(by='SKU', kind='stable').reset_index(drop=True)
+    spliced["lpo_needs"] = spliced["lpo_needs"].sort_values(by=['SKU', 'Vendor']).reset_index(drop=True)
+
+    # Excess stock follows the merged data, so take each row's position there
+    merged_position = pd.Series(merged_data.index, index=pd.MultiIndex.from_frame(merged_data[['SKU', 'Branch']]))
+    excess = spliced["excess_stock"]
+    excess.index = merged_position.reindex(pd.MultiIndex.from_frame(excess[['SKU', 'Branch']])).to_numpy()
+    spliced["excess_stock"] = excess.sort_index()
+    return spliced
@@ -0,0 +1,213 @@
+import pandas as pd
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+METRIC_PREFIX = "replenishment"
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def current_rss_mb():
+    """
+    Returns the resident memory of this process in MB, or None on platforms
+    without /proc (the delta columns of the report are then left empty).
+    """
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class StageReport:
+    """
+    Timing, row counts and memory of one stage of an engine run.
+    """
+    name: str
+    seconds: float = 0.0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    rss_before_mb: float | None = None
+    rss_after_mb: float | None = None
+
+    @property
+    def memory_delta_mb(self):
+        if self.rss_before_mb is None or self.rss_after_mb is None:
+            return None
+        return self.rss_after_mb - self.rss_before_mb
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "seconds": round(self.seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "memory_delta_mb": None if self.memory_delta_mb is None else round(self.memory_delta_mb, 3),
+            "rss_mb": None if self.rss_after_mb is None else round(self.rss_after_mb, 3),
+        }
+
+
+@dataclass
+class RunReport:
+    """
+    Per-stage report of one run_replenishment_engine call. Stages are added
+    with the stage() context manager, in the order they ran. Output files,
+    which are written concurrently within the write stage, are reported
+    separately as artifacts.
+
+    If progress_callback is set, it is called as progress_callback(stage, index,
+    total, rows) each time a stage completes: the stage name, the number of
+    stages completed so far, the number of stages the run is expected to have
+    (planned_stages, or the number completed if that is not known) and the
+    stage's rows_out.
+    """
+    mode: str = "serial"
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    stages: list = field(default_factory=list)
+    artifacts: list = field(default_factory=list)
+    progress_callback: object = None
+    planned_stages: int | None = None
+    output_path: str | None = None
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times the enclosed block as one stage. Set rows_out on the yielded
+        StageReport once the stage's output is known.
+        """
+        stage = StageReport(name, rows_in=rows_in, rss_before_mb=current_rss_mb())
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            stage.rss_after_mb = current_rss_mb()
+            self.stages.append(stage)
+        if self.progress_callback is not None:
+            completed = len(self.stages)
+            self.progress_callback(stage.name, completed, max(self.planned_stages or 0, completed), stage.rows_out)
+
+    def add_artifact(self, name, seconds, rows=None):
+        """
+        Records the time it took to write one output file.
+        """
+        self.artifacts.append(StageReport(name, seconds=seconds, rows_in=rows, rows_out=rows))
+
+    @property
+    def total_seconds(self):
+        return sum(stage.seconds for stage in self.stages)
+
+    @property
+    def peak_rss_mb(self):
+        rss = [stage.rss_after_mb for stage in self.stages if stage.rss_after_mb is not None]
+        return max(rss) if rss else None
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "mode": self.mode,
+            "output_path": self.output_path,
+            "total_seconds": round(self.total_seconds, 6),
+            "stages": [stage.to_dict() for stage in self.stages],
+            "artifacts": [{"artifact": artifact.name, "seconds": round(artifact.seconds, 6), "rows": artifact.rows_out}
+                          for artifact in self.artifacts],
+        }
+
+    def to_frame(self):
+        """
+        Returns the stages as a DataFrame, one row per stage, for display.
+        """
+        return pd.DataFrame(
+            [stage.to_dict() for stage in self.stages],
+            columns=["stage", "seconds", "rows_in", "rows_out", "memory_delta_mb", "rss_mb"]
+        )
+
+    def summary(self):
+        """
+        Returns a plain-text table of the stages, for printing.
+        """
+        lines = [f"{'Stage':<18}{'Seconds':>10}{'Rows in':>12}{'Rows out':>12}{'Mem delta MB':>14}"]
+        for stage in self.stages:
+            delta = stage.memory_delta_mb
+            lines.append(
+                f"{stage.name:<18}{stage.seconds:>10.3f}"
+                f"{'' if stage.rows_in is None else f'{stage.rows_in:,}':>12}"
+                f"{'' if stage.rows_out is None else f'{stage.rows_out:,}':>12}"
+                f"{'' if delta is None else f'{delta:+.1f}':>14}"
+            )
+        lines.append(f"{'Total':<18}{self.total_seconds:>10.3f}")
+        if self.artifacts:
+            lines.append("Files written (concurrently):")
+            for artifact in self.artifacts:
+                lines.append(f"  {artifact.name:<30}{artifact.seconds:>10.3f}s{artifact.rows_out:>12,} rows")
+        return "\n".join(lines)
+
+    def write_json_lines(self, path):
+        """
+        Appends one JSON object per stage and per output file, plus a 'total'
+        record, to path. Every record carries the run_id, so the lines of one
+        run can be grouped.
+        """
+        run_fields = {"run_id": self.run_id, "started_at": self.started_at, "mode": self.mode}
+        records = [{**run_fields, **stage.to_dict()} for stage in self.stages]
+        records += [{**run_fields, "stage": "write", "artifact": artifact.name, "seconds": round(artifact.seconds, 6),
+                     "rows_out": artifact.rows_out} for artifact in self.artifacts]
+        records.append({**run_fields, "stage": "total", "seconds": round(self.total_seconds, 6),
+                        "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 3)})
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def write_prometheus_textfile(self, path):
+        """
+        Writes the report as a Prometheus textfile (for node_exporter's textfile
+        collector). The file is replaced atomically, so it is never scraped half written.
+        """
+        lines = []
+
+        def add_metric(name, help_text, metric_type, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{key}="{val}"' for key, val in labels.items()) + "}" if labels else ""
+                lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+        add_metric("stage_duration_seconds", "Wall time of each engine stage in the last run.", "gauge",
+                   [({"stage": stage.name}, f"{stage.seconds:.6f}") for stage in self.stages])
+        add_metric("stage_rows_in", "Rows going into each engine stage in the last run.", "gauge",
+                   [({"stage": stage.name}, stage.rows_in) for stage in self.stages if stage.rows_in is not None])
+        add_metric("stage_rows_out", "Rows coming out of each engine stage in the last run.", "gauge",
+                   [({"stage": stage.name}, stage.rows_out) for stage in self.stages if stage.rows_out is not None])
+        add_metric("stage_memory_delta_bytes", "Change in resident memory over each engine stage in the last run.",
+                   "gauge", [({"stage": stage.name}, int(stage.memory_delta_mb * 1024 * 1024))
+                             for stage in self.stages if stage.memory_delta_mb is not None])
+        add_metric("artifact_write_seconds", "Time taken to write each output file in the last run.", "gauge",
+                   [({"artifact": artifact.name}, f"{artifact.seconds:.6f}") for artifact in self.artifacts])
+        add_metric("run_duration_seconds", "Total wall time of the last run.", "gauge",
+                   [({"mode": self.mode}, f"{self.total_seconds:.6f}")])
+        add_metric("run_completed_timestamp_seconds", "Unix time at which the last run finished.", "gauge",
+                   [({"mode": self.mode}, f"{time.time():.0f}")])
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,287 @@
+import pandas as pd
+import sqlite3
+import time
+from .schema import INPUT_SCHEMAS, apply_schema
+
+# Rows sent to SQLite per executemany call during a bulk upsert
+UPSERT_BATCH_ROWS = 50_000
+
+# Key columns of each input table in the store
+TABLE_KEYS = {
+    "Branch_Inventory": ("SKU", "Branch"),
+    "Warehouse_Stock": ("SKU",),
+    "SKU_Master": ("SKU",),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    Snapshot_Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Taken_At REAL NOT NULL,
+    Source TEXT,
+    Rows_Changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    Key TEXT PRIMARY KEY,
+    Value TEXT
+);
+CREATE TABLE IF NOT EXISTS Branch_Inventory (
+    SKU TEXT NOT NULL,
+    Branch TEXT NOT NULL,
+    Branch_Stock INTEGER NOT NULL,
+    Min_Stock INTEGER NOT NULL,
+    Max_Stock INTEGER NOT NULL,
+    Sales_30D INTEGER NOT NULL,
+    Row_Order INTEGER NOT NULL,
+    Snapshot_Id INTEGER NOT NULL,
+    PRIMARY KEY (SKU, Branch)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS Branch_Inventory_Row_Order ON Branch_Inventory (Row_Order);
+CREATE INDEX IF NOT EXISTS Branch_Inventory_Snapshot ON Branch_Inventory (Snapshot_Id);
+CREATE TABLE IF NOT EXISTS Branch_Inventory_History (
+    SKU TEXT NOT NULL,
+    Branch TEXT NOT NULL,
+    Snapshot_Id INTEGER NOT NULL,
+    Branch_Stock INTEGER NOT NULL,
+    Min_Stock INTEGER NOT NULL,
+    Max_Stock INTEGER NOT NULL,
+    Sales_30D INTEGER NOT NULL,
+    PRIMARY KEY (SKU, Branch, Snapshot_Id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS Branch_Inventory_Insert_History AFTER INSERT ON Branch_Inventory BEGIN
+    INSERT OR REPLACE INTO Branch_Inventory_History
+    VALUES (NEW.SKU, NEW.Branch, NEW.Snapshot_Id, NEW.Branch_Stock, NEW.Min_Stock, NEW.Max_Stock, NEW.Sales_30D);
+END;
+CREATE TRIGGER IF NOT EXISTS Branch_Inventory_Update_History AFTER UPDATE ON Branch_Inventory BEGIN
+    INSERT OR REPLACE INTO Branch_Inventory_History
+    VALUES (NEW.SKU, NEW.Branch, NEW.Snapshot_Id, NEW.Branch_Stock, NEW.Min_Stock, NEW.Max_Stock, NEW.Sales_30D);
+END;
+CREATE TABLE IF NOT EXISTS Warehouse_Stock (
+    SKU TEXT PRIMARY KEY,
+    Warehouse_Stock INTEGER NOT NULL,
+    Snapshot_Id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS SKU_Master (
+    SKU TEXT PRIMARY KEY,
+    Product_Name TEXT,
+    Category TEXT,
+    Vendor TEXT,
+    Lead_Time_Days INTEGER,
+    Snapshot_Id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS SKU_Master_Vendor ON SKU_Master (Vendor);
+"""
+
+
+class InventoryStore:
+    """
+    Keeps the three engine inputs in a local SQLite database (in WAL mode, so
+    a run can read while stock snapshots are written), so a run can read only
+    the rows it needs instead of re-reading every input file.
+
+    Every upsert is recorded as a snapshot. A row keeps the ID of the snapshot
+    that last changed it, which is what changed_skus() uses to find the SKUs
+    touched since a given snapshot, and every change to a branch row is kept
+    in Branch_Inventory_History (see stock_history()).
+
+    Branch_Inventory rows keep their position from the files they were
+    loaded from (Row_Order): the warehouse allocation serves a SKU's branches
+    in input order, so rows are always read back in that order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # --- Writing ---
+
+    def upsert(self, branch_inventory=None, warehouse_stock=None, sku_master=None, source=None):
+        """
+        Inserts new rows and updates changed ones, in one transaction recorded
+        as a new snapshot. Rows that are not in the given frames are left as
+        they are, so a partial snapshot (e.g. the stock of a few branches) only
+        touches those rows. Duplicate keys within a frame resolve to the last row.
+
+        Args:
+            branch_inventory (pd.DataFrame, optional): Branch inventory rows.
+            warehouse_stock (pd.DataFrame, optional): Warehouse stock rows.
+            sku_master (pd.DataFrame, optional): SKU master rows.
+            source (str, optional): Where the snapshot came from, e.g. a file name.
+
+        Returns:
+            tuple: The snapshot ID and the number of rows inserted or changed.
+        """
+        tables = {"Branch_Inventory": branch_inventory, "Warehouse_Stock": warehouse_stock, "SKU_Master": sku_master}
+        rows_changed = 0
+        with self._connection:
+            snapshot_id = self._connection.execute(
+                "INSERT INTO snapshots (Taken_At, Source) VALUES (?, ?)", (time.time(), source)
+            ).lastrowid
+            for table, df in tables.items():
+                if df is not None:
+                    rows_changed += self._upsert_table(table, df, snapshot_id)
+            self._connection.execute(
+                "UPDATE snapshots SET Rows_Changed = ? WHERE Snapshot_Id = ?", (rows_changed, snapshot_id)
+            )
+        return snapshot_id, rows_changed
+
+    def _upsert_table(self, table, df, snapshot_id):
+        keys = TABLE_KEYS[table]
+        values = [column for column in INPUT_SCHEMAS[table] if column not in keys]
+        rows = df[list(keys) + values].drop_duplicates(subset=list(keys), keep='last')
+        rows = rows.astype({column: str for column in keys})
+        columns = list(keys) + values
+        if table == "Branch_Inventory":
+            # New rows go after every existing row; existing rows keep their position
+            next_order = self._connection.execute(
+                "SELECT COALESCE(MAX(Row_Order), -1) + 1 FROM Branch_Inventory"
+            ).fetchone()[0]
+            rows = rows.assign(Row_Order=range(next_order, next_order + len(rows)))
+            columns.append("Row_Order")
+        # Only rows whose values differ are updated, so unchanged rows keep their snapshot ID
+        changed = " OR ".join(f"{column} IS NOT excluded.{column}" for column in values)
+        statement = (
+            f"INSERT INTO {table} ({', '.join(columns)}, Snapshot_Id) "
+            f"VALUES ({', '.join('?' * len(columns))}, {int(snapshot_id)}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in values)}, Snapshot_Id = excluded.Snapshot_Id "
+            f"WHERE {changed}"
+        )
+        changes_before = self._connection.total_changes
+        records = rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == UPSERT_BATCH_ROWS:
+                self._connection.executemany(statement, batch)
+                batch = []
+        if batch:
+            self._connection.executemany(statement, batch)
+        # total_changes also counts the history rows written by the triggers
+        changes = self._connection.total_changes - changes_before
+        return changes // 2 if table == "Branch_Inventory" else changes
+
+    def mark_run(self, snapshot_id=None):
+        """
+        Records that a run has processed everything up to snapshot_id (the latest by default).
+        """
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO store_meta (Key, Value) VALUES ('last_run_snapshot', ?)", (str(snapshot_id),)
+            )
+
+    # --- Reading ---
+
+    def latest_snapshot(self):
+        return self._connection.execute("SELECT COALESCE(MAX(Snapshot_Id), 0) FROM snapshots").fetchone()[0]
+
+    def last_run_snapshot(self):
+        """
+        Returns the snapshot ID recorded by the last mark_run(), or 0 if there was none.
+        """
+        row = self._connection.execute("SELECT Value FROM store_meta WHERE Key = 'last_run_snapshot'").fetchone()
+        return 0 if row is None else int(row[0])
+
+    def changed_skus(self, since_snapshot):
+        """
+        Returns the SKUs with a branch, warehouse or master row changed after since_snapshot.
+        """
+        query = " UNION ".join(
+            f"SELECT SKU FROM {table} WHERE Snapshot_Id > ?" for table in TABLE_KEYS
+        )
+        rows = self._connection.execute(query, (since_snapshot,) * len(TABLE_KEYS)).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def vendor_skus(self, vendor):
+        """
+        Returns the SKUs supplied by a vendor, e.g. to rerun just their rows with load_input_tables(skus=...).
+        """
+        rows = self._connection.execute("SELECT SKU FROM SKU_Master WHERE Vendor = ? ORDER BY SKU", (vendor,))
+        return [row[0] for row in rows]
+
+    def stock_history(self, sku, branch=None):
+        """
+        Returns every recorded state of a SKU's branch rows (optionally one
+        branch), with the time of the snapshot that wrote it, oldest first.
+        """
+        query = (
+            "SELECT h.SKU, h.Branch, h.Snapshot_Id, s.Taken_At, h.Branch_Stock, h.Min_Stock, h.Max_Stock, h.Sales_30D "
+            "FROM Branch_Inventory_History h JOIN snapshots s ON s.Snapshot_Id = h.Snapshot_Id WHERE h.SKU = ?"
+        )
+        params = [str(sku)]
+        if branch is not None:
+            query += " AND h.Branch = ?"
+            params.append(str(branch))
+        history = pd.read_sql_query(query + " ORDER BY h.Branch, h.Snapshot_Id", self._connection, params=params)
+        history['Taken_At'] = pd.to_datetime(history['Taken_At'], unit='s')
+        return history
+
+    def load_input_tables(self, actionable_dos_threshold=None, skus=None):
+        """
+        Reads the engine inputs from the store with their declared schema, like
+        file_io.load_input_tables.
+
+        Args:
+            actionable_dos_threshold (int, optional): Read only the branch rows the
+                engine can act on: those below Min_Stock (reorders) or holding more
+                than this many days of sales (excess stock). The transfers, LPO needs
+                and excess stock computed from them are the same as from all rows.
+            skus (iterable, optional): Read only these SKUs, e.g. changed_skus().
+
+        Returns:
+            tuple: branch_inventory, warehouse_stock and sku_master DataFrames.
+        """
+        conditions = []
+        params = []
+        if actionable_dos_threshold is not None:
+            # An inclusive excess bound, so rounding in the engine's float check cannot miss a row
+            conditions.append("((Branch_Stock < Min_Stock AND Max_Stock > Branch_Stock) "
+                              "OR Branch_Stock * 30 >= Sales_30D * ?)")
+            params.append(actionable_dos_threshold)
+        if skus is not None:
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS selected_skus (SKU TEXT PRIMARY KEY)")
+            self._connection.execute("DELETE FROM selected_skus")
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO selected_skus VALUES (?)", ((str(sku),) for sku in skus)
+            )
+            conditions.append("SKU IN (SELECT SKU FROM selected_skus)")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        branch_columns = ", ".join(INPUT_SCHEMAS["Branch_Inventory"])
+        branch_inventory = pd.read_sql_query(
+            f"SELECT {branch_columns} FROM Branch_Inventory{where} ORDER BY Row_Order", self._connection, params=params
+        )
+        # Warehouse and master rows only for the SKUs read
+        sku_filter = "SELECT DISTINCT SKU FROM Branch_Inventory" + where
+        tables = [branch_inventory]
+        for table in ("Warehouse_Stock", "SKU_Master"):
+            columns = ", ".join(INPUT_SCHEMAS[table])
+            tables.append(pd.read_sql_query(
+                f"SELECT {columns} FROM {table} WHERE SKU IN ({sku_filter}) ORDER BY SKU", self._connection,
+                params=params
+            ))
+        return tuple(apply_schema(_typed_if_empty(df, table), table) for df, table in zip(tables, TABLE_KEYS))
+
+
+def _typed_if_empty(df, table):
+    """
+    Gives an empty query result its numeric dtypes, which SQLite cannot report without rows.
+    """
+    if not df.empty:
+        return df
+    return df.astype({column: dtype for column, dtype in INPUT_SCHEMAS[table].items() if dtype != "category"})
@@ -0,0 +1,299 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from .core import run_replenishment_engine
+from .parallel import process_context
+
+DEFAULT_MAX_CONCURRENT_JOBS = 2
+DEFAULT_MAX_QUEUED_JOBS = 8
+# Finished jobs (and their results) kept for polling before the oldest are dropped
+DEFAULT_FINISHED_JOBS_KEPT = 16
+
+# The engine writes its outputs in this, its last stage, so a cancel noticed
+# once it has started no longer stops the run
+FINAL_STAGE = "write"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueueFullError(RuntimeError):
+    """
+    Raised by JobManager.submit when the queue already holds the maximum number of jobs.
+    """
+
+
+class JobCancelledError(Exception):
+    """
+    Raised inside a worker at the next stage boundary of a job that was cancelled while running.
+    """
+
+
+@dataclass
+class Job:
+    """
+    Status of one engine run submitted to a JobManager.
+    """
+    job_id: str
+    status: str = JOB_QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    stage: str | None = None
+    stage_index: int = 0
+    stage_total: int | None = None
+    error: str | None = None
+    cancel_requested: bool = False
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def progress(self):
+        """
+        Fraction of the run's stages completed, from 0 to 1.
+        """
+        if self.status == JOB_DONE:
+            return 1.0
+        return self.stage_index / self.stage_total if self.stage_total else 0.0
+
+
+def _run_job(job_id, engine_kwargs, progress, cancel_requests):
+    """
+    Worker entry point: runs the engine for one job, publishing each completed
+    stage to the shared progress dict and stopping at the next stage boundary
+    once the job is in cancel_requests, unless the outputs are already written.
+    """
+    def report_progress(stage, index, total, rows):
+        progress[job_id] = (stage, index, total)
+        if job_id in cancel_requests and stage != FINAL_STAGE:
+            raise JobCancelledError(job_id)
+
+    # Published before checking for a cancel, so a cancel() that finds no
+    # progress can rely on this check to stop the job
+    progress[job_id] = (None, 0, None)
+    if job_id in cancel_requests:
+        # Cancelled while queued, and already reported as such by cancel()
+        progress.pop(job_id, None)
+        cancel_requests.pop(job_id, None)
+        raise JobCancelledError(job_id)
+    return run_replenishment_engine(**engine_kwargs, progress_callback=report_progress)
+
+
+class JobManager:
+    """
+    Runs run_replenishment_engine calls in a pool of worker processes, so that
+    callers (e.g. Streamlit sessions) submit a run and poll for its status
+    instead of blocking on it.
+
+    At most max_concurrent_jobs runs execute at once; further jobs wait in a
+    queue of at most max_queued_jobs (counting the running ones), beyond which
+    submit raises JobQueueFullError. Queued jobs are cancelled immediately,
+    running ones at their next stage boundary (a job that is already writing
+    its outputs completes).
+
+    A job's results are kept until result() returns them, and are then
+    released; the job's status stays available until it is one of more than
+    finished_jobs_kept finished jobs.
+
+    Inputs and results are pickled between processes, so pass DataFrames rather
+    than objects bound to this process. A ResultCache passed as the engine's
+    cache argument is only shared between jobs through its disk tier; look the
+    run up with core.lookup_cached_run before submitting it to serve repeat
+    runs from this process's memory tier without a job.
+    """
+
+    def __init__(self, max_concurrent_jobs=DEFAULT_MAX_CONCURRENT_JOBS, max_queued_jobs=DEFAULT_MAX_QUEUED_JOBS,
+                 finished_jobs_kept=DEFAULT_FINISHED_JOBS_KEPT):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.finished_jobs_kept = finished_jobs_kept
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._sync_manager = None
+        self._progress = None
+        self._cancel_requests = None
+
+    def _start(self):
+        if self._executor is None:
+            # Spawned, not forked, as this usually runs in a threaded server
+            context = process_context()
+            self._sync_manager = context.Manager()
+            self._progress = self._sync_manager.dict()
+            self._cancel_requests = self._sync_manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_concurrent_jobs, mp_context=context)
+
+    def submit(self, **engine_kwargs):
+        """
+        Queues a run_replenishment_engine call.
+
+        Args:
+            **engine_kwargs: Keyword arguments for run_replenishment_engine
+                             (progress_callback is set by the job).
+
+        Returns:
+            str: The job ID, for status(), result() and cancel().
+
+        Raises:
+            JobQueueFullError: If max_queued_jobs jobs are already queued or running.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                self._refresh(job)
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_queued_jobs:
+                raise JobQueueFullError(
+                    f"{active} engine runs are already queued or running. Please try again shortly."
+                )
+            self._start()
+            job = Job(job_id=uuid.uuid4().hex[:12])
+            self._jobs[job.job_id] = job
+            self._futures[job.job_id] = self._executor.submit(
+                _run_job, job.job_id, engine_kwargs, self._progress, self._cancel_requests
+            )
+        return job.job_id
+
+    def _refresh(self, job):
+        """
+        Updates job from its future and the progress published by its worker.
+        """
+        if job.finished:
+            return
+        future = self._futures[job.job_id]
+        stage = self._progress.get(job.job_id)
+        if stage is not None:
+            job.status = JOB_RUNNING
+            job.stage, job.stage_index, job.stage_total = stage
+        if not future.done():
+            return
+
+        if future.cancelled():
+            job.status = JOB_CANCELLED
+        else:
+            error = future.exception()
+            if error is None:
+                job.status = JOB_DONE
+            elif isinstance(error, JobCancelledError):
+                job.status = JOB_CANCELLED
+            else:
+                job.status = JOB_FAILED
+                job.error = f"{type(error).__name__}: {error}"
+        job.finished_at = time.time()
+        self._progress.pop(job.job_id, None)
+        self._cancel_requests.pop(job.job_id, None)
+        if job.status == JOB_CANCELLED:
+            del self._futures[job.job_id]
+        self._forget_old_jobs()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.finished_jobs_kept)]:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+
+    def status(self, job_id):
+        """
+        Returns a snapshot of the job's status, or None for an unknown (or long finished) job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._refresh(job)
+            return Job(**vars(job))
+
+    def jobs(self):
+        """
+        Returns snapshots of all known jobs, oldest first.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                self._refresh(job)
+            return [Job(**vars(job)) for job in self._jobs.values()]
+
+    def result(self, job_id, timeout=None):
+        """
+        Returns what run_replenishment_engine returned for a job, waiting up to
+        timeout seconds (None waits until it finishes). The results are then
+        released, so each job's results can be fetched once.
+
+        Raises:
+            KeyError: For an unknown job, or one whose results were already fetched or dropped.
+            CancelledError: If the job was cancelled.
+            TimeoutError: If the job did not finish within timeout.
+            Exception: Whatever the engine raised, if the job failed.
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+            job = self._jobs.get(job_id)
+        if job is not None and job.status == JOB_CANCELLED:
+            raise CancelledError(job_id)
+        if future is None:
+            raise KeyError(job_id)
+        try:
+            return future.result(timeout)
+        except JobCancelledError:
+            raise CancelledError(job_id) from None
+        finally:
+            if future.done():
+                self._release(job_id)
+
+    def _release(self, job_id):
+        """
+        Drops a finished job's results, keeping its status.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._refresh(job)
+            self._futures.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued job never starts, a running one stops at its
+        next stage boundary.
+
+        Returns:
+            bool: False if the job is unknown or has already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            self._refresh(job)
+            if job.finished:
+                return False
+            self._cancel_requests[job_id] = True
+            job.cancel_requested = True
+            if self._futures[job_id].cancel():
+                self._refresh(job)
+            elif self._progress.get(job_id) is None:
+                # Already handed to a worker, which has not started it and will
+                # drop it on seeing the cancel, so it is cancelled now
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+                del self._futures[job_id]
+                self._forget_old_jobs()
+            return True
+
+    def shutdown(self, cancel_pending=True):
+        """
+        Stops the worker processes, cancelling queued jobs unless cancel_pending is False.
+        """
+        with self._lock:
+            if self._executor is None:
+                return
+            self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
+            for job in self._jobs.values():
+                self._refresh(job)
+            self._sync_manager.shutdown()
+            self._executor = None
@@ -0,0 +1,127 @@
+import pandas as pd
+import json
+import os
+import time
+from .file_io import write_atomically
+from .schema import align_key_categories
+
+# Orders compared between runs (file_io.ORDER_CHANGE_TABLES): their key columns and the quantity compared
+ORDER_TABLES = {
+    "Transfer_Orders": (["SKU", "To_Branch"], "Transfer_Qty"),
+    "LPO_Needs": (["SKU", "Vendor"], "Required_Qty"),
+}
+
+CHANGE_ADDED = "added"
+CHANGE_REMOVED = "removed"
+CHANGE_CHANGED = "changed"
+
+_SNAPSHOT_META_FILE = "snapshot.json"
+
+
+def order_snapshot(orders_df, table):
+    """
+    Reduces an order table to its keys and quantity, one row per key (quantities
+    of repeated keys are summed), with categorical keys to keep it compact.
+    """
+    keys, quantity = ORDER_TABLES[table]
+    snapshot = orders_df[keys + [quantity]].copy()
+    # Typed even when empty (e.g. a run without LPOs), which would otherwise leave an object column
+    snapshot[quantity] = snapshot[quantity].astype('int64')
+    for key in keys:
+        snapshot[key] = snapshot[key].astype(str).astype("category")
+    return snapshot.groupby(keys, observed=True, sort=False)[quantity].sum().reset_index()
+
+
+def diff_orders(previous, current, table):
+    """
+    Compares two snapshots of an order table (see order_snapshot) with one hash
+    join on their keys.
+
+    Returns:
+        pd.DataFrame: The keys of every added, removed or changed order with a
+                      Change column, the previous and current quantities (0
+                      when absent) and the difference. Unchanged orders are left out.
+    """
+    keys, quantity = ORDER_TABLES[table]
+    # Snapshots saved by earlier versions may hold an untyped empty quantity column
+    previous = previous.astype({quantity: 'int64'})
+    current = current.astype({quantity: 'int64'})
+    # Shared categories let the join run on the integer codes of the keys
+    for key in keys:
+        previous, current = align_key_categories([previous, current], column=key)
+    joined = pd.merge(
+        previous, current, on=keys, how='outer', suffixes=('_Previous', '_Current'), indicator=True, sort=False
+    )
+    previous_qty = joined[f'{quantity}_Previous'].fillna(0).astype('int64')
+    current_qty = joined[f'{quantity}_Current'].fillna(0).astype('int64')
+    change = joined['_merge'].map({'left_only': CHANGE_REMOVED, 'right_only': CHANGE_ADDED, 'both': CHANGE_CHANGED})
+    changes = joined[keys].assign(
+        Change=change.astype(str),
+        **{f'Previous_{quantity}': previous_qty, f'Current_{quantity}': current_qty,
+           'Qty_Change': current_qty - previous_qty}
+    )
+    changes = changes[(changes['Change'] != CHANGE_CHANGED) | (changes['Qty_Change'] != 0)]
+    return changes.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def load_snapshots(state_path):
+    """
+    Returns the order snapshots saved by the previous run as a dict of table to
+    DataFrame, and the run ID that saved them. Both are empty (None) before the first run.
+    """
+    meta_path = os.path.join(state_path, _SNAPSHOT_META_FILE)
+    if not os.path.exists(meta_path):
+        return {}, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    snapshots = {table: pd.read_parquet(os.path.join(state_path, f"{table}.parquet")) for table in ORDER_TABLES}
+    return snapshots, meta.get("run_id")
+
+
+def save_snapshots(state_path, snapshots, run_id):
+    """
+    Saves the order snapshots of a run as the baseline for the next one, each
+    file atomically.
+    """
+    os.makedirs(state_path, exist_ok=True)
+    for table, snapshot in snapshots.items():
+        write_atomically(os.path.join(state_path, f"{table}.parquet"),
+                         lambda path, snapshot=snapshot: snapshot.to_parquet(path, index=False))
+    write_atomically(os.path.join(state_path, _SNAPSHOT_META_FILE),
+                     lambda path: _write_json(path, {"run_id": run_id, "saved_at": time.time()}))
+
+
+def compute_order_changes(state_path, transfer_orders_df, lpo_needs_df):
+    """
+    Compares a run's transfer orders and LPO needs with the snapshots saved by
+    the previous run in state_path. On the first run every order is added.
+
+    Returns:
+        tuple: A dict of table to its changes (see diff_orders), and a dict of
+               table to this run's snapshot, to save with save_snapshots once the
+               run's outputs are written.
+    """
+    previous_snapshots, previous_run_id = load_snapshots(state_path)
+    current_snapshots = {
+        "Transfer_Orders": order_snapshot(transfer_orders_df, "Transfer_Orders"),
+        "LPO_Needs": order_snapshot(lpo_needs_df, "LPO_Needs"),
+    }
+    changes = {}
+    for table, current in current_snapshots.items():
+        previous = previous_snapshots.get(table, current.iloc[:0])
+        changes[table] = diff_orders(previous, current, table)
+    summary = ", ".join(
+        f"{table}: " + " ".join(
+            f"{(table_changes['Change'] == change).sum()} {change}"
+            for change in (CHANGE_ADDED, CHANGE_REMOVED, CHANGE_CHANGED)
+        )
+        for table, table_changes in changes.items()
+    )
+    since = f"run {previous_run_id}" if previous_run_id else "no previous run"
+    print(f"Order changes since {since}: {summary}.")
+    return changes, current_snapshots
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
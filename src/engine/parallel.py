@@ -0,0 +1,94 @@
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import core
+
+# Worker processes are started fresh rather than forked: the engine runs inside
+# threaded processes (the Streamlit server, JobManager workers), and a forked
+# child can inherit a lock held by another thread and deadlock
+PROCESS_START_METHOD = "spawn"
+
+
+def process_context():
+    """
+    Returns the multiprocessing context that engine worker pools are created with.
+    """
+    return multiprocessing.get_context(PROCESS_START_METHOD)
+
+
+def shard_by_sku(merged_data, num_shards):
+    """
+    Hash-partitions merged_data by SKU so that every SKU lands in exactly one shard.
+    Rows keep their index labels, which later restore the original order.
+
+    Args:
+        merged_data (pd.DataFrame): The merged engine input.
+        num_shards (int): Number of shards to split into.
+
+    Returns:
+        list: Up to num_shards DataFrames; empty shards are left out.
+    """
+    shard_ids = pd.util.hash_pandas_object(merged_data['SKU'], index=False).to_numpy() % num_shards
+    shards = [merged_data[shard_ids == shard_id] for shard_id in range(num_shards)]
+    return [shard for shard in shards if not shard.empty]
+
+
+def _run_shard(shard, available_warehouse_stock, lean=False):
+    """
+    Worker entry point: runs the engine calculations on one shard.
+    """
+    return core.compute_replenishment(shard.copy(), available_warehouse_stock, lean=lean)
+
+
+def merge_shard_results(shard_results):
+    """
+    Combines per-shard results of compute_replenishment into the results a
+    serial run over all shards would have produced, row order included.
+
+    Returns:
+        tuple: merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df and
+               lpo_trigger_transfers_df.
+    """
+    merged_parts, transfer_parts, lpo_parts, excess_parts, trigger_parts = zip(*shard_results)
+
+    # merged_data and excess stock keep the merged index, which is the serial order.
+    # Lean runs return no merged_data.
+    merged_data = None if merged_parts[0] is None else pd.concat(merged_parts).sort_index()
+    excess_stock_df = pd.concat(excess_parts).sort_index()
+
+    # Allocation output is sorted by SKU; a stable sort keeps each SKU's own
+    # row order, which comes entirely from the one shard that held the SKU
+    transfer_orders_df = pd.concat(transfer_parts, ignore_index=True).sort_values(
+        by='SKU', kind='stable'
+    ).reset_index(drop=True)
+    lpo_trigger_transfers_df = pd.concat(trigger_parts, ignore_index=True).sort_values(
+        by='SKU', kind='stable'
+    ).reset_index(drop=True)
+    lpo_needs_df = pd.concat(lpo_parts, ignore_index=True).sort_values(by=['SKU', 'Vendor']).reset_index(drop=True)
+
+    return merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df
+
+
+def compute_replenishment_parallel(merged_data, available_warehouse_stock, workers, lean=False):
+    """
+    Runs compute_replenishment on SKU shards in a pool of worker processes.
+    The results are identical to a serial compute_replenishment call.
+
+    Args:
+        merged_data (pd.DataFrame): The merged engine input.
+        available_warehouse_stock (pd.Series): Warehouse stock indexed by SKU.
+        workers (int): Number of worker processes (and shards).
+        lean (bool): See core.compute_replenishment.
+
+    Returns:
+        tuple: merged_data, transfer_orders_df, lpo_needs_df, excess_stock_df and
+               lpo_trigger_transfers_df.
+    """
+    shards = shard_by_sku(merged_data, workers)
+    if len(shards) <= 1:
+        return core.compute_replenishment(merged_data, available_warehouse_stock, lean=lean)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as executor:
+        futures = [executor.submit(_run_shard, shard, available_warehouse_stock, lean) for shard in shards]
+        shard_results = [future.result() for future in futures]
+    return merge_shard_results(shard_results)
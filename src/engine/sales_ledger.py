@@ -0,0 +1,356 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+from datetime import date, timedelta
+from .file_io import write_atomically
+from .forecasting import FORECAST_HISTORY_DAYS, FORECAST_MODELS, forecast_daily_sales
+
+# Min/Max policy, as documented: Min_Stock covers demand over the lead time with a
+# safety buffer, Max_Stock is a multiple of it (same as the test data generator)
+SALES_WINDOW_DAYS = 30
+SAFETY_STOCK_FACTOR = 1.5
+MAX_STOCK_FACTOR = 3.0
+MIN_STOCK_FLOOR = 5        # Keeps slow movers from getting a zero minimum
+MIN_MAX_STOCK_GAP = 10     # Max_Stock is at least this far above Min_Stock
+
+DEFAULT_HISTORY_DAYS = 365
+SALES_DTYPE = np.int32
+
+_META_FILE = "ledger.json"
+_KEYS_FILE = "keys.parquet"
+_SALES_FILE = "sales.npy"
+_ROLLING_FILE = "rolling.npz"
+
+
+class SalesLedger:
+    """
+    Daily unit sales per SKU x branch, kept on disk as a memory-mapped
+    (days x series) int32 array so a year of history for a large chain does not
+    have to fit in memory. Each series is one SKU x branch; keys() gives their order.
+
+    The array is a ring buffer of history_days days, one contiguous row per
+    day, so appending a day writes one row. Rolling sums over each configured
+    window are kept alongside it and updated incrementally on append (adding
+    the new day and subtracting the day leaving the window), so the nightly
+    update never rescans the history.
+    """
+
+    def __init__(self, path, meta, keys, sales, rolling):
+        self.path = path
+        self._meta = meta
+        self._keys = keys
+        self._sales = sales
+        self._rolling = rolling
+
+    @classmethod
+    def create(cls, path, keys, history_days=DEFAULT_HISTORY_DAYS, windows=(SALES_WINDOW_DAYS,)):
+        """
+        Creates an empty ledger.
+
+        Args:
+            path (str): Directory to create the ledger in.
+            keys (pd.DataFrame): The SKU x branch series to track, as SKU and Branch columns.
+            history_days (int): Days of daily sales to keep.
+            windows (iterable): Rolling windows, in days, to maintain sums for.
+
+        Returns:
+            SalesLedger: The new ledger.
+        """
+        windows = sorted({int(window) for window in windows})
+        if history_days < windows[-1]:
+            raise ValueError(f"history_days ({history_days}) must cover the longest window ({windows[-1]} days).")
+        keys = keys[['SKU', 'Branch']].astype(str).drop_duplicates().reset_index(drop=True)
+        os.makedirs(path, exist_ok=True)
+
+        keys.to_parquet(os.path.join(path, _KEYS_FILE), index=False)
+        sales = np.lib.format.open_memmap(
+            os.path.join(path, _SALES_FILE), mode="w+", dtype=SALES_DTYPE, shape=(history_days, len(keys))
+        )
+        rolling = np.zeros((len(windows), len(keys)), dtype=np.int64)
+        meta = {"history_days": history_days, "windows": windows, "num_days": 0, "last_date": None}
+        ledger = cls(path, meta, keys, sales, rolling)
+        ledger._save_rolling()
+        ledger._save_meta()
+        return ledger
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens an existing ledger. The daily sales are memory-mapped, not read.
+        """
+        with open(os.path.join(path, _META_FILE)) as f:
+            meta = json.load(f)
+        keys = pd.read_parquet(os.path.join(path, _KEYS_FILE))
+        sales = np.load(os.path.join(path, _SALES_FILE), mmap_mode="r+")
+        with np.load(os.path.join(path, _ROLLING_FILE)) as saved:
+            rolling, rolling_days = saved["rolling"], int(saved["num_days"])
+        ledger = cls(path, meta, keys, sales, rolling)
+        if rolling_days != meta["num_days"]:
+            # An append was interrupted between saving the sums and the metadata
+            print("Sales ledger: rolling sums are out of step with the history; recomputing them.")
+            ledger.recompute_rolling()
+        return ledger
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, _META_FILE))
+
+    def _save_rolling(self):
+        write_atomically(
+            os.path.join(self.path, _ROLLING_FILE),
+            lambda path: _write_arrays(path, rolling=self._rolling, num_days=self._meta["num_days"])
+        )
+
+    def _save_meta(self):
+        write_atomically(os.path.join(self.path, _META_FILE), lambda path: _write_json(path, self._meta))
+
+    # --- Shape ---
+
+    def keys(self):
+        """
+        Returns the SKU and Branch of every series, in the ledger's column order.
+        """
+        return self._keys
+
+    @property
+    def num_days(self):
+        """
+        Number of days appended so far (history older than history_days is dropped).
+        """
+        return self._meta["num_days"]
+
+    @property
+    def last_date(self):
+        return None if self._meta["last_date"] is None else date.fromisoformat(self._meta["last_date"])
+
+    @property
+    def windows(self):
+        return list(self._meta["windows"])
+
+    def _day_row(self, day_number):
+        return day_number % self._meta["history_days"]
+
+    # --- Appending ---
+
+    def align_sales(self, daily_sales):
+        """
+        Returns one day's sales as an array in the ledger's series order.
+        Series missing from daily_sales sold nothing; rows for unknown series
+        are ignored with a warning.
+
+        Args:
+            daily_sales (pd.DataFrame): SKU, Branch and Units columns.
+        """
+        series_index = pd.MultiIndex.from_frame(self._keys)
+        positions = series_index.get_indexer(
+            pd.MultiIndex.from_arrays([daily_sales['SKU'].astype(str), daily_sales['Branch'].astype(str)])
+        )
+        known = positions >= 0
+        if not known.all():
+            print(f"Sales ledger: ignoring {int((~known).sum())} sales rows for SKU x branch pairs not in the ledger.")
+        sales = np.zeros(len(self._keys), dtype=np.int64)
+        np.add.at(sales, positions[known], daily_sales['Units'].to_numpy(dtype=np.int64)[known])
+        return sales
+
+    def append_day(self, sales, sales_date=None):
+        """
+        Appends one day of sales and updates the rolling sums incrementally.
+
+        Args:
+            sales (array-like or pd.DataFrame): Units sold per series, in the order of
+                keys(), or a DataFrame with SKU, Branch and Units columns.
+            sales_date (datetime.date, optional): The day the sales are for. Days
+                skipped since the last appended date are recorded as no sales.
+        """
+        if isinstance(sales, pd.DataFrame):
+            sales = self.align_sales(sales)
+        sales = np.asarray(sales)
+        if sales.shape != (len(self._keys),):
+            raise ValueError(f"Expected sales for {len(self._keys)} series, got shape {sales.shape}.")
+
+        if sales_date is not None and self.last_date is not None:
+            gap_days = (sales_date - self.last_date).days
+            if gap_days < 1:
+                raise ValueError(f"Sales for {sales_date} are not after the last day in the ledger ({self.last_date}).")
+            for _ in range(gap_days - 1):
+                self._append_row(np.zeros(len(self._keys), dtype=np.int64))
+        self._append_row(sales)
+
+        if sales_date is not None:
+            self._meta["last_date"] = sales_date.isoformat()
+        elif self.last_date is not None:
+            self._meta["last_date"] = (self.last_date + timedelta(days=1)).isoformat()
+        # The history is written first; the rolling sums record the day count they
+        # include, so an interrupted append is detected (and repaired) on open
+        self._sales.flush()
+        self._save_rolling()
+        self._save_meta()
+
+    def _append_row(self, sales):
+        day_number = self._meta["num_days"]
+        for position, window in enumerate(self._meta["windows"]):
+            self._rolling[position] += sales
+            if day_number >= window:
+                self._rolling[position] -= self._sales[self._day_row(day_number - window)]
+        self._sales[self._day_row(day_number)] = sales
+        self._meta["num_days"] = day_number + 1
+
+    # --- Reading ---
+
+    def history(self, days=None):
+        """
+        Returns the last `days` days of sales (all kept history by default) as a
+        (days x series) array, oldest day first.
+        """
+        available = min(self.num_days, self._meta["history_days"])
+        days = available if days is None else min(days, available)
+        rows = [self._day_row(day) for day in range(self.num_days - days, self.num_days)]
+        return np.asarray(self._sales[rows])
+
+    def rolling_sum(self, window=SALES_WINDOW_DAYS):
+        """
+        Returns the units sold per series over the last `window` days.
+        """
+        return self._rolling[self._meta["windows"].index(window)].copy()
+
+    def rolling_ads(self, window=SALES_WINDOW_DAYS):
+        """
+        Returns the average daily sales per series over the last `window` days,
+        or over all days appended so far if there are fewer.
+        """
+        days = min(window, self.num_days)
+        if days == 0:
+            return np.zeros(len(self._keys))
+        return self.rolling_sum(window) / days
+
+    def recompute_rolling(self):
+        """
+        Rebuilds the rolling sums from the stored history, e.g. to verify or
+        repair them, and returns whether they had drifted.
+        """
+        rolling = np.stack([self.history(window).sum(axis=0, dtype=np.int64) for window in self._meta["windows"]])
+        drifted = not np.array_equal(rolling, self._rolling)
+        self._rolling = rolling
+        self._save_rolling()
+        return drifted
+
+
+def min_max_from_ads(avg_daily_sales, lead_time_days, safety_stock_factor=SAFETY_STOCK_FACTOR,
+                     max_stock_factor=MAX_STOCK_FACTOR):
+    """
+    Computes Min_Stock and Max_Stock from average daily sales and lead times,
+    following the documented policy.
+
+    Returns:
+        tuple: Min_Stock and Max_Stock as int64 arrays.
+    """
+    min_stock = np.maximum(
+        MIN_STOCK_FLOOR, (np.asarray(avg_daily_sales) * safety_stock_factor * lead_time_days).astype(np.int64)
+    )
+    max_stock = np.maximum(min_stock + MIN_MAX_STOCK_GAP, (min_stock * max_stock_factor).astype(np.int64))
+    return min_stock, max_stock
+
+
+def apply_sales_history(branch_inventory, sku_master, ledger, window=SALES_WINDOW_DAYS, forecast=False):
+    """
+    Replaces Sales_30D, Min_Stock and Max_Stock of every branch inventory row
+    tracked by the ledger with values computed from its rolling sales over
+    `window` days and the SKU's Lead_Time_Days. Rows the ledger does not track
+    keep their values.
+
+    The average daily sales used are also added as an Avg_Daily_Sales column,
+    which the excess stock check then uses instead of Sales_30D / 30: while the
+    ledger holds fewer than `window` days, Sales_30D only covers the days held,
+    and Avg_Daily_Sales is averaged over those days. Rows the ledger does not
+    track get Sales_30D / 30.
+
+    With forecast, Min_Stock, Max_Stock and Avg_Daily_Sales come from forecast
+    daily sales over the lead time instead (see forecasting.forecast_daily_sales).
+
+    Args:
+        branch_inventory (pd.DataFrame): Branch inventory with the input schema applied.
+        sku_master (pd.DataFrame): SKU master, for Lead_Time_Days.
+        ledger (SalesLedger): The daily sales history.
+        window (int): Days of sales the rolling ADS is taken over.
+        forecast (bool): Use forecast rather than rolling average daily sales.
+
+    Returns:
+        pd.DataFrame: A copy of branch_inventory with the recomputed columns.
+    """
+    series_index = pd.MultiIndex.from_frame(ledger.keys())
+    positions = series_index.get_indexer(
+        pd.MultiIndex.from_arrays([branch_inventory['SKU'].astype(str), branch_inventory['Branch'].astype(str)])
+    )
+    tracked = positions >= 0
+
+    sku_master = sku_master.drop_duplicates(subset='SKU', keep='last')
+    lead_times = pd.Series(sku_master['Lead_Time_Days'].to_numpy(), index=sku_master['SKU'].astype(str))
+    lead_time_days = lead_times.reindex(branch_inventory['SKU'].astype(str)).to_numpy()
+    tracked &= ~pd.isna(lead_time_days)
+
+    lead_time_days = lead_time_days[tracked].astype(np.int64)
+    if forecast:
+        ads, models = forecast_daily_sales(ledger.history(FORECAST_HISTORY_DAYS)[:, positions[tracked]], lead_time_days)
+        model_counts = np.bincount(models, minlength=len(FORECAST_MODELS))
+        print("Sales ledger: forecast models used: " + ", ".join(
+            f"{model} {count}" for model, count in zip(FORECAST_MODELS, model_counts) if count
+        ) + ".")
+    else:
+        ads = ledger.rolling_ads(window)[positions[tracked]]
+    min_stock, max_stock = min_max_from_ads(ads, lead_time_days)
+    sales = ledger.rolling_sum(window)[positions[tracked]]
+
+    updated = branch_inventory.copy()
+    avg_daily_sales = updated['Sales_30D'].to_numpy(dtype=np.float64) / 30
+    avg_daily_sales[tracked] = ads
+    updated['Avg_Daily_Sales'] = avg_daily_sales
+    for column, values in (('Sales_30D', sales), ('Min_Stock', min_stock), ('Max_Stock', max_stock)):
+        column_values = updated[column].to_numpy(dtype=np.int64, copy=True)
+        column_values[tracked] = values
+        updated[column] = column_values
+    print(f"Sales ledger: recomputed Min/Max for {int(tracked.sum())} of {len(updated)} branch rows "
+          f"from {min(FORECAST_HISTORY_DAYS if forecast else window, ledger.num_days)} days of sales.")
+    return updated
+
+
+def append_sales_file(ledger_path, sales_path, keys=None):
+    """
+    Appends one day of sales from a CSV with SKU, Branch and Units columns (and
+    optionally a Date column) to the ledger, creating the ledger first if needed.
+
+    Args:
+        ledger_path (str): Directory of the ledger.
+        sales_path (str): The day's sales CSV.
+        keys (pd.DataFrame, optional): SKU and Branch of the series to track when
+                                       creating the ledger (e.g. the branch inventory).
+
+    Returns:
+        SalesLedger: The updated ledger.
+    """
+    if SalesLedger.exists(ledger_path):
+        ledger = SalesLedger.open(ledger_path)
+    else:
+        if keys is None:
+            raise ValueError(f"No sales ledger in '{ledger_path}' and no SKU x branch keys to create one.")
+        ledger = SalesLedger.create(ledger_path, keys)
+    daily_sales = pd.read_csv(sales_path, dtype={'SKU': str, 'Branch': str})
+    sales_date = None
+    if 'Date' in daily_sales.columns:
+        dates = pd.to_datetime(daily_sales['Date']).dt.date.unique()
+        if len(dates) != 1:
+            raise ValueError(f"{sales_path} holds sales for {len(dates)} dates; append one day at a time.")
+        sales_date = dates[0]
+    ledger.append_day(daily_sales, sales_date)
+    return ledger
+
+
+def _write_arrays(path, **arrays):
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
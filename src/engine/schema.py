@@ -0,0 +1,166 @@
+import pandas as pd
+import numpy as np
+import sys
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+
+# Declared dtypes for the three input files. Keys and labels are repeated on
+# every SKU x branch row, so they are stored as categoricals; quantities fit in
+# 32 bits (16 for lead times).
+INPUT_SCHEMAS = {
+    "Branch_Inventory": {
+        "SKU": "category",
+        "Branch": "category",
+        "Branch_Stock": "int32",
+        "Min_Stock": "int32",
+        "Max_Stock": "int32",
+        "Sales_30D": "int32",
+    },
+    "Warehouse_Stock": {
+        "SKU": "category",
+        "Warehouse_Stock": "int32",
+    },
+    "SKU_Master": {
+        "SKU": "category",
+        "Product_Name": "category",
+        "Category": "category",
+        "Vendor": "category",
+        "Lead_Time_Days": "int16",
+    },
+}
+
+
+def table_for_filename(file_name):
+    """
+    Returns the input table a file name refers to (e.g. 'Branch_Inventory'), or None.
+    """
+    for table in INPUT_SCHEMAS:
+        if table in file_name:
+            return table
+    return None
+
+
+def _as_sorted_category(series):
+    """
+    Converts a column to a categorical whose categories are in sorted order, so that
+    sorting and grouping on it give the same order as on the plain strings.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if categories.is_monotonic_increasing and not series.cat.ordered:
+            return series
+        return series.cat.set_categories(categories.sort_values(), ordered=False)
+    return series.astype("category")
+
+
+def _downcast_integer(series, dtype):
+    """
+    Casts an integer column to the narrower dtype when every value fits.
+    Anything else (floats, NaNs, out-of-range values) is left untouched.
+    """
+    if not pd.api.types.is_integer_dtype(series.dtype) or series.dtype == dtype:
+        return series
+    limits = np.iinfo(dtype)
+    if series.empty or (series.min() >= limits.min and series.max() <= limits.max):
+        return series.astype(dtype)
+    return series
+
+
+def apply_schema(df, table):
+    """
+    Returns a copy of df with the declared dtypes of the given input table applied.
+    Columns that are not part of the schema are kept as they are.
+
+    Args:
+        df (pd.DataFrame): One of the three input tables.
+        table (str): 'Branch_Inventory', 'Warehouse_Stock' or 'SKU_Master'.
+
+    Returns:
+        pd.DataFrame: The typed DataFrame.
+    """
+    typed = df.copy(deep=False)
+    for column, dtype in INPUT_SCHEMAS[table].items():
+        if column not in typed.columns:
+            continue
+        if dtype == "category":
+            typed[column] = _as_sorted_category(typed[column])
+        else:
+            typed[column] = _downcast_integer(typed[column], dtype)
+    return typed
+
+
+def read_input_csv(path_or_buffer, table):
+    """
+    Reads one of the input CSVs with its declared schema, using the pyarrow CSV
+    parser when it is installed.
+
+    Args:
+        path_or_buffer (str or file-like): The CSV to read.
+        table (str): 'Branch_Inventory', 'Warehouse_Stock' or 'SKU_Master'.
+
+    Returns:
+        pd.DataFrame: The typed DataFrame.
+    """
+    category_dtypes = {
+        column: "category" for column, dtype in INPUT_SCHEMAS[table].items() if dtype == "category"
+    }
+    df = pd.read_csv(path_or_buffer, dtype=category_dtypes, engine=CSV_ENGINE)
+    return apply_schema(df, table)
+
+
+def align_key_categories(frames, column="SKU"):
+    """
+    Gives the key column of every frame the same sorted categories, so merges
+    and lookups between them work on the integer codes.
+
+    Args:
+        frames (list of pd.DataFrame): Frames that all have a categorical `column`.
+        column (str): The key column to align.
+
+    Returns:
+        list of pd.DataFrame: Shallow copies of the frames with aligned categories.
+    """
+    categories = union_categoricals([frame[column] for frame in frames], sort_categories=True).categories
+    aligned = []
+    for frame in frames:
+        frame = frame.copy(deep=False)
+        frame[column] = frame[column].cat.set_categories(categories)
+        aligned.append(frame)
+    return aligned
+
+
+def frames_memory_mb(*frames):
+    """
+    Returns the total in-memory size of the given DataFrames in megabytes.
+    """
+    return sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1024 ** 2
+
+
+def untyped_memory_mb(*frames):
+    """
+    Returns the in-memory size in megabytes the given typed DataFrames would
+    take as pandas reads them without a schema: categorical columns as Python
+    strings and integers as int64. It is computed from the categories and
+    their counts, so the untyped frames are never built.
+    """
+    pointer_size = np.dtype(object).itemsize
+    total = 0
+    for frame in frames:
+        total += frame.index.memory_usage(deep=True)
+        for _, series in frame.items():
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Code -1 marks a missing value, read as a NaN float
+                counts = np.bincount(series.cat.codes.to_numpy() + 1, minlength=len(series.cat.categories) + 1)
+                sizes = [sys.getsizeof(np.nan)] + [sys.getsizeof(value) for value in series.cat.categories]
+                total += len(series) * pointer_size + int(counts @ np.asarray(sizes))
+            elif pd.api.types.is_integer_dtype(series.dtype):
+                total += len(series) * np.dtype('int64').itemsize
+            else:
+                total += series.memory_usage(deep=True, index=False)
+    return total / 1024 ** 2
@@ -0,0 +1,203 @@
+import pandas as pd
+import numpy as np
+import os
+import uuid
+from .core import compute_replenishment
+from .file_io import table_path, write_atomically
+from .schema import INPUT_SCHEMAS, apply_schema, align_key_categories, read_input_csv
+
+STREAMING_FORMATS = ("csv", "parquet")
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+class _OutputAppender:
+    """
+    Appends DataFrames to one output file, chunk by chunk. The rows go to a
+    temporary file that close() renames into place, so readers never see a
+    partial output.
+    """
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self.rows_written = 0
+        self._parquet_writer = None
+        self._empty_frame = None
+        directory, name = os.path.split(path)
+        self._temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def append(self, df):
+        if df.empty:
+            # Kept so the file still gets its columns if no chunk has any rows
+            self._empty_frame = df
+            return
+        # Categories differ from chunk to chunk, so write plain values
+        df = df.astype({column: str for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)})
+        if self.file_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self._temp_path, table.schema)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        else:
+            df.to_csv(self._temp_path, mode='a', header=self.rows_written == 0, index=False)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        elif self.rows_written == 0 and self._empty_frame is not None:
+            if self.file_format == "parquet":
+                self._empty_frame.to_parquet(self._temp_path, index=False)
+            else:
+                self._empty_frame.to_csv(self._temp_path, index=False)
+        if os.path.exists(self._temp_path):
+            os.replace(self._temp_path, self.path)
+
+    def discard(self):
+        """
+        Drops whatever was written so far, leaving any previous output in place.
+        """
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+def iter_branch_inventory(data_path, input_format="csv", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yields Branch_Inventory in chunks of at most chunk_rows rows, typed with its schema.
+    """
+    path = table_path(data_path, "Branch_Inventory", input_format)
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield apply_schema(batch.to_pandas(), "Branch_Inventory")
+    else:
+        category_dtypes = {
+            column: "category" for column, dtype in INPUT_SCHEMAS["Branch_Inventory"].items() if dtype == "category"
+        }
+        with pd.read_csv(path, dtype=category_dtypes, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield apply_schema(chunk, "Branch_Inventory")
+
+
+def _load_resident_tables(data_path, input_format):
+    """
+    Loads the tables that stay in memory for the whole run: SKU_Master and Warehouse_Stock.
+    """
+    if input_format == "parquet":
+        warehouse_stock = apply_schema(pd.read_parquet(table_path(data_path, "Warehouse_Stock", "parquet")),
+                                       "Warehouse_Stock")
+        sku_master = apply_schema(pd.read_parquet(table_path(data_path, "SKU_Master", "parquet")), "SKU_Master")
+    else:
+        warehouse_stock = read_input_csv(table_path(data_path, "Warehouse_Stock", "csv"), "Warehouse_Stock")
+        sku_master = read_input_csv(table_path(data_path, "SKU_Master", "csv"), "SKU_Master")
+    return align_key_categories([warehouse_stock, sku_master], column='SKU')
+
+
+def run_replenishment_engine_streaming(
+    data_path="data",
+    output_path="outputs",
+    input_format="csv",
+    output_format="csv",
+    chunk_rows=DEFAULT_CHUNK_ROWS
+):
+    """
+    Runs the replenishment engine over a Branch_Inventory file that may not fit
+    in memory. Only SKU_Master, the warehouse stock balances and the running LPO
+    totals stay resident; branch inventory is read in chunks and the transfer,
+    LPO trigger and excess stock rows are appended to the outputs as they are found.
+
+    The branch inventory must be sorted by SKU (branches of a SKU may span chunk
+    boundaries). Results match run_replenishment_engine, with Transfer_Orders and
+    LPO_Trigger_Transfers written as separate files rather than sheets of an XLSX
+    workbook; see file_io.export_for_humans for that.
+
+    Args:
+        data_path (str): Directory holding the three input tables.
+        output_path (str): Directory to write the outputs to.
+        input_format (str): 'csv' or 'parquet'.
+        output_format (str): 'csv' or 'parquet'.
+        chunk_rows (int): Branch inventory rows to process at a time.
+
+    Returns:
+        dict: Number of rows written per output table.
+    """
+    for file_format in (input_format, output_format):
+        if file_format not in STREAMING_FORMATS:
+            raise ValueError(f"Streaming mode supports {', '.join(STREAMING_FORMATS)}, not '{file_format}'.")
+
+    warehouse_stock, sku_master = _load_resident_tables(data_path, input_format)
+    sku_dtype = sku_master['SKU'].dtype
+    # Duplicate SKUs in the warehouse file resolve to the last row, as in the in-memory engine
+    warehouse_balances = warehouse_stock.drop_duplicates(subset='SKU', keep='last').set_index('SKU')['Warehouse_Stock']
+    warehouse_balances = warehouse_balances.astype('int64')
+
+    os.makedirs(output_path, exist_ok=True)
+    appenders = {
+        table: _OutputAppender(table_path(output_path, table, output_format), output_format)
+        for table in ("Transfer_Orders", "LPO_Trigger_Transfers", "Excess_Stock")
+    }
+    lpo_needs_parts = []
+    last_sku_code = -1
+
+    try:
+        for chunk in iter_branch_inventory(data_path, input_format, chunk_rows):
+            chunk['SKU'] = chunk['SKU'].astype(sku_dtype)
+            sku_codes = chunk['SKU'].cat.codes.to_numpy()
+            known = sku_codes >= 0
+            sku_codes = sku_codes[known]
+            if len(sku_codes) and (sku_codes[0] < last_sku_code or np.any(np.diff(sku_codes) < 0)):
+                raise ValueError("Streaming mode needs Branch_Inventory sorted by SKU.")
+            if len(sku_codes):
+                last_sku_code = sku_codes[-1]
+
+            # SKUs missing from SKU_Master would be dropped by the merge anyway
+            merged_chunk = pd.merge(chunk[known], sku_master, on='SKU')
+            merged_chunk = pd.merge(merged_chunk, warehouse_stock, on='SKU')
+
+            _, transfer_orders_df, lpo_needs_df, excess_stock_df, lpo_trigger_transfers_df = compute_replenishment(
+                merged_chunk, warehouse_balances
+            )
+
+            # Carry what this chunk took from the warehouse over to the next chunk
+            balance_values = warehouse_balances.to_numpy().copy()
+            np.subtract.at(
+                balance_values,
+                warehouse_balances.index.get_indexer(transfer_orders_df['SKU']),
+                transfer_orders_df['Transfer_Qty'].to_numpy()
+            )
+            warehouse_balances = pd.Series(balance_values, index=warehouse_balances.index, name='Warehouse_Stock')
+
+            appenders["Transfer_Orders"].append(transfer_orders_df)
+            appenders["LPO_Trigger_Transfers"].append(lpo_trigger_transfers_df)
+            appenders["Excess_Stock"].append(excess_stock_df)
+            lpo_needs_parts.append(lpo_needs_df)
+    except BaseException:
+        for appender in appenders.values():
+            appender.discard()
+        raise
+    for appender in appenders.values():
+        appender.close()
+
+    # LPO totals are at most one row per SKU and vendor, so they are written once at the end
+    if lpo_needs_parts:
+        lpo_needs_df = pd.concat(lpo_needs_parts, ignore_index=True)
+        lpo_needs_df = lpo_needs_df.groupby(['SKU', 'Vendor'], observed=True)['Required_Qty'].sum().reset_index()
+    else:
+        lpo_needs_df = pd.DataFrame(columns=['SKU', 'Vendor', 'Required_Qty'])
+    lpo_needs_path = table_path(output_path, "LPO_Needs", output_format)
+    if output_format == "parquet":
+        write_atomically(lpo_needs_path, lambda path: lpo_needs_df.to_parquet(path, index=False))
+    else:
+        write_atomically(lpo_needs_path, lambda path: lpo_needs_df.to_csv(path, index=False))
+
+    rows_written = {table: appender.rows_written for table, appender in appenders.items()}
+    rows_written["LPO_Needs"] = len(lpo_needs_df)
+
+    print(f"Streaming replenishment run complete. Outputs saved to '{output_path}'.")
+    print(f"- Total LPOs created: {rows_written['LPO_Needs']}")
+    print(f"- Total excess stock instances identified: {rows_written['Excess_Stock']}")
+    return rows_written
@@ -0,0 +1,212 @@
+import pandas as pd
+import numpy as np
+from itertools import product
+from .core import EXCESS_DOS_THRESHOLD, merge_inputs
+from .file_io import load_input_tables
+from .inventory_store import InventoryStore
+from .sales_ledger import SalesLedger, apply_sales_history
+from .schema import apply_schema
+
+# Upper bound on the elements of one (scenarios x rows) array, which sets how
+# many scenarios are evaluated per batch and so bounds the sweep's memory
+SWEEP_BATCH_ELEMENTS = 16_000_000
+
+SUMMARY_COLUMNS = [
+    'DOS_Threshold', 'Min_Stock_Factor', 'Max_Stock_Factor', 'Reorder_Rows', 'Transfer_Orders',
+    'Transfer_Units', 'LPO_Units', 'Excess_Rows', 'Excess_Units'
+]
+
+
+def _scaled_stock_levels(stock, factors):
+    """
+    Returns a (factors x rows) array of the stock levels scaled by each factor,
+    rounded to whole units. A factor of 1 leaves the levels unchanged.
+    """
+    return np.rint(stock[np.newaxis, :] * np.asarray(factors, dtype='float64')[:, np.newaxis]).astype('int64')
+
+
+def _allocate_batch(branch_stock, min_stock, max_stock, stock_at_start, group_start):
+    """
+    Runs the reorder and warehouse allocation of the engine for a batch of
+    scenarios at once. Rows are sorted by SKU, and group_start holds, for every
+    row, the position of the first row of its SKU.
+
+    Returns:
+        tuple: (scenarios x rows) arrays of reorder quantities, units transferred
+               and LPO shortfalls.
+    """
+    shortfall = max_stock - branch_stock
+    reorder_qty = np.where((branch_stock < min_stock) & (shortfall > 0), shortfall, 0)
+
+    # Demand of the earlier rows of the same SKU: a running total along the rows,
+    # less the total before the SKU's first row. Rows with no reorder add 0.
+    running_demand = np.cumsum(reorder_qty, axis=1)
+    demand_before_row = running_demand - reorder_qty
+    demand_before_row -= demand_before_row[:, group_start]
+    stock_before = stock_at_start - np.minimum(demand_before_row, np.maximum(stock_at_start, 0))
+
+    fulfillable_qty = np.minimum(reorder_qty, stock_before)
+    transferred_qty = np.where(fulfillable_qty > 0, fulfillable_qty, 0)
+    lpo_shortfall = np.where(reorder_qty > 0, reorder_qty - fulfillable_qty, 0)
+    return reorder_qty, transferred_qty, lpo_shortfall
+
+
+def sweep_scenarios(merged_data, available_warehouse_stock, dos_thresholds=(EXCESS_DOS_THRESHOLD,),
+                    min_stock_factors=(1.0,), max_stock_factors=(1.0,)):
+    """
+    Evaluates every combination of the given parameters over the merged data in
+    broadcast NumPy passes, without building the per-row output tables. The
+    scenario with a DOS threshold of EXCESS_DOS_THRESHOLD and both factors at 1
+    gives the same totals as run_replenishment_engine.
+
+    The reorders and allocation depend only on the stock factors, and the
+    excess stock only on the DOS threshold, so each is evaluated once per value
+    and the results are combined into the full grid.
+
+    Args:
+        merged_data (pd.DataFrame): The merged engine input (see core.merge_inputs).
+        available_warehouse_stock (pd.Series): Warehouse stock indexed by SKU.
+        dos_thresholds (iterable): Days of supply a branch may hold before stock counts as excess.
+        min_stock_factors (iterable): Multipliers of every row's Min_Stock (the reorder point).
+        max_stock_factors (iterable): Multipliers of every row's Max_Stock (the order-up-to level).
+
+    Returns:
+        tuple: Two DataFrames with one row per scenario, in the same order:
+               - summary: the parameters, the number of reorders and transfer orders, and
+                 the units transferred, bought (LPO) and held in excess.
+               - lpo_units_by_vendor: the LPO units per vendor (one column per vendor).
+    """
+    dos_thresholds = [float(value) for value in dos_thresholds]
+    stock_factor_pairs = list(product(
+        [float(value) for value in min_stock_factors], [float(value) for value in max_stock_factors]
+    ))
+    num_rows = len(merged_data)
+
+    # --- Sort once by SKU (stable, as the engine allocates) ---
+    sku_codes, _ = pd.factorize(merged_data['SKU'])
+    order = np.argsort(sku_codes, kind='stable')
+    sorted_codes = sku_codes[order]
+    is_group_start = np.ones(num_rows, dtype=bool)
+    is_group_start[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    group_start = np.maximum.accumulate(np.where(is_group_start, np.arange(num_rows), 0))
+
+    branch_stock = merged_data['Branch_Stock'].to_numpy(dtype='int64')[order]
+    min_stock = merged_data['Min_Stock'].to_numpy(dtype='int64')[order]
+    max_stock = merged_data['Max_Stock'].to_numpy(dtype='int64')[order]
+    sku_position = available_warehouse_stock.index.get_indexer(merged_data['SKU'])[order]
+    stock_at_start = np.where(
+        sku_position >= 0, available_warehouse_stock.to_numpy(dtype='int64')[sku_position], 0
+    )
+    # The engine totals LPO needs per SKU and vendor, leaving out rows without a vendor
+    vendor_codes, vendors = pd.factorize(merged_data['Vendor'].to_numpy()[order], sort=True)
+    has_vendor = vendor_codes >= 0
+
+    # --- Reorders, allocation and LPOs per pair of stock factors, in batches ---
+    batch_size = max(1, SWEEP_BATCH_ELEMENTS // max(num_rows, 1))
+    allocation = []
+    lpo_by_vendor = []
+    for start in range(0, len(stock_factor_pairs), batch_size):
+        pairs = stock_factor_pairs[start:start + batch_size]
+        reorder_qty, transferred_qty, lpo_shortfall = _allocate_batch(
+            branch_stock,
+            _scaled_stock_levels(min_stock, [pair[0] for pair in pairs]),
+            _scaled_stock_levels(max_stock, [pair[1] for pair in pairs]),
+            stock_at_start,
+            group_start
+        )
+        allocation.append(np.column_stack([
+            (reorder_qty > 0).sum(axis=1), (transferred_qty > 0).sum(axis=1), transferred_qty.sum(axis=1)
+        ]))
+        # Sum the shortfalls of each (scenario, vendor) in one bincount
+        scenario_vendor = (np.arange(len(pairs))[:, np.newaxis] * len(vendors) + vendor_codes)[:, has_vendor]
+        lpo_by_vendor.append(np.bincount(
+            scenario_vendor.ravel(), weights=lpo_shortfall[:, has_vendor].ravel(), minlength=len(pairs) * len(vendors)
+        ).reshape(len(pairs), len(vendors)).astype('int64'))
+    allocation = np.vstack(allocation) if allocation else np.empty((0, 3), dtype='int64')
+    lpo_by_vendor = np.vstack(lpo_by_vendor) if lpo_by_vendor else np.empty((0, len(vendors)), dtype='int64')
+
+    # --- Excess stock per DOS threshold ---
+    if 'Avg_Daily_Sales' in merged_data.columns:
+        ads = merged_data['Avg_Daily_Sales'].to_numpy(dtype='float64')
+    else:
+        ads = merged_data['Sales_30D'].to_numpy(dtype='float64') / 30
+    stock = merged_data['Branch_Stock'].to_numpy(dtype='float64')
+    excess = []
+    for start in range(0, len(dos_thresholds), batch_size):
+        thresholds = np.asarray(dos_thresholds[start:start + batch_size])[:, np.newaxis]
+        excess_qty = np.maximum(stock - np.where(ads > 0, ads * thresholds, 0.0), 0.0)
+        excess.append(np.column_stack([(excess_qty > 0).sum(axis=1), excess_qty.sum(axis=1)]))
+    excess = np.vstack(excess) if excess else np.empty((0, 2))
+
+    # --- Combine into the full grid: every DOS threshold x every pair of factors ---
+    dos_index = np.repeat(np.arange(len(dos_thresholds)), len(stock_factor_pairs))
+    pair_index = np.tile(np.arange(len(stock_factor_pairs)), len(dos_thresholds))
+    lpo_units_by_vendor = pd.DataFrame(lpo_by_vendor[pair_index], columns=pd.Index(vendors, name='Vendor'))
+    summary = pd.DataFrame({
+        'DOS_Threshold': np.asarray(dos_thresholds)[dos_index],
+        'Min_Stock_Factor': [stock_factor_pairs[i][0] for i in pair_index],
+        'Max_Stock_Factor': [stock_factor_pairs[i][1] for i in pair_index],
+        'Reorder_Rows': allocation[pair_index, 0],
+        'Transfer_Orders': allocation[pair_index, 1],
+        'Transfer_Units': allocation[pair_index, 2],
+        'LPO_Units': lpo_units_by_vendor.sum(axis=1).to_numpy(),
+        'Excess_Rows': excess[dos_index, 0].astype('int64'),
+        'Excess_Units': excess[dos_index, 1].round(2),
+    }, columns=SUMMARY_COLUMNS)
+    return summary, lpo_units_by_vendor
+
+
+def run_parameter_sweep(
+    branch_inventory_df=None,
+    warehouse_stock_df=None,
+    sku_master_df=None,
+    data_path="data",
+    input_format="csv",
+    dos_thresholds=(EXCESS_DOS_THRESHOLD,),
+    min_stock_factors=(1.0,),
+    max_stock_factors=(1.0,),
+    sales_ledger_path=None,
+    forecast=False,
+    inventory_store_path=None
+):
+    """
+    Loads and merges the engine inputs, as run_replenishment_engine does, and
+    evaluates a grid of scenarios over them with sweep_scenarios.
+
+    Args:
+        sales_ledger_path (str, optional): Directory of a SalesLedger; as in
+                                           run_replenishment_engine, Min/Max and
+                                           the average daily sales of the rows it
+                                           tracks come from its daily sales.
+        forecast (bool): With sales_ledger_path, use forecast daily sales.
+        inventory_store_path (str, optional): Read the inputs from this InventoryStore
+                                              instead of data_path. All branch rows are
+                                              read, as the scenarios change which rows
+                                              need a reorder or hold excess stock.
+        The other arguments are those of run_replenishment_engine and sweep_scenarios.
+
+    Returns:
+        tuple: summary and lpo_units_by_vendor DataFrames (see sweep_scenarios),
+               or (None, None) if the input files could not be loaded.
+    """
+    if branch_inventory_df is not None and warehouse_stock_df is not None and sku_master_df is not None:
+        branch_inventory = apply_schema(branch_inventory_df, "Branch_Inventory")
+        warehouse_stock = apply_schema(warehouse_stock_df, "Warehouse_Stock")
+        sku_master = apply_schema(sku_master_df, "SKU_Master")
+    elif inventory_store_path is not None:
+        with InventoryStore(inventory_store_path) as store:
+            branch_inventory, warehouse_stock, sku_master = store.load_input_tables()
+    else:
+        try:
+            branch_inventory, warehouse_stock, sku_master = load_input_tables(data_path, input_format)
+        except FileNotFoundError as e:
+            print(f"Error loading data: {e}. Make sure the {input_format} files are in the '{data_path}' directory.")
+            return None, None
+
+    if sales_ledger_path is not None:
+        branch_inventory = apply_sales_history(
+            branch_inventory, sku_master, SalesLedger.open(sales_ledger_path), forecast=forecast
+        )
+    merged_data, available_warehouse_stock = merge_inputs(branch_inventory, warehouse_stock, sku_master)
+    return sweep_scenarios(merged_data, available_warehouse_stock, dos_thresholds, min_stock_factors,
+                           max_stock_factors)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import time
+
+# Run workspaces are removed once older than this ...
+WORKSPACE_MAX_AGE_HOURS = 24
+# ... and the oldest are removed while all of them together exceed this
+WORKSPACE_MAX_TOTAL_MB = 1024
+# Workspaces written to more recently than this are never removed, as their run may still be going
+WORKSPACE_MIN_AGE_SECONDS = 15 * 60
+WORKSPACE_PREFIX = "run_"
+
+
+def run_workspace_path(root, run_id):
+    """
+    Returns the workspace directory of one run, e.g. outputs/run_3f2a9c1b7d4e.
+    """
+    return os.path.join(root, WORKSPACE_PREFIX + run_id)
+
+
+def create_run_workspace(root, run_id):
+    """
+    Creates the workspace directory of one run and returns its path.
+    Raises FileExistsError if a run with that ID already has a workspace.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = run_workspace_path(root, run_id)
+    os.mkdir(path)
+    return path
+
+
+def _directory_size(path):
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass  # Removed while we were walking
+    return size
+
+
+def list_run_workspaces(root):
+    """
+    Returns the run workspaces under root as (path, last modified time, size in
+    bytes) tuples, oldest first.
+    """
+    if not os.path.isdir(root):
+        return []
+    workspaces = []
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.name.startswith(WORKSPACE_PREFIX):
+            workspaces.append((entry.path, entry.stat().st_mtime, _directory_size(entry.path)))
+    return sorted(workspaces, key=lambda workspace: workspace[1])
+
+
+def cleanup_run_workspaces(root, max_age_hours=WORKSPACE_MAX_AGE_HOURS, max_total_mb=WORKSPACE_MAX_TOTAL_MB,
+                           keep=()):
+    """
+    Removes expired run workspaces under root: those older than max_age_hours,
+    then the oldest remaining ones while their total size exceeds max_total_mb.
+    Workspaces in keep, or modified in the last WORKSPACE_MIN_AGE_SECONDS, are
+    left alone. Only directories named like run workspaces are touched.
+
+    Args:
+        root (str): The directory holding the run workspaces.
+        max_age_hours (float): Maximum age of a workspace, by its last modification.
+        max_total_mb (float): Maximum total size of all the workspaces.
+        keep (iterable): Workspace paths never to remove, e.g. the current run's.
+
+    Returns:
+        list: The paths of the removed workspaces.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    now = time.time()
+    removable = []
+    total_bytes = 0
+    for path, modified_at, size in list_run_workspaces(root):
+        total_bytes += size
+        if os.path.abspath(path) not in keep and now - modified_at >= WORKSPACE_MIN_AGE_SECONDS:
+            removable.append((path, modified_at, size))
+
+    removed = []
+    for path, modified_at, size in removable:
+        expired = now - modified_at > max_age_hours * 3600
+        if not expired and total_bytes <= max_total_mb * 1024 * 1024:
+            break  # Oldest first, so the rest are newer and within the limits
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes -= size
+        removed.append(path)
+    return removed
@@ -1,5 +1,4 @@
 import streamlit as st
-import os
 from .utils import get_logo_base64, load_file
 
 def set_page_config():
@@ -99,7 +98,7 @@ def render_results_section():
             if not st.session_state.transfer_orders.empty:
                 st.download_button(
                     label="Transfer Orders",
-                    data=open(os.path.join("outputs", "Transfer_Orders.xlsx"), "rb").read(),
+                    data=st.session_state.artifacts["Transfer_Orders.xlsx"].getvalue(),
                     file_name="Transfer_Orders.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     key="download_transfer_orders"
@@ -111,7 +110,7 @@ def render_results_section():
             if not st.session_state.lpo_needs.empty:
                 st.download_button(
                     label="LPO Needs",
-                    data=st.session_state.lpo_needs.to_csv(index=False).encode('utf-8'),
+                    data=st.session_state.artifacts["LPO_Needs.csv"].getvalue(),
                     file_name="LPO_Needs.csv",
                     mime="text/csv",
                     key="download_lpo_needs"
@@ -123,10 +122,30 @@ def render_results_section():
             if not st.session_state.excess_stock.empty:
                 st.download_button(
                     label="Excess Stock",
-                    data=st.session_state.excess_stock.to_csv(index=False).encode('utf-8'),
+                    data=st.session_state.artifacts["Excess_Stock.csv"].getvalue(),
                     file_name="Excess_Stock.csv",
                     mime="text/csv",
                     key="download_excess_stock"
                 )
             else:
                 st.markdown("<p style='text-align: center; color: #666666;'>No excess stock identified.</p>", unsafe_allow_html=True)
+
+def render_run_report(run_report):
+    """
+    Renders the per-stage timings of the last engine run in a collapsed section.
+    """
+    if run_report is None:
+        return
+    with st.expander(f"Run details ({run_report.total_seconds:.2f}s)"):
+        st.dataframe(
+            run_report.to_frame().rename(columns={
+                "stage": "Stage",
+                "seconds": "Seconds",
+                "rows_in": "Rows In",
+                "rows_out": "Rows Out",
+                "memory_delta_mb": "Memory Change (MB)",
+                "rss_mb": "Memory After (MB)",
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
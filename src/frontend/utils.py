@@ -1,16 +1,93 @@
 import streamlit as st
 import pandas as pd
 import base64
+import os
+import tempfile
+from src.engine.cache import ResultCache, bytes_digest
+from src.engine.email_outbox import EmailOutbox
+from src.engine.email_sender import smtp_settings
+from src.engine.jobs import DEFAULT_MAX_CONCURRENT_JOBS, DEFAULT_MAX_QUEUED_JOBS, JobManager
+from src.engine.schema import apply_schema, read_input_csv, table_for_filename
+
+# Directory of the engine result cache; engine jobs run in worker processes,
+# so results are shared between them through this disk tier
+RESULT_CACHE_DIR_ENV = "REPLENISHMENT_CACHE_DIR"
+DEFAULT_RESULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "replenishment_result_cache")
+UPLOAD_CACHE_ENTRIES = 6
+# Engine runs executing at once across all sessions, and runs allowed to wait
+MAX_CONCURRENT_JOBS_ENV = "REPLENISHMENT_MAX_CONCURRENT_JOBS"
+MAX_QUEUED_JOBS_ENV = "REPLENISHMENT_MAX_QUEUED_JOBS"
+# Directory where unsent emails are kept, so they survive an app restart
+OUTBOX_DIR_ENV = "REPLENISHMENT_OUTBOX_DIR"
+DEFAULT_OUTBOX_DIR = os.path.join(tempfile.gettempdir(), "replenishment_outbox")
+
+
+@st.cache_resource
+def get_result_cache():
+    """
+    Returns the engine result cache shared by all sessions of the app.
+    """
+    return ResultCache(disk_path=os.environ.get(RESULT_CACHE_DIR_ENV) or DEFAULT_RESULT_CACHE_DIR)
+
+
+@st.cache_resource
+def get_job_manager():
+    """
+    Returns the job manager that runs the engine for all sessions of the app.
+    """
+    return JobManager(
+        max_concurrent_jobs=int(os.environ.get(MAX_CONCURRENT_JOBS_ENV, DEFAULT_MAX_CONCURRENT_JOBS)),
+        max_queued_jobs=int(os.environ.get(MAX_QUEUED_JOBS_ENV, DEFAULT_MAX_QUEUED_JOBS))
+    )
+
+
+def get_email_outbox():
+    """
+    Returns the email outbox shared by all sessions of the app, or None if the
+    SMTP settings are not configured. The settings are checked on every call,
+    so credentials set after a failed check are picked up without a restart.
+    """
+    smtp_host, smtp_port, username, password = smtp_settings()
+    if not all([smtp_host, username, password]):
+        print("Email credentials (EMAIL_USERNAME, EMAIL_PASSWORD, EMAIL_HOST) not set as environment variables.")
+        return None
+    return _get_email_outbox(os.environ.get(OUTBOX_DIR_ENV) or DEFAULT_OUTBOX_DIR, smtp_host, smtp_port,
+                             username, password)
+
+
+@st.cache_resource
+def _get_email_outbox(outbox_path, _smtp_host, _smtp_port, _username, _password):
+    # Cached per directory only (underscored arguments are not hashed), so one
+    # outbox thread at most sends the messages kept there
+    return EmailOutbox(outbox_path, _smtp_host, _smtp_port, _username, _password)
 
 
-def load_file(f):
+@st.cache_resource
+def _get_upload_cache():
+    return ResultCache(max_entries=UPLOAD_CACHE_ENTRIES)
+
+
+def load_file(f, table=None):
     """
     Loads a file (CSV or Excel) into a pandas DataFrame.
+    Files recognised as one of the engine's input tables (from `table`, or else
+    the file name) are loaded with that table's declared schema.
+    Parsed files are memoized on their content, so re-uploading an unchanged
+    file returns the earlier DataFrame, which must not be modified.
     """
+    table = table or table_for_filename(f.name)
+    key = f"{bytes_digest(f.getvalue())}:{f.name}:{table}"
+    return _get_upload_cache().get_or_compute(key, lambda: _parse_file(f, table))
+
+
+def _parse_file(f, table):
     if f.name.endswith(".csv"):
+        if table is not None:
+            return read_input_csv(f, table)
         return pd.read_csv(f)
     else:
-        return pd.read_excel(f)
+        df = pd.read_excel(f)
+        return apply_schema(df, table) if table is not None else df
 
 
 def get_logo_base64(logo_path="logo.svg"):
@@ -1,11 +1,10 @@
 import streamlit as st
 import pandas as pd
-import time # Import time module
-import os # Import the os module
-from src.engine.core import run_replenishment_engine, clear_output_directory
-from src.frontend.utils import apply_custom_css
-from src.frontend.ui_components import set_page_config, render_header, render_file_uploader, render_results_section
-from src.engine.email_sender import send_results_email
+import time
+from src.engine.core import lookup_cached_run
+from src.engine.jobs import JobQueueFullError
+from src.frontend.utils import apply_custom_css, get_email_outbox, get_job_manager, get_result_cache
+from src.frontend.ui_components import set_page_config, render_header, render_file_uploader, render_results_section, render_run_report
 
 # --- Define Application States ---
 UPLOAD_STATE = "upload"
@@ -15,6 +14,9 @@ PROCESSING_STATE = "processing"
 RESULTS_STATE = "results"
 WELCOME_STATE = "welcome"
 
+# Seconds between polls of a running engine job
+JOB_POLL_SECONDS = 0.5
+
 # --- Page Configuration ---
 set_page_config()
 
@@ -27,6 +29,8 @@ if 'transfer_orders' not in st.session_state:
     st.session_state.transfer_orders = pd.DataFrame()
     st.session_state.lpo_needs = pd.DataFrame()
     st.session_state.excess_stock = pd.DataFrame()
+    st.session_state.run_report = None
+    st.session_state.artifacts = {}
 
 # Initialize app state
 if 'app_state' not in st.session_state:
@@ -40,6 +44,10 @@ if 'warehouse_df' not in st.session_state:
 if 'sku_master_df' not in st.session_state:
     st.session_state.sku_master_df = None
 
+# Initialize the ID of this session's engine job
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+
 # Initialize upload attempted flag
 if 'upload_attempted' not in st.session_state:
     st.session_state.upload_attempted = False
@@ -103,9 +111,6 @@ elif st.session_state.app_state == FILE_UPLOAD_CONFIRMATION_STATE:
     # We just need to ensure the dataframes are still in session state for the next step
     # No need to call render_file_uploader again, as it would re-render the uploader widget
 
-    # Brief pause to allow user to see the uploaded files message
-    time.sleep(5) # Adjust delay as needed
-
     # Automatically transition to the next state
     st.session_state.app_state = READY_TO_PROCESS_STATE
     st.rerun()
@@ -128,41 +133,91 @@ elif st.session_state.app_state == READY_TO_PROCESS_STATE:
 elif st.session_state.app_state == PROCESSING_STATE:
     render_header()
 
-    PROCESSING_MESSAGES = [
-        "Analyzing inventory data...",
-        "Identifying stock requirements...",
-        "Allocating stock from warehouse...",
-        "Generating Local Purchase Orders (LPOs)...",
-        "Detecting excess inventory...",
-        "Finalizing replenishment plan..."
-    ]
-
-    # Use placeholders
-    progress_text = st.empty()
-    progress_bar = st.progress(0)
-
-    # Simulate step-by-step updates
-    for step, message in enumerate(PROCESSING_MESSAGES):
-        progress_text.markdown(f"<div class='processing-step'>{message}</div>", unsafe_allow_html=True)
-        progress_bar.progress((step + 1) / len(PROCESSING_MESSAGES))
-        time.sleep(0.8)  # Simulated delay
-
-    # Run the replenishment engine (actual heavy computation)
-    with st.spinner("Running core replenishment engine..."):
+    # Shown as each stage of the engine completes
+    PROCESSING_MESSAGES = {
+        "load": "Inventory data loaded",
+        "cache_lookup": "Checked for an earlier run on the same data",
+        "merge": "Inventory data analyzed",
+        "reorder": "Stock requirements identified",
+        "allocate": "Stock allocated from warehouse and Local Purchase Orders (LPOs) generated",
+        "calculate": "Stock requirements, warehouse allocation and LPOs calculated",
+        "excess": "Excess inventory detected",
+        "write": "Replenishment plan finalized"
+    }
+
+    # The engine runs as a background job, so this session keeps rerendering
+    # while it runs and other sessions' runs do not block it
+    job_manager = get_job_manager()
+    cached_run = None
+    if st.session_state.job_id is None:
+        # Re-running on unchanged uploads is served from this process's result
+        # cache, without a job (workers only share the cache's disk tier)
+        cached_run = lookup_cached_run(
+            get_result_cache(),
+            st.session_state.branch_df,
+            st.session_state.warehouse_df,
+            st.session_state.sku_master_df,
+            return_artifacts=True
+        )
+    if st.session_state.job_id is None and cached_run is None:
         try:
-            # Clear previous output files
-            clear_output_directory("outputs")
-
-            merged_data, transfer_orders, lpo_needs, excess_stock = run_replenishment_engine(
+            # The output files are built once in memory and reused by the
+            # download buttons and the email, so nothing is written to disk.
+            st.session_state.job_id = job_manager.submit(
                 branch_inventory_df=st.session_state.branch_df,
                 warehouse_stock_df=st.session_state.warehouse_df,
                 sku_master_df=st.session_state.sku_master_df,
-                output_path="outputs"
+                output_path=None,
+                return_report=True,
+                return_artifacts=True,
+                cache=get_result_cache()
             )
+        except JobQueueFullError as e:
+            st.error(str(e))
+            if st.button("Try Again", key="retry_job_button"):
+                st.rerun()
+            st.stop()
+
+    job = job_manager.status(st.session_state.job_id) if cached_run is None else None
+
+    if job is not None and not job.finished:
+        # Use placeholders
+        progress_text = st.empty()
+        progress_bar = st.progress(job.progress)
+        if job.stage is not None:
+            progress_text.markdown(
+                f"<div class='processing-step'>{PROCESSING_MESSAGES.get(job.stage, job.stage)}</div>",
+                unsafe_allow_html=True
+            )
+        else:
+            progress_text.markdown("<div class='processing-step'>Waiting for a free engine worker...</div>",
+                                   unsafe_allow_html=True)
+
+        if st.button("Cancel", key="cancel_job_button"):
+            job_manager.cancel(st.session_state.job_id)
+            st.session_state.job_id = None
+            st.session_state.app_state = READY_TO_PROCESS_STATE
+            st.rerun()
+
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+    else:
+        job_id = st.session_state.job_id
+        st.session_state.job_id = None
+        try:
+            if cached_run is not None:
+                _, transfer_orders, lpo_needs, excess_stock, run_report, artifacts = cached_run
+            elif job is None:
+                raise RuntimeError("The engine run is no longer available. Please run it again.")
+            else:
+                _, transfer_orders, lpo_needs, excess_stock, run_report, artifacts = job_manager.result(job_id)
 
             st.session_state.transfer_orders = transfer_orders
             st.session_state.lpo_needs = lpo_needs
             st.session_state.excess_stock = excess_stock
+            st.session_state.run_report = run_report
+            st.session_state.artifacts = artifacts
 
             st.session_state.app_state = RESULTS_STATE
             st.rerun()
@@ -176,6 +231,7 @@ elif st.session_state.app_state == PROCESSING_STATE:
 elif st.session_state.app_state == RESULTS_STATE:
     render_header() # Keep header visible in results
     render_results_section()
+    render_run_report(st.session_state.run_report)
 
     st.markdown("<br><br>", unsafe_allow_html=True) # Adds line breaks for spacing
 
@@ -183,16 +239,8 @@ elif st.session_state.app_state == RESULTS_STATE:
 
     if st.button("Send Files", key="send_files_button"):
         # No need to check if recipient_email is empty as it's hardcoded
-            output_path = "outputs"
-            attachment_paths = [
-                os.path.join(output_path, "Transfer_Orders.xlsx"),
-                os.path.join(output_path, "LPO_Needs.csv"),
-                os.path.join(output_path, "Excess_Stock.csv")
-            ]
-
-            # Ensure the output directory exists before trying to send files
-            if not os.path.exists(output_path):
-                st.error(f"Output directory '{output_path}' not found. Please run the engine first.")
+            if not st.session_state.artifacts:
+                st.error("No results to send. Please run the engine first.")
             else:
                 try:
                     # Use default subject and body, or fetch from a config if available
@@ -206,11 +254,19 @@ Should you have any questions or require further analysis, please do not hesitat
 Best regards,
 
 The Replenishment Team"""
-                    success, message = send_results_email(recipient_email, email_subject, email_body, attachment_paths)
-                    if success:
-                        st.markdown(f"<p style='background-color: transparent; color: black; text-align: center;'>{message}</p>", unsafe_allow_html=True)
+                    # Sending happens in the background outbox, with retries, so the page does not wait on SMTP
+                    outbox = get_email_outbox()
+                    if outbox is None:
+                        st.warning("Email credentials not configured.")
                     else:
-                        st.warning(message)
+                        # Zipped, and split over several emails if too large for one
+                        message_ids = outbox.enqueue(
+                            recipient_email, email_subject, email_body, attachments=st.session_state.artifacts,
+                            compress=True
+                        )
+                        parts_text = f" in {len(message_ids)} parts" if len(message_ids) > 1 else ""
+                        message = f"Email queued for sending to {recipient_email}{parts_text}."
+                        st.markdown(f"<p style='background-color: transparent; color: black; text-align: center;'>{message}</p>", unsafe_allow_html=True)
                 except Exception as e:
                     st.warning(f"Issue with an email: {e}")
 
@@ -226,4 +282,6 @@ The Replenishment Team"""
         st.session_state.transfer_orders = pd.DataFrame()
         st.session_state.lpo_needs = pd.DataFrame()
         st.session_state.excess_stock = pd.DataFrame()
+        st.session_state.run_report = None
+        st.session_state.artifacts = {}
         st.rerun()
\ No newline at end of file
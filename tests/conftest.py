@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_inputs(num_skus=50, num_branches=5, seed=0):
+    """
+    Builds small random Branch_Inventory, Warehouse_Stock and SKU_Master tables
+    in the engine's input layout.
+    """
+    rng = np.random.default_rng(seed)
+    skus = [f"SKU{number:04d}" for number in range(num_skus)]
+    branches = [f"BR{number:03d}" for number in range(num_branches)]
+    min_stock = rng.integers(5, 50, num_skus * num_branches)
+    branch_inventory = pd.DataFrame({
+        "SKU": np.repeat(skus, num_branches),
+        "Branch": np.tile(branches, num_skus),
+        "Branch_Stock": rng.integers(0, 120, num_skus * num_branches),
+        "Min_Stock": min_stock,
+        "Max_Stock": min_stock * 3,
+        "Sales_30D": rng.integers(0, 90, num_skus * num_branches),
+    })
+    warehouse_stock = pd.DataFrame({"SKU": skus, "Warehouse_Stock": rng.integers(0, 200, num_skus)})
+    sku_master = pd.DataFrame({
+        "SKU": skus,
+        "Product_Name": [f"Product {sku}" for sku in skus],
+        "Category": rng.choice(["Analgesic", "Antibiotic", "Vitamin"], num_skus),
+        "Vendor": rng.choice(["VendorA", "VendorB", "VendorC"], num_skus),
+        "Lead_Time_Days": rng.integers(2, 14, num_skus),
+    })
+    return branch_inventory, warehouse_stock, sku_master
+
+
+@pytest.fixture
+def engine_inputs():
+    return make_inputs()
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import pandas as pd
+from engine.cache import ResultCache, result_cache_key
+
+NUM_PROCESSES = 8
+ENTRIES_PER_PROCESS = 40
+MAX_DISK_ENTRIES = 4
+
+
+def _fill_shared_cache(disk_path, worker):
+    # Each process has its own cache object on the shared directory, as job workers do
+    cache = ResultCache(max_entries=1, disk_path=disk_path, max_disk_entries=MAX_DISK_ENTRIES)
+    for entry in range(ENTRIES_PER_PROCESS):
+        key = f"{worker}-{entry}"
+        cache.put(key, bytes(64 * 1024))
+        cache.get(f"{(worker + 1) % NUM_PROCESSES}-{entry}")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    ResultCache(disk_path=str(tmp_path)).put("key", {"value": 1})
+    cache = ResultCache(disk_path=str(tmp_path))
+    assert cache.get("key") == {"value": 1}
+
+
+def test_unreadable_disk_entry_is_a_miss(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path))
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+    assert cache.get("broken", "missing") == "missing"
+    assert not (tmp_path / "broken.pkl").exists()
+
+
+def test_processes_sharing_the_disk_tier(tmp_path):
+    disk_path = str(tmp_path)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_fill_shared_cache, args=(disk_path, worker)) for worker in range(NUM_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0] * NUM_PROCESSES
+    entries = [name for name in os.listdir(disk_path) if name.endswith(".pkl")]
+    assert len(entries) <= MAX_DISK_ENTRIES + NUM_PROCESSES
+
+
+def test_cache_key_depends_on_content_and_params():
+    df = pd.DataFrame({"SKU": ["A", "B"], "Qty": [1, 2]})
+    key = result_cache_key([df], {"lean": False})
+    assert result_cache_key([df.copy()], {"lean": False}) == key
+    assert result_cache_key([df.assign(Qty=[1, 3])], {"lean": False}) != key
+    assert result_cache_key([df], {"lean": True}) != key
@@ -0,0 +1,161 @@
+import json
+import smtplib
+import threading
+from email.mime.text import MIMEText
+import pytest
+from engine.email_outbox import MESSAGE_FAILED, MESSAGE_PENDING, MESSAGE_SENT, EmailOutbox
+
+
+class _FakeSMTPServer:
+    """
+    Stands in for an SMTP server: records every connection and delivered
+    message, and fails the next sends with the queued errors.
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.delivered = []
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def factory(self, host, port, timeout=None):
+        connection = _FakeSMTPConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+class _FakeSMTPConnection:
+
+    def __init__(self, server):
+        self.server = server
+        self.logged_in = False
+        self.closed = False
+
+    def starttls(self):
+        raise AssertionError("starttls is not expected with use_starttls=False")
+
+    def login(self, username, password):
+        self.logged_in = True
+
+    def sendmail(self, sender, recipients, raw_message):
+        with self.server.lock:
+            if self.server.errors:
+                raise self.server.errors.pop(0)
+            self.server.delivered.append((sender, list(recipients), raw_message))
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def _message(subject, recipient="manager@example.com"):
+    msg = MIMEText("Results attached.")
+    msg["From"] = "engine@example.com"
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    return msg
+
+
+def _outbox(outbox_path, server, **kwargs):
+    return EmailOutbox(str(outbox_path), "smtp.example.com", sender_email="engine@example.com",
+                       use_starttls=False, smtp_factory=server.factory, **kwargs)
+
+
+@pytest.fixture
+def server():
+    return _FakeSMTPServer()
+
+
+def test_messages_share_one_connection(tmp_path, server):
+    outbox = _outbox(tmp_path, server)
+    message_ids = [outbox.enqueue_message(_message(f"Results {number}")) for number in range(5)]
+    assert outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    assert [outbox.status(message_id) for message_id in message_ids] == [MESSAGE_SENT] * 5
+    assert outbox.connections_opened == 1
+    assert len(server.delivered) == 5
+    assert not server.connections[0].logged_in  # No username, so no login
+    assert list((tmp_path / "pending").iterdir()) == []
+
+
+def test_temporary_failures_are_retried_with_backoff(tmp_path, server):
+    server.errors = [smtplib.SMTPResponseException(421, b"Try again later")] * 2
+    outbox = _outbox(tmp_path, server, backoff_seconds=0.05)
+    assert outbox._backoff(1) == 0.05 and outbox._backoff(3) == 0.2
+
+    message_id = outbox.enqueue_message(_message("Results"))
+    assert outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    assert outbox.status(message_id) == MESSAGE_SENT
+    assert len(server.delivered) == 1
+    assert server.errors == []
+
+
+def test_backoff_is_capped(tmp_path, server):
+    outbox = _outbox(tmp_path, server, backoff_seconds=5, max_backoff_seconds=60)
+    outbox.close(timeout=10)
+    assert [outbox._backoff(attempts) for attempts in (1, 2, 4, 5, 10)] == [5, 10, 40, 60, 60]
+
+
+def test_dropped_connection_is_reopened(tmp_path, server):
+    server.errors = [smtplib.SMTPServerDisconnected("Connection unexpectedly closed")]
+    outbox = _outbox(tmp_path, server)
+    message_id = outbox.enqueue_message(_message("Results"))
+    assert outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    assert outbox.status(message_id) == MESSAGE_SENT
+    assert outbox.connections_opened == 2
+
+
+def test_permanent_failure_moves_the_message_to_failed(tmp_path, server):
+    server.errors = [smtplib.SMTPResponseException(550, b"Mailbox unavailable")]
+    outbox = _outbox(tmp_path, server, backoff_seconds=0.05)
+    message_id = outbox.enqueue_message(_message("Results"))
+    assert outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    assert outbox.status(message_id) == MESSAGE_FAILED
+    assert server.delivered == []
+    assert sorted(path.name for path in (tmp_path / "failed").iterdir()) == [f"{message_id}.eml",
+                                                                               f"{message_id}.json"]
+    assert list((tmp_path / "pending").iterdir()) == []
+
+
+def test_retry_limit_fails_the_message(tmp_path, server):
+    server.errors = [smtplib.SMTPResponseException(451, b"Local error")] * 3
+    outbox = _outbox(tmp_path, server, max_attempts=3, backoff_seconds=0.01)
+    message_id = outbox.enqueue_message(_message("Results"))
+    assert outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+    assert outbox.status(message_id) == MESSAGE_FAILED
+
+
+def test_unsent_messages_are_sent_after_a_restart(tmp_path, server):
+    # A long backoff keeps the message pending when the first outbox closes
+    server.errors = [smtplib.SMTPResponseException(421, b"Try again later")]
+    outbox = _outbox(tmp_path, server, backoff_seconds=3600)
+    message_id = outbox.enqueue_message(_message("Results"), ["manager@example.com", "buyer@example.com"])
+    assert not outbox.flush(timeout=0.5)
+    outbox.close(timeout=10)
+    assert outbox.status(message_id) == MESSAGE_PENDING
+    assert server.delivered == []
+
+    # Clear the persisted retry time so the restarted outbox sends it at once
+    state_file = tmp_path / "pending" / f"{message_id}.json"
+    state = json.loads(state_file.read_text())
+    assert state["attempts"] == 1 and "421" in state["last_error"]
+    state_file.write_text(json.dumps(dict(state, next_attempt_at=0)))
+    restarted = _outbox(tmp_path, server)
+    assert restarted.flush(timeout=10)
+    restarted.close(timeout=10)
+
+    assert restarted.status(message_id) == MESSAGE_SENT
+    sender, recipients, raw_message = server.delivered[0]
+    assert recipients == ["manager@example.com", "buyer@example.com"]
+    assert b"Subject: Results" in raw_message
+    assert list((tmp_path / "pending").iterdir()) == []
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from conftest import make_inputs
+from engine.forecasting import (
+    FORECAST_MODELS, MIN_HISTORY_DAYS, MOVING_AVERAGE_DAYS, _model_weights, choose_models, forecast_daily_sales
+)
+from engine.sales_ledger import SalesLedger, apply_sales_history
+
+
+def _forecast(model, series, step=1):
+    series = np.asarray(series, dtype=float)
+    return _model_weights(model, len(series), step) @ series
+
+
+def _weekly_pattern(num_days):
+    # Each weekday has its own level, plus one unit more every week
+    days = np.arange(num_days)
+    return (days % 7) * 10 + days // 7
+
+
+def test_moving_average_uses_the_last_30_days():
+    series = np.arange(40)
+    assert _forecast("moving_average", series) == pytest.approx(series[-MOVING_AVERAGE_DAYS:].mean())
+    assert _forecast("moving_average", [2, 4, 9]) == pytest.approx(5)
+
+
+def test_ses_weights_match_the_smoothing_recursion():
+    # Level 4, then 0.5 * 8 + 0.5 * 4 = 6, then 0.5 * 2 + 0.5 * 6 = 4; flat after that
+    assert _forecast("ses_0.5", [4, 8, 2]) == pytest.approx(4)
+    assert _forecast("ses_0.5", [4, 8, 2], step=5) == pytest.approx(4)
+
+    series = np.random.default_rng(0).integers(0, 30, 60)
+    level = series[0]
+    for value in series[1:]:
+        level = 0.3 * value + 0.7 * level
+    assert _forecast("ses_0.3", series) == pytest.approx(level)
+
+
+def test_trend_extends_the_least_squares_line():
+    # Mean 2.5 at offset 0, slope 0.8; one day ahead is offset 2.5
+    assert _forecast("trend", [1, 3, 2, 4]) == pytest.approx(4.5)
+    line = 2 + 3 * np.arange(60)
+    assert _forecast("trend", line, step=5) == pytest.approx(2 + 3 * 64)
+
+
+def test_seasonal_naive_averages_the_same_weekday():
+    # Day 21 is the weekday of days 14, 7 and 0, day 23 that of days 16, 9 and 2
+    assert _forecast("seasonal_naive", _weekly_pattern(21)) == pytest.approx(np.mean([2, 1, 0]))
+    assert _forecast("seasonal_naive", _weekly_pattern(21), step=3) == pytest.approx(np.mean([22, 21, 20]))
+    # Only the last four weeks count: days 28, 21, 14 and 7
+    assert _forecast("seasonal_naive", _weekly_pattern(35)) == pytest.approx(np.mean([4, 3, 2, 1]))
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(ValueError):
+        _model_weights("arima", 30, 1)
+
+
+@pytest.mark.parametrize("model", FORECAST_MODELS)
+def test_constant_series_forecasts_the_constant(model):
+    assert _forecast(model, np.full(91, 7), step=9) == pytest.approx(7)
+
+
+def test_forecast_of_a_constant_history():
+    history = np.full((91, 3), 7, dtype=np.int32)
+    ads, _ = forecast_daily_sales(history, np.array([1, 7, 40]))
+    np.testing.assert_allclose(ads, 7, rtol=1e-5)
+
+
+def test_model_with_the_lowest_holdout_error_is_chosen():
+    rng = np.random.default_rng(3)
+    history = np.column_stack([
+        _weekly_pattern(91),
+        5 + 2 * np.arange(91),
+        rng.poisson(6, (91, 20)),
+    ]).astype(np.int32)
+    chosen = choose_models(history, holdout_days=14)
+    assert FORECAST_MODELS[chosen[0]] == "seasonal_naive"
+    assert FORECAST_MODELS[chosen[1]] == "trend"
+
+    # Every series' choice has the smallest mean absolute error over the holdout
+    fit, holdout = history[:-14].astype(float), history[-14:].astype(float)
+    errors = np.array([
+        [np.abs(np.maximum([_model_weights(model, len(fit), step) @ fit[:, series] for step in range(1, 15)], 0)
+                - holdout[:, series]).mean() for series in range(history.shape[1])]
+        for model in FORECAST_MODELS
+    ])
+    np.testing.assert_allclose(errors[chosen, np.arange(history.shape[1])], errors.min(axis=0), rtol=1e-4)
+
+
+def test_forecast_averages_the_chosen_model_over_the_horizon():
+    history = (5 + 2 * np.arange(91))[:, np.newaxis].astype(np.int32)
+    ads, chosen = forecast_daily_sales(history, np.array([4]))
+    assert FORECAST_MODELS[chosen[0]] == "trend"
+    # The line continues at 5 + 2 * 91 on the next day; the mean of 4 days adds 3
+    assert ads[0] == pytest.approx(5 + 2 * 91 + 3, rel=1e-5)
+
+
+def test_young_history_falls_back_to_the_moving_average():
+    history = np.random.default_rng(1).integers(0, 20, (MIN_HISTORY_DAYS - 1, 5))
+    ads, chosen = forecast_daily_sales(history, np.full(5, 7))
+    np.testing.assert_allclose(ads, history[-MOVING_AVERAGE_DAYS:].mean(axis=0))
+    assert (chosen == FORECAST_MODELS.index("moving_average")).all()
+
+    ads, _ = forecast_daily_sales(history[:10], np.full(5, 7))
+    np.testing.assert_allclose(ads, history[:10].mean(axis=0))
+    ads, _ = forecast_daily_sales(history[:0], np.full(5, 7))
+    np.testing.assert_array_equal(ads, np.zeros(5))
+
+
+def test_young_ledger_forecast_uses_the_moving_average(tmp_path):
+    branch_inventory, _, sku_master = make_inputs(num_skus=5, num_branches=2)
+    ledger = SalesLedger.create(str(tmp_path), branch_inventory)
+    days = np.random.default_rng(2).integers(0, 20, (20, len(branch_inventory)))
+    for day in days:
+        ledger.append_day(day)
+
+    forecast = apply_sales_history(branch_inventory, sku_master, ledger, forecast=True)
+    rolling = apply_sales_history(branch_inventory, sku_master, ledger)
+    np.testing.assert_allclose(forecast["Avg_Daily_Sales"], days.mean(axis=0))
+    np.testing.assert_array_equal(forecast["Min_Stock"], rolling["Min_Stock"])
+    np.testing.assert_array_equal(forecast["Max_Stock"], rolling["Max_Stock"])
@@ -0,0 +1,69 @@
+import pandas as pd
+from conftest import make_inputs
+from engine.core import run_replenishment_engine
+
+NUM_SKUS = 60
+
+
+def _run(tables, output_path, state_path=None):
+    branch_inventory, warehouse_stock, sku_master = tables
+    _, transfer_orders, lpo_needs, excess_stock = run_replenishment_engine(
+        branch_inventory_df=branch_inventory, warehouse_stock_df=warehouse_stock, sku_master_df=sku_master,
+        output_path=str(output_path), incremental_state_path=None if state_path is None else str(state_path)
+    )
+    return transfer_orders, lpo_needs, excess_stock
+
+
+def _assert_same_as_a_full_run(tables, results, output_path):
+    for name, result, expected in zip(["transfer_orders", "lpo_needs", "excess_stock"], results,
+                                      _run(tables, output_path)):
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_categorical=False, obj=name)
+
+
+def _changed_inputs(tables):
+    """
+    Changes a few SKUs in each table, adds one SKU and removes another.
+    """
+    branch_inventory, warehouse_stock, sku_master = (df.copy() for df in tables)
+    # Empty one SKU's branches so they all reorder, and take away another SKU's warehouse stock
+    branch_inventory.loc[branch_inventory["SKU"] == "SKU0003", "Branch_Stock"] = 0
+    warehouse_stock.loc[warehouse_stock["SKU"] == "SKU0010", "Warehouse_Stock"] = 0
+    sku_master.loc[sku_master["SKU"] == "SKU0020", "Vendor"] = "VendorZ"
+    # Serve one SKU's branches in another order
+    rows = branch_inventory.index[branch_inventory["SKU"] == "SKU0030"]
+    branch_inventory.loc[rows] = branch_inventory.loc[rows[::-1]].to_numpy()
+
+    # A new SKU sorting between existing ones, with its rows at the end of the input
+    new_branches = branch_inventory[branch_inventory["SKU"] == "SKU0005"].assign(SKU="SKU0005A", Branch_Stock=0)
+    branch_inventory = pd.concat([branch_inventory, new_branches], ignore_index=True)
+    warehouse_stock = pd.concat([warehouse_stock, pd.DataFrame({"SKU": ["SKU0005A"], "Warehouse_Stock": [40]})],
+                                ignore_index=True)
+    sku_master = pd.concat([sku_master, sku_master[sku_master["SKU"] == "SKU0005"].assign(SKU="SKU0005A")],
+                           ignore_index=True)
+
+    removed = "SKU0040"
+    return (branch_inventory[branch_inventory["SKU"] != removed].reset_index(drop=True),
+            warehouse_stock[warehouse_stock["SKU"] != removed].reset_index(drop=True),
+            sku_master[sku_master["SKU"] != removed].reset_index(drop=True))
+
+
+def test_incremental_runs_equal_full_runs(tmp_path, capsys):
+    state_path = tmp_path / "state"
+    tables = make_inputs(NUM_SKUS, num_branches=6, seed=5)
+    results = _run(tables, tmp_path / "first", state_path)
+    _assert_same_as_a_full_run(tables, results, tmp_path / "first_full")
+    assert f"recomputed {NUM_SKUS} of {NUM_SKUS} SKUs" in capsys.readouterr().out
+
+    changed_tables = _changed_inputs(tables)
+    results = _run(changed_tables, tmp_path / "second", state_path)
+    # SKU0003, SKU0005A, SKU0010, SKU0020, SKU0030 and the removed SKU0040
+    assert f"recomputed 6 of {NUM_SKUS} SKUs" in capsys.readouterr().out
+    _assert_same_as_a_full_run(changed_tables, results, tmp_path / "second_full")
+    assert "SKU0005A" in set(results[0]["SKU"].astype(str)) | set(results[1]["SKU"].astype(str))
+    assert "SKU0040" not in set(results[2]["SKU"].astype(str))
+
+    # Nothing changed since, so every result comes from the saved state
+    results = _run(changed_tables, tmp_path / "third", state_path)
+    assert f"recomputed 0 of {NUM_SKUS} SKUs" in capsys.readouterr().out
+    _assert_same_as_a_full_run(changed_tables, results, tmp_path / "third_full")
@@ -0,0 +1,122 @@
+import pandas as pd
+import pytest
+from conftest import make_inputs
+from engine.core import EXCESS_DOS_THRESHOLD, run_replenishment_engine
+from engine.inventory_store import InventoryStore
+from engine.sweep import run_parameter_sweep
+
+
+@pytest.fixture
+def store(tmp_path):
+    with InventoryStore(str(tmp_path / "store.db")) as store:
+        yield store
+
+
+def _run(tables, output_path):
+    branch_inventory, warehouse_stock, sku_master = tables
+    _, transfer_orders, lpo_needs, excess_stock = run_replenishment_engine(
+        branch_inventory_df=branch_inventory, warehouse_stock_df=warehouse_stock, sku_master_df=sku_master,
+        output_path=str(output_path)
+    )
+    return [df.reset_index(drop=True) for df in (transfer_orders, lpo_needs, excess_stock)]
+
+
+def test_upsert_counts_only_inserted_and_changed_rows(store, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    first, rows_changed = store.upsert(branch_inventory, warehouse_stock, sku_master, source="initial")
+    assert rows_changed == len(branch_inventory) + len(warehouse_stock) + len(sku_master)
+
+    second, rows_changed = store.upsert(branch_inventory, warehouse_stock, sku_master)
+    assert second == first + 1 and rows_changed == 0
+
+    updated = branch_inventory.copy()
+    updated.loc[[0, 7], "Branch_Stock"] += 1
+    third, rows_changed = store.upsert(branch_inventory=updated)
+    assert rows_changed == 2
+    assert store.latest_snapshot() == third
+
+
+def test_changed_skus_since_the_last_run(store, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    store.upsert(branch_inventory, warehouse_stock, sku_master)
+    assert store.last_run_snapshot() == 0
+    store.mark_run()
+    assert store.changed_skus(store.last_run_snapshot()) == []
+
+    # Unchanged rows in the same snapshot keep their old snapshot ID
+    updated_branches = branch_inventory.copy()
+    updated_branches.loc[updated_branches["SKU"] == "SKU0003", "Branch_Stock"] += 5
+    updated_warehouse = warehouse_stock.copy()
+    updated_warehouse.loc[updated_warehouse["SKU"] == "SKU0010", "Warehouse_Stock"] += 5
+    store.upsert(branch_inventory=updated_branches, warehouse_stock=updated_warehouse, source="intraday")
+    assert store.changed_skus(store.last_run_snapshot()) == ["SKU0003", "SKU0010"]
+
+    store.mark_run()
+    assert store.changed_skus(store.last_run_snapshot()) == []
+
+
+def test_partial_upsert_leaves_other_rows(store, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    store.upsert(branch_inventory, warehouse_stock, sku_master)
+    one_branch = branch_inventory[branch_inventory["Branch"] == "BR001"].assign(Branch_Stock=0)
+    store.upsert(branch_inventory=one_branch)
+
+    stored = store.load_input_tables()[0]
+    assert len(stored) == len(branch_inventory)
+    assert (stored.loc[stored["Branch"] == "BR001", "Branch_Stock"] == 0).all()
+    others = stored["Branch"] != "BR001"
+    assert stored.loc[others, "Branch_Stock"].tolist() == \
+        branch_inventory.loc[branch_inventory["Branch"] != "BR001", "Branch_Stock"].tolist()
+
+
+def test_stock_history_keeps_every_change(store, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    first, _ = store.upsert(branch_inventory, warehouse_stock, sku_master)
+    row = (branch_inventory["SKU"] == "SKU0001") & (branch_inventory["Branch"] == "BR002")
+    store.upsert(branch_inventory=branch_inventory)  # Unchanged, so not in the history
+    third, _ = store.upsert(branch_inventory=branch_inventory[row].assign(Branch_Stock=999))
+
+    history = store.stock_history("SKU0001", "BR002")
+    assert history["Snapshot_Id"].tolist() == [first, third]
+    assert history["Branch_Stock"].tolist() == [branch_inventory.loc[row, "Branch_Stock"].item(), 999]
+    assert pd.api.types.is_datetime64_any_dtype(history["Taken_At"])
+    assert len(store.stock_history("SKU0001")) == branch_inventory["Branch"].nunique() + 1
+
+
+def test_actionable_rows_give_the_same_outputs(store, tmp_path):
+    tables = make_inputs(num_skus=200, num_branches=8, seed=3)
+    store.upsert(*tables)
+
+    stored = store.load_input_tables()
+    assert stored[0][["SKU", "Branch"]].values.tolist() == tables[0][["SKU", "Branch"]].values.tolist()
+    actionable = store.load_input_tables(actionable_dos_threshold=EXCESS_DOS_THRESHOLD)
+    assert len(actionable[0]) < len(tables[0])
+
+    expected = _run(tables, tmp_path / "all")
+    for result, expected_df in zip(_run(actionable, tmp_path / "actionable"), expected):
+        pd.testing.assert_frame_equal(result, expected_df, check_dtype=False, check_categorical=False)
+
+
+def test_load_selected_skus(store, engine_inputs):
+    store.upsert(*engine_inputs)
+    branch_inventory, warehouse_stock, sku_master = store.load_input_tables(skus=["SKU0004", "SKU0002"])
+    assert sorted(branch_inventory["SKU"].unique()) == ["SKU0002", "SKU0004"]
+    assert warehouse_stock["SKU"].tolist() == ["SKU0002", "SKU0004"]
+    assert sku_master["SKU"].tolist() == ["SKU0002", "SKU0004"]
+
+    vendor = sku_master["Vendor"].iloc[0]
+    all_skus = engine_inputs[2]
+    assert store.vendor_skus(vendor) == sorted(all_skus.loc[all_skus["Vendor"] == vendor, "SKU"])
+
+
+def test_sweep_reads_every_row_from_the_store(tmp_path, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    with InventoryStore(str(tmp_path / "store.db")) as store:
+        store.upsert(branch_inventory, warehouse_stock, sku_master)
+    # Larger Min/Max factors make rows reorder that the engine's actionable read would skip
+    grid = dict(dos_thresholds=[30, EXCESS_DOS_THRESHOLD], min_stock_factors=[1.0, 2.0], max_stock_factors=[1.0, 3.0])
+
+    from_store = run_parameter_sweep(inventory_store_path=str(tmp_path / "store.db"), **grid)
+    expected = run_parameter_sweep(branch_inventory, warehouse_stock, sku_master, **grid)
+    for result, expected_df in zip(from_store, expected):
+        pd.testing.assert_frame_equal(result, expected_df)
@@ -0,0 +1,97 @@
+import pytest
+from concurrent.futures import CancelledError
+from conftest import make_inputs
+from engine.jobs import (
+    FINAL_STAGE, JOB_CANCELLED, JOB_DONE, JOB_FAILED, JobCancelledError, JobManager, JobQueueFullError, _run_job
+)
+
+
+class _CancelAfterStage(dict):
+    """
+    A progress dict that requests the job's cancellation once the given stage completes.
+    """
+
+    def __init__(self, stage, cancel_requests):
+        super().__init__()
+        self.stage = stage
+        self.cancel_requests = cancel_requests
+
+    def __setitem__(self, job_id, progress):
+        super().__setitem__(job_id, progress)
+        if progress[0] == self.stage:
+            self.cancel_requests[job_id] = True
+
+
+def _engine_kwargs(output_path, num_skus=50):
+    branch_inventory, warehouse_stock, sku_master = make_inputs(num_skus)
+    return dict(branch_inventory_df=branch_inventory, warehouse_stock_df=warehouse_stock,
+                sku_master_df=sku_master, output_path=str(output_path))
+
+
+@pytest.fixture
+def job_manager():
+    manager = JobManager(max_concurrent_jobs=1, max_queued_jobs=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_cancel_before_start_skips_the_run(tmp_path):
+    progress, cancel_requests = {}, {"job": True}
+    with pytest.raises(JobCancelledError):
+        _run_job("job", _engine_kwargs(tmp_path / "out"), progress, cancel_requests)
+    assert not (tmp_path / "out").exists()
+    assert progress == {} and cancel_requests == {}
+
+
+def test_cancel_at_a_stage_boundary_stops_the_run(tmp_path):
+    cancel_requests = {}
+    with pytest.raises(JobCancelledError):
+        _run_job("job", _engine_kwargs(tmp_path / "out"), _CancelAfterStage("merge", cancel_requests), cancel_requests)
+    assert not (tmp_path / "out").exists()
+
+
+def test_cancel_once_outputs_are_written_completes_the_run(tmp_path):
+    cancel_requests = {}
+    results = _run_job("job", _engine_kwargs(tmp_path / "out"), _CancelAfterStage(FINAL_STAGE, cancel_requests),
+                       cancel_requests)
+    assert "job" in cancel_requests
+    assert results[1] is not None
+    assert (tmp_path / "out" / "LPO_Needs.csv").exists()
+
+
+def test_queue_limit_and_cancelling_a_queued_job(job_manager, tmp_path):
+    first = job_manager.submit(**_engine_kwargs(tmp_path / "first", num_skus=20_000))
+    second = job_manager.submit(**_engine_kwargs(tmp_path / "second"))
+    with pytest.raises(JobQueueFullError):
+        job_manager.submit(**_engine_kwargs(tmp_path / "third"))
+
+    assert job_manager.cancel(second)
+    job_manager.result(first, timeout=120)
+    assert job_manager.status(first).status == JOB_DONE
+    assert job_manager.status(second).status == JOB_CANCELLED
+    assert not (tmp_path / "second").exists()
+    with pytest.raises(CancelledError):
+        job_manager.result(second)
+    assert not job_manager.cancel(first)
+
+    # Finished jobs no longer count towards the limit
+    third = job_manager.submit(**_engine_kwargs(tmp_path / "third"))
+    job_manager.result(third, timeout=120)
+
+
+def test_results_are_released_once_fetched(job_manager, tmp_path):
+    job_id = job_manager.submit(**_engine_kwargs(tmp_path / "out"))
+    _, transfer_orders, lpo_needs, excess_stock = job_manager.result(job_id, timeout=120)
+    assert len(transfer_orders) > 0
+    assert job_manager.status(job_id).status == JOB_DONE
+    with pytest.raises(KeyError):
+        job_manager.result(job_id)
+
+
+def test_failed_job_reports_its_error(job_manager, tmp_path):
+    job_id = job_manager.submit(**_engine_kwargs(tmp_path / "out"), unknown_option=True)
+    with pytest.raises(TypeError):
+        job_manager.result(job_id, timeout=120)
+    job = job_manager.status(job_id)
+    assert job.status == JOB_FAILED
+    assert "unknown_option" in job.error
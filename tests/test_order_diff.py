@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+from engine.core import run_replenishment_engine
+from engine.order_diff import (
+    CHANGE_ADDED, CHANGE_CHANGED, CHANGE_REMOVED, compute_order_changes, diff_orders, load_snapshots, order_snapshot,
+    save_snapshots
+)
+
+
+def _transfers(rows):
+    return pd.DataFrame(rows, columns=["SKU", "To_Branch", "Transfer_Qty"])
+
+
+def _lpo_needs(rows):
+    return pd.DataFrame(rows, columns=["SKU", "Vendor", "Required_Qty"])
+
+
+def test_order_snapshot_sums_repeated_keys():
+    snapshot = order_snapshot(_transfers([("A", "BR1", 5), ("A", "BR1", 3), ("B", "BR1", 2)]), "Transfer_Orders")
+    assert snapshot.values.tolist() == [["A", "BR1", 8], ["B", "BR1", 2]]
+    assert isinstance(snapshot["SKU"].dtype, pd.CategoricalDtype)
+
+
+def test_diff_orders_lists_added_removed_and_changed():
+    previous = order_snapshot(_transfers([("A", "BR1", 5), ("B", "BR1", 2), ("C", "BR2", 7)]), "Transfer_Orders")
+    current = order_snapshot(_transfers([("A", "BR1", 9), ("B", "BR1", 2), ("D", "BR2", 4)]), "Transfer_Orders")
+    changes = diff_orders(previous, current, "Transfer_Orders")
+
+    # The unchanged order for B is left out
+    assert changes.astype({"SKU": str, "To_Branch": str}).values.tolist() == [
+        ["A", "BR1", CHANGE_CHANGED, 5, 9, 4],
+        ["C", "BR2", CHANGE_REMOVED, 7, 0, -7],
+        ["D", "BR2", CHANGE_ADDED, 0, 4, 4],
+    ]
+    assert list(changes.columns) == [
+        "SKU", "To_Branch", "Change", "Previous_Transfer_Qty", "Current_Transfer_Qty", "Qty_Change"
+    ]
+
+
+def test_identical_runs_have_no_changes():
+    snapshot = order_snapshot(_lpo_needs([("A", "VendorA", 10), ("B", "VendorB", 3)]), "LPO_Needs")
+    assert diff_orders(snapshot, snapshot.copy(), "LPO_Needs").empty
+
+
+# Empty order tables must not rely on pandas' deprecated downcasting
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_changes_between_runs(tmp_path):
+    state_path = str(tmp_path / "orders")
+    transfers = _transfers([("A", "BR1", 5), ("B", "BR2", 2)])
+    lpo_needs = _lpo_needs([("A", "VendorA", 10)])
+
+    # The first run has no baseline, so every order is added
+    changes, snapshots = compute_order_changes(state_path, transfers, lpo_needs)
+    assert (changes["Transfer_Orders"]["Change"] == CHANGE_ADDED).all()
+    assert len(changes["Transfer_Orders"]) == 2 and len(changes["LPO_Needs"]) == 1
+    save_snapshots(state_path, snapshots, "run-1")
+
+    saved, run_id = load_snapshots(state_path)
+    assert run_id == "run-1"
+    assert saved["Transfer_Orders"].astype(str).values.tolist() == \
+        snapshots["Transfer_Orders"].astype(str).values.tolist()
+
+    changes, snapshots = compute_order_changes(
+        state_path, _transfers([("A", "BR1", 5), ("B", "BR2", 6)]), _lpo_needs([])
+    )
+    assert changes["Transfer_Orders"].astype({"SKU": str, "To_Branch": str}).values.tolist() == [
+        ["B", "BR2", CHANGE_CHANGED, 2, 6, 4]
+    ]
+    assert changes["LPO_Needs"].astype({"SKU": str, "Vendor": str}).values.tolist() == [
+        ["A", "VendorA", CHANGE_REMOVED, 10, 0, -10]
+    ]
+
+
+def test_no_snapshots_before_the_first_run(tmp_path):
+    assert load_snapshots(str(tmp_path / "orders")) == ({}, None)
+
+
+def test_engine_writes_the_changes_since_its_last_run(tmp_path, engine_inputs):
+    branch_inventory, warehouse_stock, sku_master = engine_inputs
+    state_path = str(tmp_path / "orders")
+
+    def run(branch_inventory, output_path):
+        _, transfer_orders, _, _ = run_replenishment_engine(
+            branch_inventory_df=branch_inventory, warehouse_stock_df=warehouse_stock, sku_master_df=sku_master,
+            output_path=str(output_path), order_diff_path=state_path
+        )
+        return transfer_orders
+
+    transfer_orders = run(branch_inventory, tmp_path / "first")
+    first_changes = pd.read_csv(tmp_path / "first" / "Transfer_Orders_Changes.csv")
+    assert len(first_changes) == len(transfer_orders) and (first_changes["Change"] == CHANGE_ADDED).all()
+
+    # The same inputs again give no changes
+    run(branch_inventory, tmp_path / "second")
+    assert pd.read_csv(tmp_path / "second" / "Transfer_Orders_Changes.csv").empty
+    assert pd.read_csv(tmp_path / "second" / "LPO_Needs_Changes.csv").empty
+
+    # Filling up the first transferred row removes its order
+    ordered = transfer_orders.iloc[0]
+    row = (branch_inventory["SKU"] == ordered["SKU"]) & (branch_inventory["Branch"] == ordered["To_Branch"])
+    run(branch_inventory.assign(Branch_Stock=branch_inventory["Branch_Stock"].where(~row, 10_000)),
+        tmp_path / "third")
+    changes = pd.read_csv(tmp_path / "third" / "Transfer_Orders_Changes.csv")
+    removed = changes[changes["Change"] == CHANGE_REMOVED]
+    assert [ordered["SKU"], ordered["To_Branch"]] in removed[["SKU", "To_Branch"]].values.tolist()
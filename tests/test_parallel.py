@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from conftest import make_inputs
+from engine.core import compute_replenishment, merge_inputs
+from engine.parallel import compute_replenishment_parallel, merge_shard_results, shard_by_sku
+from engine.schema import apply_schema
+
+RESULT_NAMES = ["merged_data", "transfer_orders", "lpo_needs", "excess_stock", "lpo_trigger_transfers"]
+
+
+def _merged_inputs(num_skus=300, num_branches=6, seed=1, lean=False):
+    tables = make_inputs(num_skus, num_branches, seed)
+    typed = [apply_schema(df, table) for df, table in zip(tables, ("Branch_Inventory", "Warehouse_Stock",
+                                                                   "SKU_Master"))]
+    return merge_inputs(*typed, lean=lean)
+
+
+def _assert_same_results(results, expected):
+    for name, result, expected_df in zip(RESULT_NAMES, results, expected):
+        if expected_df is None:
+            assert result is None, name
+        else:
+            pd.testing.assert_frame_equal(result, expected_df, obj=name)
+
+
+def test_shards_split_skus_without_overlap():
+    merged_data, _ = _merged_inputs()
+    shards = shard_by_sku(merged_data, 4)
+    assert len(shards) == 4
+    assert sum(len(shard) for shard in shards) == len(merged_data)
+    shard_skus = [set(shard["SKU"]) for shard in shards]
+    assert sum(len(skus) for skus in shard_skus) == merged_data["SKU"].nunique()
+
+
+def test_merged_shard_results_equal_a_serial_run():
+    merged_data, available_warehouse_stock = _merged_inputs()
+    expected = compute_replenishment(merged_data.copy(), available_warehouse_stock)
+    shard_results = [compute_replenishment(shard.copy(), available_warehouse_stock)
+                     for shard in shard_by_sku(merged_data, 3)]
+    _assert_same_results(merge_shard_results(shard_results), expected)
+
+
+@pytest.mark.parametrize("lean", [False, True])
+def test_parallel_run_equals_a_serial_run(lean):
+    merged_data, available_warehouse_stock = _merged_inputs(lean=lean)
+    expected = compute_replenishment(merged_data.copy(), available_warehouse_stock, lean=lean)
+    results = compute_replenishment_parallel(merged_data.copy(), available_warehouse_stock, workers=3, lean=lean)
+    _assert_same_results(results, expected)
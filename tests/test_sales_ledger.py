@@ -0,0 +1,137 @@
+import shutil
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import make_inputs
+from engine.sales_ledger import SalesLedger, append_sales_file, apply_sales_history, min_max_from_ads
+
+KEYS = pd.DataFrame({"SKU": ["A", "A", "B"], "Branch": ["BR1", "BR2", "BR1"]})
+
+
+def _daily_sales(num_days, num_series=len(KEYS), seed=0):
+    return np.random.default_rng(seed).integers(0, 20, (num_days, num_series))
+
+
+def test_append_keeps_rolling_sums_over_the_ring_buffer(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS, history_days=35, windows=(7, 30))
+    days = _daily_sales(50)
+    for day in days:
+        ledger.append_day(day)
+
+    assert ledger.num_days == 50
+    np.testing.assert_array_equal(ledger.rolling_sum(30), days[-30:].sum(axis=0))
+    np.testing.assert_array_equal(ledger.rolling_sum(7), days[-7:].sum(axis=0))
+    np.testing.assert_array_equal(ledger.history(), days[-35:])
+    np.testing.assert_allclose(ledger.rolling_ads(30), days[-30:].mean(axis=0))
+    assert not ledger.recompute_rolling()
+
+
+def test_young_ledger_averages_over_the_days_held(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS)
+    np.testing.assert_array_equal(ledger.rolling_ads(), np.zeros(len(KEYS)))
+    days = _daily_sales(10)
+    for day in days:
+        ledger.append_day(day)
+    np.testing.assert_allclose(ledger.rolling_ads(), days.mean(axis=0))
+
+
+def test_dated_appends_fill_gaps_and_reject_earlier_days(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS)
+    ledger.append_day([1, 2, 3], date(2024, 3, 1))
+    ledger.append_day(pd.DataFrame({"SKU": ["B", "A", "C"], "Branch": ["BR1", "BR1", "BR1"], "Units": [5, 4, 9]}),
+                      date(2024, 3, 4))
+
+    assert ledger.num_days == 4 and ledger.last_date == date(2024, 3, 4)
+    np.testing.assert_array_equal(ledger.history(), [[1, 2, 3], [0, 0, 0], [0, 0, 0], [4, 0, 5]])
+    for sales_date in (date(2024, 3, 4), date(2024, 3, 2)):
+        with pytest.raises(ValueError):
+            ledger.append_day([1, 1, 1], sales_date)
+    with pytest.raises(ValueError):
+        ledger.append_day([1, 1])
+
+    # Undated appends follow on from the last date
+    ledger.append_day([1, 1, 1])
+    assert ledger.last_date == date(2024, 3, 5)
+
+
+def test_reopened_ledger_keeps_its_state(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS, windows=(7, 30))
+    days = _daily_sales(12)
+    for day in days:
+        ledger.append_day(day)
+
+    reopened = SalesLedger.open(str(tmp_path))
+    assert reopened.num_days == 12 and reopened.windows == [7, 30]
+    pd.testing.assert_frame_equal(reopened.keys(), ledger.keys())
+    np.testing.assert_array_equal(reopened.rolling_sum(7), days[-7:].sum(axis=0))
+
+
+def test_interrupted_append_is_repaired_on_open(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS)
+    days = _daily_sales(40)
+    for day in days[:-1]:
+        ledger.append_day(day)
+    # Simulate a crash after the history and metadata of the last day were
+    # written, but with the rolling sums of the day before
+    shutil.copy(tmp_path / "rolling.npz", tmp_path / "rolling_before.npz")
+    ledger.append_day(days[-1])
+    shutil.copy(tmp_path / "rolling_before.npz", tmp_path / "rolling.npz")
+
+    reopened = SalesLedger.open(str(tmp_path))
+    np.testing.assert_array_equal(reopened.rolling_sum(), days[-30:].sum(axis=0))
+    assert not SalesLedger.open(str(tmp_path)).recompute_rolling()
+
+
+def test_recompute_rolling_repairs_drifted_sums(tmp_path):
+    ledger = SalesLedger.create(str(tmp_path), KEYS)
+    days = _daily_sales(5)
+    for day in days:
+        ledger.append_day(day)
+    ledger._rolling[0, 1] += 3
+    assert ledger.recompute_rolling()
+    np.testing.assert_array_equal(ledger.rolling_sum(), days.sum(axis=0))
+
+
+def test_append_sales_file_creates_the_ledger(tmp_path):
+    sales_path = tmp_path / "sales.csv"
+    pd.DataFrame({"SKU": ["A", "B"], "Branch": ["BR2", "BR1"], "Units": [6, 2], "Date": ["2024-05-01"] * 2}) \
+        .to_csv(sales_path, index=False)
+    with pytest.raises(ValueError):
+        append_sales_file(str(tmp_path / "ledger"), str(sales_path))
+
+    ledger = append_sales_file(str(tmp_path / "ledger"), str(sales_path), keys=KEYS)
+    assert ledger.last_date == date(2024, 5, 1)
+    np.testing.assert_array_equal(ledger.rolling_sum(), [0, 6, 2])
+
+    pd.DataFrame({"SKU": ["A"], "Branch": ["BR1"], "Units": [3], "Date": ["2024-05-02"]}) \
+        .to_csv(sales_path, index=False)
+    ledger = append_sales_file(str(tmp_path / "ledger"), str(sales_path))
+    assert ledger.num_days == 2
+    np.testing.assert_array_equal(ledger.rolling_sum(), [3, 6, 2])
+
+
+def test_apply_sales_history_on_a_young_ledger(tmp_path):
+    branch_inventory, _, sku_master = make_inputs(num_skus=10, num_branches=3)
+    tracked = branch_inventory.iloc[:20]
+    ledger = SalesLedger.create(str(tmp_path), tracked)
+    days = _daily_sales(12, len(tracked))
+    start = date(2024, 1, 1)
+    for offset, day in enumerate(days):
+        ledger.append_day(day, start + timedelta(days=offset))
+
+    updated = apply_sales_history(branch_inventory, sku_master, ledger)
+    ads = days.mean(axis=0)
+    lead_times = tracked["SKU"].map(sku_master.set_index("SKU")["Lead_Time_Days"]).to_numpy()
+    min_stock, max_stock = min_max_from_ads(ads, lead_times)
+
+    # Min/Max and the excess check's daily sales both come from the 12 days held
+    np.testing.assert_allclose(updated["Avg_Daily_Sales"].iloc[:20], ads)
+    np.testing.assert_array_equal(updated["Sales_30D"].iloc[:20], days.sum(axis=0))
+    np.testing.assert_array_equal(updated["Min_Stock"].iloc[:20], min_stock)
+    np.testing.assert_array_equal(updated["Max_Stock"].iloc[:20], max_stock)
+
+    # Untracked rows keep their values, with their 30-day average
+    untracked = branch_inventory.iloc[20:]
+    pd.testing.assert_frame_equal(updated.iloc[20:].drop(columns="Avg_Daily_Sales"), untracked)
+    np.testing.assert_allclose(updated["Avg_Daily_Sales"].iloc[20:], untracked["Sales_30D"] / 30)
@@ -0,0 +1,66 @@
+import os
+import pandas as pd
+import pytest
+from conftest import make_inputs
+from engine.core import run_replenishment_engine
+from engine.file_io import table_path
+from engine.streaming import run_replenishment_engine_streaming
+
+OUTPUT_TABLES = ("Transfer_Orders", "LPO_Trigger_Transfers", "LPO_Needs", "Excess_Stock")
+
+
+def _write_inputs(tables, data_path, file_format):
+    os.makedirs(data_path, exist_ok=True)
+    for df, table in zip(tables, ("Branch_Inventory", "Warehouse_Stock", "SKU_Master")):
+        path = table_path(str(data_path), table, file_format)
+        if file_format == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+
+def _read_output(output_path, table, file_format):
+    path = table_path(str(output_path), table, file_format)
+    df = pd.read_parquet(path) if file_format == "parquet" else pd.read_csv(path)
+    # Compare values only: categories and integer widths differ between the writers
+    return df.astype({column: str for column, dtype in df.dtypes.items()
+                      if isinstance(dtype, pd.CategoricalDtype) or dtype == object})
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+# 7 rows split most SKUs' 5 branches over two chunks; 1000 is a single chunk
+@pytest.mark.parametrize("chunk_rows", [7, 1000])
+def test_streaming_outputs_equal_the_in_memory_engine(tmp_path, file_format, chunk_rows):
+    tables = make_inputs(num_skus=80, num_branches=5, seed=4)
+    _write_inputs(tables, tmp_path / "data", file_format)
+
+    run_replenishment_engine(data_path=str(tmp_path / "data"), output_path=str(tmp_path / "expected"),
+                             input_format=file_format, output_format="parquet")
+    rows_written = run_replenishment_engine_streaming(
+        data_path=str(tmp_path / "data"), output_path=str(tmp_path / "streamed"), input_format=file_format,
+        output_format=file_format, chunk_rows=chunk_rows
+    )
+
+    for table in OUTPUT_TABLES:
+        expected = _read_output(tmp_path / "expected", table, "parquet")
+        streamed = _read_output(tmp_path / "streamed", table, file_format)
+        assert rows_written[table] == len(expected)
+        pd.testing.assert_frame_equal(streamed, expected, check_dtype=False, obj=table)
+
+
+def test_unsorted_branch_inventory_is_rejected(tmp_path):
+    branch_inventory, warehouse_stock, sku_master = make_inputs(num_skus=20, num_branches=5)
+    # SKUs out of order only across a chunk boundary, with each chunk sorted
+    branch_inventory = pd.concat([branch_inventory.iloc[50:], branch_inventory.iloc[:50]], ignore_index=True)
+    _write_inputs((branch_inventory, warehouse_stock, sku_master), tmp_path / "data", "csv")
+
+    with pytest.raises(ValueError, match="sorted by SKU"):
+        run_replenishment_engine_streaming(data_path=str(tmp_path / "data"), output_path=str(tmp_path / "out"),
+                                           chunk_rows=50)
+    # The outputs started before the error are discarded
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_unsupported_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        run_replenishment_engine_streaming(data_path=str(tmp_path), output_format="feather")